@@ -0,0 +1,86 @@
+"""Benchmark of the magnetic moment and U value setup against the mendeleev based implementation.
+
+Run from the repository root::
+
+    python benchmarks/bench_element_properties.py --atoms 300
+
+The reference implementation needs ``mendeleev``, which AutoCatLab itself no longer requires.
+"""
+import argparse
+import timeit
+
+import numpy as np
+from ase.build import bulk
+
+from AutoCatLab.executor.util.util import get_initial_magmoms, get_LUJ_values, DEFAULT_LUJ
+
+
+def get_initial_magmoms_mendeleev(atoms):
+    """Initial magnetic moments as computed before the element table, one mendeleev query per atom."""
+    from mendeleev import element
+
+    high_spin_elements = ['Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Y', 'Zr', 'Nb', 'Hf', 'Ta']
+    low_spin_elements = ['Co', 'Ni', 'Mo', 'Tc', 'Ru', 'W', 'Re', 'Os', 'Ir']
+    low_spin_function = np.array([0, 1, 2, 3, 2, 1, 0, 1, 2, 1, 0])
+    high_spin_function = np.array([0, 1, 2, 3, 4, 5, 4, 3, 2, 1, 0])
+
+    N_oxygen = list(atoms.symbols).count('O')
+    N_metal = len(atoms) - N_oxygen
+    average_ox = N_oxygen / N_metal * 2
+    initial_magmoms = []
+    for a in atoms:
+        if a.symbol == 'O':
+            mag = 0
+        else:
+            ele = element(a.symbol)
+            group = int(ele.group_id)
+            N_d = int(group - average_ox) if group > 1 else 0
+            if a.symbol in high_spin_elements:
+                mag = high_spin_function[N_d]
+            elif a.symbol in low_spin_elements:
+                mag = low_spin_function[N_d]
+            else:
+                mag = 0
+        mag += 0.01
+        initial_magmoms += [mag]
+    return initial_magmoms
+
+
+def get_LUJ_values_rebuilt(atoms):
+    """U values selected from a table rebuilt on every call, as before the element table."""
+    ldau_luj = {symbol: dict(values) for symbol, values in DEFAULT_LUJ.items()}
+    return {sym: ldau_luj[sym] for sym in set(list(atoms.symbols))}
+
+
+def make_oxide(n_atoms):
+    """Build a mixed rocksalt oxide with about n_atoms atoms."""
+    atoms = bulk('NiO', 'rocksalt', a=4.17, cubic=True)
+    atoms = atoms.repeat((max(1, round((n_atoms / len(atoms)) ** (1 / 3))),) * 3)
+    metals = [i for i, symbol in enumerate(atoms.get_chemical_symbols()) if symbol != 'O']
+    for i, symbol in zip(metals, ['Fe', 'Co', 'Mn', 'Ni', 'Ti', 'Cu'] * len(metals)):
+        atoms[i].symbol = symbol
+    return atoms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--atoms', type=int, default=300, help='Approximate number of atoms')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions')
+    args = parser.parse_args()
+
+    atoms = make_oxide(args.atoms)
+    assert np.allclose(get_initial_magmoms(atoms), get_initial_magmoms_mendeleev(atoms))
+
+    print(f"{len(atoms)} atoms, best of {args.repeat}")
+    for name, function in [('get_initial_magmoms (mendeleev)', get_initial_magmoms_mendeleev),
+                           ('get_initial_magmoms (table)', get_initial_magmoms),
+                           ('get_LUJ_values (rebuilt dict)', get_LUJ_values_rebuilt),
+                           ('get_LUJ_values (table)', get_LUJ_values)]:
+        # The reference takes seconds, so it is timed once
+        number, repeat = (1, 1) if 'mendeleev' in name else (100, args.repeat)
+        best = min(timeit.repeat(lambda: function(atoms), number=number, repeat=repeat)) / number
+        print(f"{name:35s} {best * 1e3:10.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
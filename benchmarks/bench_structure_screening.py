@@ -0,0 +1,64 @@
+"""Benchmark of the input screening throughput against the ASE neighbour list based pair search.
+
+Run from the repository root::
+
+    python benchmarks/bench_structure_screening.py --repeat 2
+
+The screening has to keep up with 10^4 structures per minute on one core.
+"""
+import argparse
+import json
+import timeit
+from pathlib import Path
+
+import numpy as np
+from ase.build import bulk
+from ase.data import covalent_radii
+from ase.neighborlist import neighbor_list
+
+import AutoCatLab
+from AutoCatLab.util.structure_screening import get_pair_distance_ratios, screen_structure
+
+# Structures per minute the screening has to reach on one core
+TARGET_PER_MINUTE = 10 ** 4
+
+
+def get_pair_distance_ratios_ase(atoms, cutoff_factor):
+    """Pair search as done before the k-d tree, with the ASE neighbour list."""
+    radii = covalent_radii[atoms.numbers]
+    i, j, d = neighbor_list('ijd', atoms, cutoff_factor * radii, self_interaction=False)
+    return i, d / (radii[i] + radii[j])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2, help='Supercell repetitions of the NiO cubic cell')
+    parser.add_argument('--number', type=int, default=200, help='Structures screened per timing')
+    args = parser.parse_args()
+
+    with open(Path(AutoCatLab.__file__).parent / 'util' / 'config.json') as f:
+        params = json.load(f)['input_screening']
+
+    atoms = bulk('NiO', 'rocksalt', a=4.17, cubic=True).repeat(args.repeat)
+    atoms.rattle(0.05, seed=0)
+    factor = params['isolation_distance_factor']
+    i_ref, ratios_ref = get_pair_distance_ratios_ase(atoms, factor)
+    i, ratios = get_pair_distance_ratios(atoms, factor)
+    assert np.array_equal(np.bincount(i_ref, minlength=len(atoms)), np.bincount(i, minlength=len(atoms)))
+    assert np.allclose(np.sort(ratios_ref), np.sort(ratios))
+
+    print(f"{len(atoms)} atoms, best of 5")
+    for name, function, number in [
+            ('pair search (ASE neighbour list)', lambda: get_pair_distance_ratios_ase(atoms, factor), 10),
+            ('pair search (k-d tree)', lambda: get_pair_distance_ratios(atoms, factor), args.number),
+            ('screen_structure', lambda: screen_structure(atoms, params), args.number)]:
+        best = min(timeit.repeat(function, number=number, repeat=5)) / number
+        print(f"{name:35s} {best * 1e3:10.3f} ms {60 / best:12.0f} per minute")
+
+    best = min(timeit.repeat(lambda: screen_structure(atoms, params), number=args.number, repeat=5)) / args.number
+    if 60 / best < TARGET_PER_MINUTE:
+        raise SystemExit(f"screen_structure reaches {60 / best:.0f} of {TARGET_PER_MINUTE} structures per minute")
+
+
+if __name__ == '__main__':
+    main()
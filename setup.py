@@ -18,7 +18,6 @@ setup(
         "click>=8.1.7",
         "rich>=13.7.0",
         "sqlalchemy>=2.0.25",
-        "mendeleev>=0.14.0",
     ],
     entry_points={
         "console_scripts": [
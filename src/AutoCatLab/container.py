@@ -7,10 +7,15 @@ from AutoCatLab.initializer.batch_processor import BatchProcessor
 from AutoCatLab.initializer.job_script_generator import JobScriptGenerator
 from AutoCatLab.initializer.input_processor import InputProcessor
 from AutoCatLab.initializer.job_processor import JobProcessor
+from AutoCatLab.initializer.job_submitter import JobSubmitter
+from AutoCatLab.initializer.job_reconciler import JobReconciler
+from AutoCatLab.initializer.local_scheduler import LocalScheduler
+from AutoCatLab.initializer.walltime_predictor import WalltimePredictor
 from AutoCatLab.util.util import setup_logger, get_config
 from AutoCatLab.workflow.workflow_manager import WorkflowManager
 from AutoCatLab.db.connectors import ASEDBConnector, SQLiteConnector
-from AutoCatLab.db.crud import BatchCRUD, ExecutionCRUD, WorkflowCRUD
+from AutoCatLab.db.crud import BatchCRUD, ExecutionCRUD, WorkflowCRUD, MaterialCRUD, TimingCRUD, JobArrayCRUD, DaemonCRUD, \
+    LeaseCRUD
 
 
 def create_container(config_path: str = None) -> Container:
@@ -51,16 +56,43 @@ def create_container(config_path: str = None) -> Container:
     execution_crud = ExecutionCRUD()
     container.set('execution_crud', execution_crud)
 
+    material_crud = MaterialCRUD()
+    container.set('material_crud', material_crud)
+
+    timing_crud = TimingCRUD()
+    container.set('timing_crud', timing_crud)
+
+    job_array_crud = JobArrayCRUD()
+    container.set('job_array_crud', job_array_crud)
+
+    daemon_crud = DaemonCRUD()
+    container.set('daemon_crud', daemon_crud)
+
+    lease_crud = LeaseCRUD()
+    container.set('lease_crud', lease_crud)
+
     # Initializers
     input_processor = InputProcessor(container)
     container.set('input_processor', input_processor)
 
+    walltime_predictor = WalltimePredictor(container)
+    container.set('walltime_predictor', walltime_predictor)
+
     job_script_generator = JobScriptGenerator(config, container)
     container.set('job_script_generator', job_script_generator)
 
     batch_processor = BatchProcessor(container)
     container.set('batch_processor', batch_processor)
 
+    job_submitter = JobSubmitter(container)
+    container.set('job_submitter', job_submitter)
+
+    job_reconciler = JobReconciler(container)
+    container.set('job_reconciler', job_reconciler)
+
+    local_scheduler = LocalScheduler(container)
+    container.set('local_scheduler', local_scheduler)
+
     job_processor = JobProcessor(container)
     container.set('job_processor', job_processor)
 
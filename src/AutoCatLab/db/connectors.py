@@ -1,24 +1,27 @@
 """Database connectors for AutoCatLab."""
 import sqlite3
+import threading
 from pathlib import Path
 from typing import Optional
 from ase.db import connect as ase_connect
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
 from .models import Base
 
 class SQLiteConnector:
     """SQLite database connector."""
     
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, timeout: float = 60):
         """Initialize SQLite connector.
         
         Args:
             db_path (str): Path to SQLite database file
+            timeout (float): Seconds to wait for a lock held by another process, e.g. a
+                concurrent worker
         """
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.engine = create_engine(f'sqlite:///{self.db_path}')
+        self.engine = create_engine(f'sqlite:///{self.db_path}', connect_args={'timeout': timeout})
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
         self.create_tables()
         self.session = None
@@ -26,6 +29,27 @@ class SQLiteConnector:
     def create_tables(self) -> None:
         """Create database tables if they don't exist."""
         Base.metadata.create_all(bind=self.engine)
+        self.add_missing_columns()
+
+    def add_missing_columns(self) -> None:
+        """Add columns that were added to the models after a table was created.
+
+        Lets workflow databases of earlier versions be used without recreating them.
+        """
+        inspector = inspect(self.engine)
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=self.engine.dialect)}"
+                    default = column.default.arg if column.default is not None and column.default.is_scalar else None
+                    if isinstance(default, (int, float)) and not isinstance(default, bool):
+                        ddl += f" DEFAULT {default}"
+                    elif isinstance(default, str):
+                        ddl += f" DEFAULT '{default}'"
+                    connection.execute(text(ddl))
         
     def get_session(self) -> Session:
         """Get a database session. Reuses existing session if available.
@@ -64,6 +88,8 @@ class ASEDBConnector:
         """
         self.db_path = Path(db_path)
         self.db = None
+        # Serializes access from calculations running concurrently in one allocation
+        self.lock = threading.RLock()
         
     def connect(self) -> None:
         """Connect to ASE database."""
@@ -77,9 +103,13 @@ class ASEDBConnector:
             
     def __enter__(self):
         """Context manager entry."""
+        self.lock.acquire()
         self.connect()
         return self
         
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit."""
-        self.disconnect() 
\ No newline at end of file
+        try:
+            self.disconnect()
+        finally:
+            self.lock.release() 
\ No newline at end of file
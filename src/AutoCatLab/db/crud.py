@@ -1,10 +1,12 @@
 """CRUD operations for AutoCatLab database."""
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 from typing import List, Optional, Dict, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import select
-from .models import WorkflowDetail, WorkflowBatchDetail, WorkflowBatchExecution
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import select, and_
+from .models import WorkflowDetail, WorkflowBatchDetail, WorkflowBatchExecution, WorkflowMaterial, \
+    WorkflowExecutionTiming, WorkflowJobArray, WorkflowSubmitDaemon, WorkflowExecutionLease, FINISHED_STATUSES
 
 class WorkflowCRUD:
     """CRUD operations for workflow details."""
@@ -56,6 +58,7 @@ class BatchCRUD:
             result_batch_dir= str(batch_data['result_batch_dir']),
             script_path= str(batch_data['script_path']),
             calculation_type=batch_data['calculation_type'],
+            partition=batch_data.get('partition'),
             start_time=datetime.now()
         )
         db.add(batch)
@@ -74,6 +77,15 @@ class BatchCRUD:
         return db.query(WorkflowBatchDetail).filter(WorkflowBatchDetail.batch_id == batch_id).first()
     
 
+    @staticmethod
+    def get_unsubmitted_batches(db: Session, workflow_unique_name: str) -> List[WorkflowBatchDetail]:
+        """Get batches of a workflow that still have to be submitted, in creation order."""
+        return db.query(WorkflowBatchDetail).filter(
+            WorkflowBatchDetail.workflow_unique_name == workflow_unique_name,
+            WorkflowBatchDetail.job_id.is_(None),
+            WorkflowBatchDetail.status != 'completed'
+        ).order_by(WorkflowBatchDetail.batch_id).all()
+
     @staticmethod
     def update_batch(db: Session, batch_id: int, batch_data: Dict[str, Any]) -> Optional[WorkflowBatchDetail]:
         """Update batch status."""
@@ -106,9 +118,26 @@ class ExecutionCRUD:
         """Get executions by batch ID."""
         return db.query(WorkflowBatchExecution).filter(
             WorkflowBatchExecution.batch_id == batch_id,
-            WorkflowBatchExecution.status != 'completed'
+            WorkflowBatchExecution.status.notin_(FINISHED_STATUSES)
             ).all()
     
+    @staticmethod
+    def get_workflow_executions(db: Session, workflow_unique_name: str,
+                                calculation_name: str) -> List[WorkflowBatchExecution]:
+        """Get all executions of a calculation in a workflow."""
+        return db.query(WorkflowBatchExecution).filter(
+            WorkflowBatchExecution.workflow_unique_name == workflow_unique_name,
+            WorkflowBatchExecution.calculation_name == calculation_name
+        ).order_by(WorkflowBatchExecution.execution_id).all()
+
+    @staticmethod
+    def get_computed_executions(db: Session, workflow_unique_name: str) -> List[WorkflowBatchExecution]:
+        """Get executions whose calculation finished but whose results are not ingested yet."""
+        return db.query(WorkflowBatchExecution).filter(
+            WorkflowBatchExecution.workflow_unique_name == workflow_unique_name,
+            WorkflowBatchExecution.status == 'computed'
+        ).order_by(WorkflowBatchExecution.execution_id).all()
+
     @staticmethod
     def get_execution(db: Session, execution_id: int) -> Optional[WorkflowBatchExecution]:
         """Get execution by ID."""
@@ -126,4 +155,260 @@ class ExecutionCRUD:
                 execution.end_time = datetime.now()
             db.commit()
             db.refresh(execution)
-        return execution 
\ No newline at end of file
+        return execution 
+
+class MaterialCRUD:
+    """CRUD operations for the workflow material index."""
+
+    @staticmethod
+    def create_material(db: Session, material_data: Dict[str, Any]) -> WorkflowMaterial:
+        """Register a material in the workflow index."""
+        system_size = material_data.get('system_size') or {}
+        material = WorkflowMaterial(
+            workflow_unique_name=material_data['workflow_unique_name'],
+            material_name=material_data['material_name'],
+            structure_hash=material_data.get('structure_hash'),
+            json_file_path=str(material_data['json_file_path']) if material_data.get('json_file_path') else None,
+            batch_id=material_data.get('batch_id'),
+            n_atoms=system_size.get('n_atoms'),
+            n_kpoints=system_size.get('n_kpoints'),
+            n_electrons=system_size.get('n_electrons'),
+            n_bands=system_size.get('n_bands'),
+            estimated_cost=system_size.get('cost'),
+            created_time=datetime.now()
+        )
+        db.add(material)
+        return material
+
+    @staticmethod
+    def get_materials(db: Session, workflow_unique_name: str, material_names: Optional[List[str]] = None) -> List[WorkflowMaterial]:
+        """Get registered materials by workflow unique name, optionally restricted to some names."""
+        query = db.query(WorkflowMaterial).filter(WorkflowMaterial.workflow_unique_name == workflow_unique_name)
+        if material_names is not None:
+            query = query.filter(WorkflowMaterial.material_name.in_(material_names))
+        return query.all()
+
+class TimingCRUD:
+    """CRUD operations for execution timings."""
+
+    @staticmethod
+    def create_timing(db: Session, timing_data: Dict[str, Any]) -> WorkflowExecutionTiming:
+        """Record the wall duration of an execution."""
+        timing = WorkflowExecutionTiming(
+            workflow_unique_name=timing_data['workflow_unique_name'],
+            execution_id=timing_data['execution_id'],
+            batch_id=timing_data['batch_id'],
+            material_name=timing_data['material_name'],
+            calculation_name=timing_data['calculation_name'],
+            partition=timing_data.get('partition'),
+            n_atoms=timing_data.get('n_atoms'),
+            n_kpoints=timing_data.get('n_kpoints'),
+            n_electrons=timing_data.get('n_electrons'),
+            n_bands=timing_data.get('n_bands'),
+            estimated_cost=timing_data.get('estimated_cost'),
+            wall_seconds=timing_data['wall_seconds'],
+            success=timing_data['success'],
+            start_time=timing_data['start_time'],
+            end_time=timing_data['end_time']
+        )
+        db.add(timing)
+        return timing
+
+    @staticmethod
+    def get_timings(db: Session, calculation_name: str, success: bool = True,
+                    partition: Optional[str] = None) -> List[WorkflowExecutionTiming]:
+        """Get timings of a calculation on a partition across all workflows sharing the database.
+
+        Timings of the step's default partition have no partition, so CPU timings are only
+        returned for ``partition='cpu'``.
+        """
+        return db.query(WorkflowExecutionTiming).filter(
+            WorkflowExecutionTiming.calculation_name == calculation_name,
+            WorkflowExecutionTiming.success == success,
+            WorkflowExecutionTiming.partition.is_(None) if partition is None
+            else WorkflowExecutionTiming.partition == partition
+            ).all()
+
+class JobArrayCRUD:
+    """CRUD operations for scheduler job arrays."""
+
+    @staticmethod
+    def create_job_array(db: Session, job_array_data: Dict[str, Any]) -> WorkflowJobArray:
+        """Create a new job array."""
+        job_array = WorkflowJobArray(
+            workflow_unique_name=job_array_data['workflow_unique_name'],
+            calculation_type=job_array_data['calculation_type'],
+            batch_ids=json.dumps(job_array_data['batch_ids']),
+            start_time=datetime.now()
+        )
+        db.add(job_array)
+        db.flush()  # This will generate the array_id without committing
+        return job_array
+
+    @staticmethod
+    def get_job_array(db: Session, array_id: int) -> Optional[WorkflowJobArray]:
+        """Get job array by ID."""
+        return db.query(WorkflowJobArray).filter(WorkflowJobArray.array_id == array_id).first()
+
+    @staticmethod
+    def get_batch_id(db: Session, array_id: int, task_id: int) -> Optional[int]:
+        """Get the batch run by a task of a job array."""
+        job_array = JobArrayCRUD.get_job_array(db, array_id)
+        if job_array is None:
+            return None
+        batch_ids = json.loads(job_array.batch_ids)
+        return batch_ids[task_id] if 0 <= task_id < len(batch_ids) else None
+
+class DaemonCRUD:
+    """CRUD operations for submission daemon state."""
+
+    @staticmethod
+    def get_daemon(db: Session, workflow_unique_name: str) -> Optional[WorkflowSubmitDaemon]:
+        """Get the daemon state of a workflow."""
+        return db.query(WorkflowSubmitDaemon).filter(
+            WorkflowSubmitDaemon.workflow_unique_name == workflow_unique_name).first()
+
+    @staticmethod
+    def start_daemon(db: Session, daemon_data: Dict[str, Any]) -> WorkflowSubmitDaemon:
+        """Register a running daemon, replacing the state of a previous one."""
+        daemon = DaemonCRUD.get_daemon(db, daemon_data['workflow_unique_name'])
+        if daemon is None:
+            daemon = WorkflowSubmitDaemon(workflow_unique_name=daemon_data['workflow_unique_name'])
+            db.add(daemon)
+        now = datetime.now()
+        daemon.hostname = daemon_data['hostname']
+        daemon.pid = daemon_data['pid']
+        daemon.status = 'running'
+        daemon.submitted_count = 0
+        daemon.start_time = now
+        daemon.last_heartbeat = now
+        daemon.end_time = None
+        db.commit()
+        return daemon
+
+    @staticmethod
+    def update_heartbeat(db: Session, daemon: WorkflowSubmitDaemon, pending_jobs: int, running_jobs: int,
+                         submitted: int) -> WorkflowSubmitDaemon:
+        """Record a polling round of the daemon."""
+        daemon.pending_jobs = pending_jobs
+        daemon.running_jobs = running_jobs
+        daemon.submitted_count += submitted
+        daemon.last_heartbeat = datetime.now()
+        db.commit()
+        return daemon
+
+    @staticmethod
+    def stop_daemon(db: Session, daemon: WorkflowSubmitDaemon) -> WorkflowSubmitDaemon:
+        """Mark a daemon as stopped."""
+        daemon.status = 'stopped'
+        daemon.end_time = datetime.now()
+        db.commit()
+        return daemon
+
+class LeaseCRUD:
+    """CRUD operations for execution leases of pilot workers."""
+
+    @staticmethod
+    def get_claimable_executions(db: Session, workflow_unique_name: str, calculation_type: str,
+                                 statuses: tuple = ('created', 'retry'),
+                                 limit: int = 20,
+                                 exclude_batch_id: Optional[int] = None) -> List[WorkflowBatchExecution]:
+        """Get executions a worker may claim, most expensive material first.
+
+        An execution is claimable when it has one of the given statuses and no lease, or its
+        lease expired before it finished, and every earlier step of the same material is
+        finished. Executions of ``exclude_batch_id`` are never claimable.
+        """
+        now = datetime.now()
+        previous = aliased(WorkflowBatchExecution)
+        blocked = select(previous.execution_id).where(
+            previous.batch_id == WorkflowBatchExecution.batch_id,
+            previous.material_name == WorkflowBatchExecution.material_name,
+            previous.execution_id < WorkflowBatchExecution.execution_id,
+            previous.status.notin_(FINISHED_STATUSES)
+        ).exists()
+
+        query = db.query(WorkflowBatchExecution).join(
+            WorkflowBatchDetail, WorkflowBatchDetail.batch_id == WorkflowBatchExecution.batch_id
+        ).outerjoin(
+            WorkflowExecutionLease, WorkflowExecutionLease.execution_id == WorkflowBatchExecution.execution_id
+        ).outerjoin(
+            WorkflowMaterial, and_(WorkflowMaterial.workflow_unique_name == WorkflowBatchExecution.workflow_unique_name,
+                                   WorkflowMaterial.material_name == WorkflowBatchExecution.material_name)
+        ).filter(
+            WorkflowBatchExecution.workflow_unique_name == workflow_unique_name,
+            WorkflowBatchDetail.calculation_type == calculation_type,
+            (WorkflowBatchExecution.status.in_(statuses) & WorkflowExecutionLease.execution_id.is_(None)) |
+            ((WorkflowBatchExecution.status.notin_(FINISHED_STATUSES + ('failed',))) & (WorkflowExecutionLease.expires_time < now)),
+            ~blocked
+        )
+        if exclude_batch_id is not None:
+            query = query.filter(WorkflowBatchExecution.batch_id != exclude_batch_id)
+        return query.order_by(
+            WorkflowMaterial.estimated_cost.is_(None),
+            WorkflowMaterial.estimated_cost.desc(),
+            WorkflowBatchExecution.execution_id
+        ).limit(limit).all()
+
+    @staticmethod
+    def claim_execution(db: Session, workflow_unique_name: str, calculation_type: str, worker_id: str,
+                        lease_seconds: float,
+                        statuses: tuple = ('created', 'retry'),
+                        exclude_batch_id: Optional[int] = None) -> Optional[WorkflowBatchExecution]:
+        """Atomically claim the next claimable execution.
+
+        Args:
+            db: Database session
+            workflow_unique_name: Name of the workflow
+            calculation_type: Calculation type of the batches to take executions from
+            worker_id: Identifier of the claiming worker
+            lease_seconds: Time after which the claim expires if the execution did not finish
+            statuses: Statuses of the executions to claim
+            exclude_batch_id: Batch whose executions are not claimed
+
+        Returns:
+            Optional[WorkflowBatchExecution]: Claimed execution, or None if nothing is claimable
+        """
+        for execution in LeaseCRUD.get_claimable_executions(db, workflow_unique_name, calculation_type, statuses,
+                                                            exclude_batch_id=exclude_batch_id):
+            now = datetime.now()
+            # Take over an expired lease only if no other worker did so in the meantime
+            expired = db.query(WorkflowExecutionLease).filter(
+                WorkflowExecutionLease.execution_id == execution.execution_id,
+                WorkflowExecutionLease.expires_time < now
+            ).delete(synchronize_session=False)
+            if not expired and db.query(WorkflowExecutionLease).filter(
+                    WorkflowExecutionLease.execution_id == execution.execution_id).first():
+                db.rollback()
+                continue
+
+            db.add(WorkflowExecutionLease(
+                execution_id=execution.execution_id,
+                worker_id=worker_id,
+                claimed_time=now,
+                expires_time=now + timedelta(seconds=lease_seconds)
+            ))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                continue
+            return execution
+        return None
+
+    @staticmethod
+    def release_execution(db: Session, execution_id: int) -> None:
+        """Release the lease of an execution."""
+        db.query(WorkflowExecutionLease).filter(
+            WorkflowExecutionLease.execution_id == execution_id).delete(synchronize_session=False)
+        db.commit()
+
+    @staticmethod
+    def count_active_leases(db: Session, workflow_unique_name: str) -> int:
+        """Count the unexpired leases of a workflow."""
+        return db.query(WorkflowExecutionLease).join(
+            WorkflowBatchExecution, WorkflowBatchExecution.execution_id == WorkflowExecutionLease.execution_id
+        ).filter(
+            WorkflowBatchExecution.workflow_unique_name == workflow_unique_name,
+            WorkflowExecutionLease.expires_time >= datetime.now()
+        ).count()
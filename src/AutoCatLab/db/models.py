@@ -1,10 +1,13 @@
 """Database models for AutoCatLab."""
 from datetime import datetime
-from sqlalchemy import Column, String, DateTime, Boolean, Text, Integer, ForeignKey
+from sqlalchemy import Column, String, DateTime, Boolean, Text, Integer, Float, ForeignKey
 from sqlalchemy.orm import relationship, declarative_base
 
 Base = declarative_base()
 
+# Execution statuses of finished calculations, computed ones still wait for `autocatlab ingest`
+FINISHED_STATUSES = ('completed', 'computed')
+
 class WorkflowDetail(Base):
     """Model for workflow details."""
     __tablename__ = 'workflow_details'
@@ -20,6 +23,7 @@ class WorkflowDetail(Base):
     # Relationships
     batches = relationship("WorkflowBatchDetail", back_populates="workflow")
     executions = relationship("WorkflowBatchExecution", back_populates="workflow")
+    materials = relationship("WorkflowMaterial", back_populates="workflow")
 
 class WorkflowBatchDetail(Base):
     """Model for workflow batch details."""
@@ -32,6 +36,7 @@ class WorkflowBatchDetail(Base):
     result_batch_dir = Column(String(255), nullable=False)  # Batch directory path
     script_path = Column(String(255), nullable=False)  # Script path
     job_id = Column(String(255))
+    partition = Column(String(50))  # cpu when routed to the CPU partition, otherwise the step's default
     status = Column(String(50), default='created')
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime)
@@ -54,6 +59,9 @@ class WorkflowBatchExecution(Base):
     script_path = Column(String(255), nullable=False)
     calculation_name = Column(String(255), nullable=False)
     status = Column(String(50), default='created')
+    attempts = Column(Integer, default=0)
+    restart_count = Column(Integer, default=0)  # Relaxation restarts from the last ionic step
+    parameter_overrides = Column(Text)  # JSON list of INCAR and launch settings changed by the parallelization rules
     start_time = Column(DateTime, nullable=False)
     end_time = Column(DateTime)
     success = Column(Boolean, default=True)
@@ -61,4 +69,84 @@ class WorkflowBatchExecution(Base):
     
     # Relationships
     workflow = relationship("WorkflowDetail", back_populates="executions")
-    batch = relationship("WorkflowBatchDetail", back_populates="executions") 
\ No newline at end of file
+    batch = relationship("WorkflowBatchDetail", back_populates="executions") 
+
+class WorkflowMaterial(Base):
+    """Model for the index of materials registered in a workflow."""
+    __tablename__ = 'workflow_materials'
+
+    material_id = Column(Integer, primary_key=True, autoincrement=True)
+    workflow_unique_name = Column(String(36), ForeignKey('workflow_details.calc_unique_name'), nullable=False)
+    material_name = Column(String(255), nullable=False)
+    structure_hash = Column(String(64), index=True)
+    json_file_path = Column(String(255))
+    batch_id = Column(Integer, ForeignKey('workflow_batch_details.batch_id'))
+    n_atoms = Column(Integer)
+    n_kpoints = Column(Integer)
+    n_electrons = Column(Integer)
+    n_bands = Column(Integer)
+    estimated_cost = Column(Float)
+    created_time = Column(DateTime, nullable=False)
+
+    # Relationships
+    workflow = relationship("WorkflowDetail", back_populates="materials")
+
+class WorkflowExecutionTiming(Base):
+    """Model for wall durations of finished executions with their system size features."""
+    __tablename__ = 'workflow_execution_timings'
+
+    timing_id = Column(Integer, primary_key=True, autoincrement=True)
+    workflow_unique_name = Column(String(36), ForeignKey('workflow_details.calc_unique_name'), nullable=False)
+    execution_id = Column(Integer, ForeignKey('workflow_batch_executions.execution_id'), nullable=False)
+    batch_id = Column(Integer, ForeignKey('workflow_batch_details.batch_id'), nullable=False)
+    material_name = Column(String(255), nullable=False)
+    calculation_name = Column(String(255), nullable=False, index=True)
+    partition = Column(String(50))  # Partition of the batch, None for the step's default
+    n_atoms = Column(Integer)
+    n_kpoints = Column(Integer)
+    n_electrons = Column(Integer)
+    n_bands = Column(Integer)
+    estimated_cost = Column(Float)
+    wall_seconds = Column(Float, nullable=False)
+    success = Column(Boolean, default=True)
+    start_time = Column(DateTime, nullable=False)
+    end_time = Column(DateTime, nullable=False)
+
+class WorkflowJobArray(Base):
+    """Model for scheduler job arrays running several batches."""
+    __tablename__ = 'workflow_job_arrays'
+
+    array_id = Column(Integer, primary_key=True, autoincrement=True)
+    workflow_unique_name = Column(String(36), ForeignKey('workflow_details.calc_unique_name'), nullable=False)
+    calculation_type = Column(Text, nullable=False)  # DFT or ICOHP
+    batch_ids = Column(Text, nullable=False)  # JSON list of batch ids, indexed by array task id
+    script_path = Column(String(255))
+    job_id = Column(String(255))
+    start_time = Column(DateTime, nullable=False)
+
+class WorkflowSubmitDaemon(Base):
+    """Model for the state of the submission daemon of a workflow."""
+    __tablename__ = 'workflow_submit_daemons'
+
+    workflow_unique_name = Column(String(36), ForeignKey('workflow_details.calc_unique_name'), primary_key=True)
+    hostname = Column(String(255), nullable=False)
+    pid = Column(Integer, nullable=False)
+    status = Column(String(50), default='running')  # running or stopped
+    submitted_count = Column(Integer, default=0)
+    pending_jobs = Column(Integer, default=0)
+    running_jobs = Column(Integer, default=0)
+    start_time = Column(DateTime, nullable=False)
+    last_heartbeat = Column(DateTime, nullable=False)
+    end_time = Column(DateTime)
+
+class WorkflowExecutionLease(Base):
+    """Model for the lease of an execution claimed by a pilot worker.
+
+    The execution id is the primary key, so inserting a lease is an atomic claim.
+    """
+    __tablename__ = 'workflow_execution_leases'
+
+    execution_id = Column(Integer, ForeignKey('workflow_batch_executions.execution_id'), primary_key=True)
+    worker_id = Column(String(255), nullable=False)
+    claimed_time = Column(DateTime, nullable=False)
+    expires_time = Column(DateTime, nullable=False)
@@ -1,12 +1,50 @@
 """Batch executor manager for workflow."""
+import json
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Any, Dict, Optional
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import inspect
 from AutoCatLab.executor.calculation_executor import CalculationExecutor
 from AutoCatLab.executor.dft_relax_executor import DFTRelaxExecutor
 from AutoCatLab.executor.dft_dos_executor import DFTDOSExecutor
 from AutoCatLab.executor.icohp_executor import ICOHPExecutor
+from AutoCatLab.db.models import WorkflowBatchDetail, WorkflowBatchExecution, FINISHED_STATUSES
+from AutoCatLab.util.scheduler import get_job_time_left
+from AutoCatLab.util.util import get_bool_env, get_step_config, parse_walltime
 import traceback
 
+# Executor class of every calculation
+CALCULATION_EXECUTORS = {
+    'BULK_DFT_RELAX': DFTRelaxExecutor,
+    'BULK_DFT_DOS': DFTDOSExecutor,
+    'BULK_ICOHP': ICOHPExecutor,
+    'SURFACE_DFT_RELAX': DFTRelaxExecutor,
+    'SURFACE_DFT_DOS': DFTDOSExecutor
+}
+
+# Calculations depending on a calculation of the same material in another batch
+PREREQUISITES = {
+    'BULK_ICOHP': 'BULK_DFT_DOS'
+}
+
+# Execution columns an executor running in a worker thread may change
+EXECUTION_RESULT_FIELDS = ('status', 'success', 'error', 'restart_count')
+
+
+def get_snapshot(instance: Any) -> SimpleNamespace:
+    """Copy the column values of an ORM object into a plain object for a worker thread.
+
+    Sessions are not thread-safe, and a commit of the main thread expires the ORM objects,
+    so reading them in a worker would lazily load through the shared session.
+    """
+    return SimpleNamespace(**{column.key: getattr(instance, column.key)
+                              for column in inspect(instance).mapper.column_attrs})
+
+
 class BatchExecutorManager:
     """Manager for executing calculation batches."""
     
@@ -29,18 +67,457 @@ class BatchExecutorManager:
         Returns:
             Optional[CalculationExecutor]: Calculation executor instance or None if type not supported
         """
-        calculation_map = {
-            'BULK_DFT_RELAX': DFTRelaxExecutor,
-            'BULK_DFT_DOS': DFTDOSExecutor,
-            'BULK_ICOHP': ICOHPExecutor,
-            'SURFACE_DFT_RELAX': DFTRelaxExecutor,
-            'SURFACE_DFT_DOS': DFTDOSExecutor
-        }
-        
-        executor_class = calculation_map.get(calculation_name)
+        executor_class = CALCULATION_EXECUTORS.get(calculation_name)
             
         return executor_class(self.container)
     
+    def record_timing(self, batch_detail: WorkflowBatchDetail, execution: WorkflowBatchExecution,
+                      wall_seconds: float) -> None:
+        """Record the wall duration of an execution with the system size of its material.
+
+        Args:
+            batch_detail: Batch details from database
+            execution: Finished execution
+            wall_seconds: Wall duration of the execution in seconds
+        """
+        if get_bool_env('local_dev'):
+            return
+
+        session = self.container.get('sqlite_connector').get_session()
+        materials = self.container.get('material_crud').get_materials(
+            session, execution.workflow_unique_name, [execution.material_name])
+        material = materials[0] if materials else None
+        self.container.get('timing_crud').create_timing(session, {
+            'workflow_unique_name': execution.workflow_unique_name,
+            'execution_id': execution.execution_id,
+            'batch_id': batch_detail.batch_id,
+            'material_name': execution.material_name,
+            'calculation_name': execution.calculation_name,
+            'partition': batch_detail.partition,
+            'n_atoms': material.n_atoms if material else None,
+            'n_kpoints': material.n_kpoints if material else None,
+            'n_electrons': material.n_electrons if material else None,
+            'n_bands': material.n_bands if material else None,
+            'estimated_cost': material.estimated_cost if material else None,
+            'wall_seconds': wall_seconds,
+            'success': execution.status in FINISHED_STATUSES,
+            'start_time': execution.start_time,
+            'end_time': execution.end_time
+        })
+
+    def store_overrides(self, execution: WorkflowBatchExecution,
+                        overrides: Optional[List[Dict[str, Any]]]) -> None:
+        """Store the settings changed by the parallelization rules with an execution.
+
+        Args:
+            execution: Finished execution
+            overrides: Overrides returned by the executor, None if the rules are disabled
+        """
+        if overrides is not None:
+            execution.parameter_overrides = json.dumps(overrides)
+
+    def is_ready(self, execution: WorkflowBatchExecution) -> bool:
+        """Check whether the calculation an execution depends on in another batch is completed.
+
+        ICOHP batches scheduled with a scheduler dependency may start after a DFT job that
+        failed for some of their materials.
+        """
+        prerequisite = PREREQUISITES.get(execution.calculation_name)
+        if prerequisite is None:
+            return True
+        executions = self.container.get('execution_crud').get_workflow_executions(
+            self.container.get('sqlite_connector').get_session(),
+            execution.workflow_unique_name,
+            prerequisite)
+        return any(previous.material_name == execution.material_name and previous.status in FINISHED_STATUSES
+                   for previous in executions)
+
+    def run_execution(
+        self,
+        config: Dict[str, Any],
+        workflow_detail: Any,
+        batch_detail: WorkflowBatchDetail,
+        execution: WorkflowBatchExecution
+    ) -> bool:
+        """Run a single execution and record its status and timing.
+
+        Args:
+            config: Workflow configuration
+            workflow_detail: Workflow details from database
+            batch_detail: Batch details from database
+            execution: Execution to run
+
+        Returns:
+            bool: True if the execution completed successfully
+        """
+        session = self.container.get('sqlite_connector').get_session()
+        executor = self.get_calculation(execution.calculation_name)
+
+        execution.status = 'running'
+        execution.attempts = (execution.attempts or 0) + 1
+        execution.start_time = datetime.now()
+        session.commit()
+
+        started = time.monotonic()
+        success = executor.execute_calculation(config, workflow_detail, batch_detail, execution)
+        self.store_overrides(execution, executor.parameter_overrides)
+        execution.end_time = datetime.now()
+        self.record_timing(batch_detail, execution, time.monotonic() - started)
+        if not success:
+            self.queue_retry(config, execution)
+
+        session.commit()
+        return success
+
+    def queue_retry(self, config: Dict[str, Any], execution: WorkflowBatchExecution) -> None:
+        """Put a failed execution into the retry queue unless it used up its attempts.
+
+        Args:
+            config: Workflow configuration
+            execution: Failed execution
+        """
+        if (execution.attempts or 0) < config['retry']['max_attempts']:
+            execution.status = 'retry'
+            self.logger.info(f"Queued {execution.calculation_name} of {execution.material_name} for retry "
+                             f"(attempt {execution.attempts} of {config['retry']['max_attempts']})")
+
+    def drain_retry_queue(self, config: Dict[str, Any], workflow_detail: Any, calculation_type: str,
+                          batch_id: int) -> None:
+        """Run executions of other batches from the retry queue in the remaining allocation time.
+
+        A retried execution is claimed with a lease so that no other batch runs it at the
+        same time. When it succeeds, the steps of its material that were skipped after the
+        failure run as well. Executions the draining batch just failed itself are left to a
+        later allocation, e.g. another batch, a pilot worker or resume.
+
+        Args:
+            config: Workflow configuration
+            workflow_detail: Workflow details from database
+            calculation_type: Calculation type of the batches to take executions from
+            batch_id: ID of the draining batch
+        """
+        session = self.container.get('sqlite_connector').get_session()
+        lease_crud = self.container.get('lease_crud')
+        deadline = self.get_worker_deadline(None)
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{os.environ.get('SLURM_JOB_ID', '')}"
+
+        while True:
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining < config['retry']['min_remaining_minutes'] * 60:
+                break
+            lease_seconds = remaining if remaining is not None else config['pilot']['lease_hours'] * 3600
+            execution = lease_crud.claim_execution(session, workflow_detail.calc_unique_name, calculation_type,
+                                                   worker_id, lease_seconds, statuses=('retry',),
+                                                   exclude_batch_id=batch_id)
+            if execution is None:
+                break
+
+            batch_detail = execution.batch
+            chain = [execution] + [later for later in batch_detail.executions
+                                   if later.material_name == execution.material_name
+                                   and later.execution_id > execution.execution_id
+                                   and later.status == 'created']
+            self.logger.info(f"Retrying {execution.calculation_name} of {execution.material_name} "
+                             f"from batch {batch_detail.batch_id}")
+            for chain_execution in sorted(chain, key=lambda e: e.execution_id):
+                if not self.run_execution(config, workflow_detail, batch_detail, chain_execution):
+                    break
+
+            self.refresh_batch_status(batch_detail)
+            session.commit()
+            lease_crud.release_execution(session, execution.execution_id)
+
+    def is_concurrent(self, config: Dict[str, Any], batch_detail: WorkflowBatchDetail) -> bool:
+        """Check whether the executions of a batch share its allocation concurrently."""
+        step_config = get_step_config(config, batch_detail.calculation_type, batch_detail.partition)
+        submission_detail = step_config.get('submission_detail', {})
+        return (config['concurrency']['enabled'] and step_config['scheduler']['type'] != 'local'
+                and 'nTask' in submission_detail and 'gpu' in submission_detail)
+
+    def get_slot_share(self, config: Dict[str, Any], n_atoms: Optional[int]) -> float:
+        """Get the share of the allocation used by a material of the given size.
+
+        Args:
+            config: Workflow configuration
+            n_atoms: Number of atoms of the material, None if unknown
+
+        Returns:
+            float: Share of the allocation, the whole allocation for unknown sizes
+        """
+        if n_atoms is None:
+            return 1.0
+        for rule in config['concurrency']['slot_rules']:
+            if rule.get('max_atoms') is None or n_atoms <= rule['max_atoms']:
+                return min(1.0, rule['share'])
+        return 1.0
+
+    def get_slot(self, config: Dict[str, Any], batch_detail: WorkflowBatchDetail, share: float) -> Dict[str, int]:
+        """Get the nodes, tasks and GPUs making up a share of the allocation."""
+        submission_detail = get_step_config(config, batch_detail.calculation_type, batch_detail.partition)['submission_detail']
+        return {
+            'nodes': max(1, round(submission_detail.get('node', 1) * share)),
+            'tasks': max(1, round(submission_detail['nTask'] * share)),
+            'gpus': max(1, round(submission_detail['gpu'] * share))
+        }
+
+    def run_in_slot(
+        self,
+        config: Dict[str, Any],
+        workflow_detail: SimpleNamespace,
+        batch_detail: SimpleNamespace,
+        execution: SimpleNamespace,
+        slot: Dict[str, int]
+    ) -> Tuple[bool, float, SimpleNamespace, Optional[List[Dict[str, Any]]]]:
+        """Run an execution in a slot. Called from a worker thread with snapshots of the DB objects.
+
+        Returns:
+            Tuple[bool, float, SimpleNamespace, Optional[List[Dict[str, Any]]]]: Success, wall
+                duration in seconds, the execution snapshot with the status set by the executor
+                and the parallelization overrides
+        """
+        started = time.monotonic()
+        executor = self.get_calculation(execution.calculation_name)
+        try:
+            success = executor.execute_calculation(config, workflow_detail, batch_detail, execution, slot)
+        except Exception as e:
+            self.logger.error(f"Error executing {execution.execution_id}: {str(e)}" + traceback.format_exc())
+            execution.status = 'failed'
+            execution.success = False
+            execution.error = str(e)
+            success = False
+        return success, time.monotonic() - started, execution, executor.parameter_overrides
+
+    def run_concurrent(
+        self,
+        config: Dict[str, Any],
+        workflow_detail: Any,
+        batch_detail: WorkflowBatchDetail,
+        executions: List[WorkflowBatchExecution]
+    ) -> bool:
+        """Run the executions of a batch concurrently on slots of its allocation.
+
+        Every material gets a share of the allocation from ``concurrency.slot_rules`` based on
+        its number of atoms and runs its steps in order on that slot as exclusive job steps.
+        Materials are started largest first whenever enough of the allocation is free. Worker
+        threads get snapshots of the DB objects, and the changes of their executions are
+        applied to the ORM objects and committed in this thread only.
+
+        Args:
+            config: Workflow configuration
+            workflow_detail: Workflow details from database
+            batch_detail: Batch details from database
+            executions: Executions to run, in step order per material
+
+        Returns:
+            bool: True if all executions completed successfully
+        """
+        session = self.container.get('sqlite_connector').get_session()
+        chains: Dict[str, List[WorkflowBatchExecution]] = {}
+        for execution in executions:
+            chains.setdefault(execution.material_name, []).append(execution)
+
+        materials = self.container.get('material_crud').get_materials(
+            session, workflow_detail.calc_unique_name, list(chains))
+        n_atoms = {material.material_name: material.n_atoms for material in materials}
+        shares = {name: self.get_slot_share(config, n_atoms.get(name)) for name in chains}
+        pending = sorted(chains, key=lambda name: shares[name], reverse=True)
+        workflow_snapshot = get_snapshot(workflow_detail)
+        batch_snapshot = get_snapshot(batch_detail)
+
+        free = 1.0
+        success = True
+        running = {}
+        with ThreadPoolExecutor(max_workers=len(chains)) as pool:
+
+            def launch(material_name: str) -> None:
+                execution = chains[material_name].pop(0)
+                execution.status = 'running'
+                execution.attempts = (execution.attempts or 0) + 1
+                execution.start_time = datetime.now()
+                session.commit()
+                slot = self.get_slot(config, batch_detail, shares[material_name])
+                self.logger.info(f"Running {execution.calculation_name} for {material_name} on {slot}")
+                future = pool.submit(self.run_in_slot, config, workflow_snapshot, batch_snapshot,
+                                     get_snapshot(execution), slot)
+                running[future] = (material_name, execution)
+
+            while pending or running:
+                for material_name in list(pending):
+                    if shares[material_name] <= free + 1e-9:
+                        pending.remove(material_name)
+                        free -= shares[material_name]
+                        launch(material_name)
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    material_name, execution = running.pop(future)
+                    execution_success, wall_seconds, snapshot, overrides = future.result()
+                    for field in EXECUTION_RESULT_FIELDS:
+                        setattr(execution, field, getattr(snapshot, field))
+                    self.store_overrides(execution, overrides)
+                    execution.end_time = datetime.now()
+                    self.record_timing(batch_detail, execution, wall_seconds)
+                    if not execution_success:
+                        self.queue_retry(config, execution)
+                    session.commit()
+
+                    if execution_success and chains[material_name]:
+                        launch(material_name)
+                        continue
+                    if not execution_success:
+                        success = False
+                    free += shares[material_name]
+
+        return success
+
+    def refresh_batch_status(self, batch_detail: WorkflowBatchDetail) -> None:
+        """Derive the status of a batch from its executions once none is left to run.
+
+        Args:
+            batch_detail: Batch details from database
+        """
+        statuses = [execution.status for execution in batch_detail.executions]
+        if any(status not in FINISHED_STATUSES + ('failed',) for status in statuses):
+            if batch_detail.status == 'created':
+                batch_detail.status = 'running'
+            return
+
+        success = all(status in FINISHED_STATUSES for status in statuses)
+        batch_detail.status = 'completed' if success else 'failed'
+        batch_detail.success = success
+        batch_detail.end_time = datetime.now()
+
+    def get_worker_deadline(self, walltime: Optional[str]) -> Optional[float]:
+        """Get the monotonic time at which the allocation of a worker ends.
+
+        Args:
+            walltime: Walltime of the worker as ``[D-]HH:MM:SS``; queried from SLURM if not given
+
+        Returns:
+            Optional[float]: Deadline, or None if the allocation has no known time limit
+        """
+        if walltime:
+            seconds = parse_walltime(walltime)
+        elif os.environ.get('SLURM_JOB_ID'):
+            seconds = get_job_time_left(os.environ['SLURM_JOB_ID'])
+        else:
+            seconds = None
+        return time.monotonic() + seconds if seconds is not None else None
+
+    def run_worker(
+        self,
+        config: Dict[str, Any],
+        workflow_name: str,
+        calculation_type: str,
+        walltime: Optional[str] = None
+    ) -> bool:
+        """Run executions claimed from the workflow DB until no work or time is left.
+
+        Executions are claimed with a lease that ends with the allocation, so work of a
+        worker that dies is picked up again by another worker. A worker stops when less
+        than ``pilot.min_remaining_minutes`` are left, or less than the predicted time of
+        the claimed execution.
+
+        Args:
+            config: Workflow configuration
+            workflow_name: Name of the workflow
+            calculation_type: Calculation type of the batches to take executions from
+            walltime: Walltime of the allocation, queried from SLURM if not given
+
+        Returns:
+            bool: True if all executions run by the worker completed successfully
+        """
+        params = config['pilot']
+        deadline = self.get_worker_deadline(walltime)
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{os.environ.get('SLURM_JOB_ID', '')}"
+        predictor = self.container.get('walltime_predictor')
+        lease_crud = self.container.get('lease_crud')
+
+        with self.container.get('sqlite_connector') as connector:
+            session = connector.get_session()
+            workflow_detail = self.container.get('workflow_crud').get_workflow(session, workflow_name)
+            if not workflow_detail:
+                self.logger.error(f"Workflow {workflow_name} not found")
+                return False
+
+            success = True
+            while True:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining < params['min_remaining_minutes'] * 60:
+                    self.logger.info(f"Worker {worker_id} stopping with {remaining / 60:.0f} minutes left")
+                    break
+
+                lease_seconds = remaining if remaining is not None else params['lease_hours'] * 3600
+                execution = lease_crud.claim_execution(session, workflow_name, calculation_type, worker_id,
+                                                       lease_seconds)
+                if execution is None:
+                    # Running executions of other workers may still unblock later steps
+                    if lease_crud.count_active_leases(session, workflow_name):
+                        time.sleep(params['poll_seconds'])
+                        session.expire_all()
+                        continue
+                    self.logger.info(f"Worker {worker_id} found no more executions to run")
+                    break
+
+                materials = self.container.get('material_crud').get_materials(
+                    session, workflow_name, [execution.material_name])
+                predicted = predictor.predict_seconds(
+                    execution.calculation_name, materials[0].estimated_cost,
+                    execution.batch.partition) if materials else None
+                if remaining is not None and predicted is not None and predicted > remaining:
+                    self.logger.info(f"Worker {worker_id} stopping, execution {execution.execution_id} needs "
+                                     f"{predicted / 60:.0f} of {remaining / 60:.0f} remaining minutes")
+                    lease_crud.release_execution(session, execution.execution_id)
+                    break
+
+                batch_detail = execution.batch
+                self.logger.info(f"Worker {worker_id} running {execution.calculation_name} "
+                                 f"for {execution.material_name}")
+                try:
+                    if not self.run_execution(config, workflow_detail, batch_detail, execution):
+                        success = False
+                except Exception as e:
+                    self.logger.error(f"Error executing {execution.execution_id}: {str(e)}" + traceback.format_exc())
+                    session.rollback()
+                    execution.status = 'failed'
+                    execution.success = False
+                    execution.error = str(e)
+                    self.queue_retry(config, execution)
+                    success = False
+
+                self.refresh_batch_status(batch_detail)
+                session.commit()
+                lease_crud.release_execution(session, execution.execution_id)
+
+            return success
+
+    def execute_array_task(
+        self,
+        config: Dict[str, Any],
+        workflow_name: str,
+        array_id: int,
+        task_id: int
+    ) -> bool:
+        """Execute the batch mapped to a task of a job array.
+
+        Args:
+            config: Workflow configuration
+            workflow_name: Name of the workflow
+            array_id: ID of the job array
+            task_id: Scheduler array task index
+
+        Returns:
+            bool: True if the batch completed successfully
+        """
+        batch_id = self.container.get('job_array_crud').get_batch_id(
+            self.container.get('sqlite_connector').get_session(),
+            array_id,
+            task_id)
+        if batch_id is None:
+            self.logger.error(f"No batch found for task {task_id} of job array {array_id}")
+            return False
+        return self.execute_batch(config, workflow_name, batch_id)
+
     def execute_batch(
         self,
         config: Dict[str, Any],
@@ -79,21 +556,31 @@ class BatchExecutorManager:
                 batch_detail.status = 'running'
                 connector.get_session().commit()
                 
-                success = True
-                for execution in executions:
-                    executor = self.get_calculation(execution.calculation_name)
-                    
-                    execution.status = 'running'
-                    execution.started_at = datetime.now()
-                    connector.get_session().commit()
-
-                    if not executor.execute_calculation(config, workflow_detail, batch_detail, execution):
-                        success = False
-                    
-                    connector.get_session().commit()
+                if self.is_concurrent(config, batch_detail):
+                    success = self.run_concurrent(config, workflow_detail, batch_detail, executions)
+                else:
+                    success = True
+                    failed_materials = set()
+                    for execution in executions:
+                        # Later steps of a failed material depend on it and wait for its retry
+                        if execution.material_name in failed_materials:
+                            continue
+                        if not self.is_ready(execution):
+                            self.logger.warning(f"Skipping {execution.calculation_name} of {execution.material_name}, "
+                                                f"{PREREQUISITES[execution.calculation_name]} is not completed")
+                            failed_materials.add(execution.material_name)
+                            success = False
+                            continue
+                        if not self.run_execution(config, workflow_detail, batch_detail, execution):
+                            success = False
+                            if not config['retry']['continue_on_failure']:
+                                break
+                            failed_materials.add(execution.material_name)
 
-                    if not success:
-                        break
+                if config['retry']['drain_queue'] and not get_bool_env('local_dev'):
+                    self.drain_retry_queue(config, workflow_detail, batch_detail.calculation_type,
+                                           batch_detail.batch_id)
+                    success = all(execution.status in FINISHED_STATUSES for execution in batch_detail.executions)
                     
                 batch_detail.status = 'completed' if success else 'failed'
                 batch_detail.success = success
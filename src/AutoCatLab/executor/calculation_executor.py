@@ -1,7 +1,16 @@
 """Calculation executor interface."""
+import math
 from abc import ABC, abstractmethod
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ase.calculators.vasp import Vasp
+
 from AutoCatLab.db.models import WorkflowDetail, WorkflowBatchDetail, WorkflowBatchExecution
+from AutoCatLab.executor.util.potcar_cache import CachedPotcarVasp, get_cache_dir
+from AutoCatLab.executor.util.parallelization import get_irreducible_kpoints, get_parallel_settings
+from AutoCatLab.executor.util.potcar_index import get_calculation_potcars, get_min_encut
+from AutoCatLab.util.cost_model import get_system_size
+from AutoCatLab.util.util import get_step_config
 
 
 class CalculationExecutor(ABC):
@@ -16,6 +25,8 @@ class CalculationExecutor(ABC):
         self.container = container
         self.logger = container.get('logger')
         self.config = container.get('config')
+        # Settings changed by the parallelization rules in the last run, stored by the batch executor
+        self.parameter_overrides: Optional[List[Dict[str, Any]]] = None
     
     @abstractmethod
     def execute_calculation(
@@ -23,7 +34,8 @@ class CalculationExecutor(ABC):
         config: Dict[str, Any],
         workflow_detail: WorkflowDetail,
         batch_detail: WorkflowBatchDetail,
-        execution: WorkflowBatchExecution
+        execution: WorkflowBatchExecution,
+        slot: Optional[Dict[str, int]] = None
     ) -> bool:
         """Execute the calculation.
         
@@ -32,18 +44,248 @@ class CalculationExecutor(ABC):
             workflow_detail: Workflow details from database
             batch_detail: Batch details from database
             execution: Execution details from database
+            slot: Nodes, tasks and GPUs of the allocation to run in, the whole allocation if None
             
         Returns:
             bool: True if calculation executed successfully
         """
         pass
 
+    def get_vasp_command(
+        self,
+        config: Dict[str, Any],
+        batch_detail: WorkflowBatchDetail,
+        slot: Optional[Dict[str, int]] = None
+    ) -> str:
+        """Get the srun command launching VASP.
+
+        Without a slot VASP uses the whole allocation. With a slot it runs as an exclusive
+        job step on part of it, so several calculations can share the allocation. Batches
+        routed to the CPU partition launch VASP without GPUs. Batches run by the local
+        scheduler use its ``vasp_command``, where ``{cpus}`` is replaced by the CPUs of the batch.
+
+        Args:
+            config: Configuration dictionary
+            batch_detail: Batch details from database
+            slot: Nodes, tasks and GPUs to use
+
+        Returns:
+            str: VASP command
+        """
+        step_config = get_step_config(config, batch_detail.calculation_type, batch_detail.partition)
+        if step_config['scheduler']['type'] == 'local':
+            scheduler_config = step_config['scheduler']
+            return scheduler_config['vasp_command'].format(cpus=scheduler_config.get('cpus_per_batch', 1))
+
+        submission_detail = step_config['submission_detail']
+        cpus_per_task = submission_detail['cpusPertask']
+        if batch_detail.partition == 'cpu':
+            tasks = slot['tasks'] if slot else submission_detail['nTask']
+            return f"srun -n {tasks} -c {cpus_per_task} --cpu-bind=cores vasp_std"
+        if slot is None:
+            return (f"srun -n {submission_detail['nTask']} -c {cpus_per_task} "
+                    f"--cpu-bind=cores --gpu-bind=none -G {submission_detail['gpu']} vasp_std")
+        return (f"srun --exclusive -N {slot['nodes']} -n {slot['tasks']} -c {cpus_per_task} "
+                f"--cpu-bind=cores --gpu-bind=none -G {slot['gpus']} vasp_std")
+
+    def get_calculator(self, config: Dict[str, Any], vasp_params: Dict[str, Any]) -> Any:
+        """Create the Vasp calculator of a calculation.
+
+        With ``potcar_cache.enabled`` the POTCAR is linked from the node-local cache of
+        assembled and sanitized POTCARs instead of being concatenated from VASP_PP_PATH.
+
+        Args:
+            config: Configuration dictionary
+            vasp_params: VASP calculator parameters
+
+        Returns:
+            Any: Vasp calculator
+        """
+        potcar_cache = config['potcar_cache']
+        if potcar_cache['enabled']:
+            return CachedPotcarVasp(potcar_cache_dir=get_cache_dir(potcar_cache['directory']), **vasp_params)
+        return Vasp(**vasp_params)
+
+    def check_encut(
+        self,
+        execution: WorkflowBatchExecution,
+        atoms: Any,
+        vasp_params: Dict[str, Any]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Warn if ENCUT is below the recommended cutoff of the POTCARs of a calculation.
+
+        Args:
+            execution: Execution details from database
+            atoms: ASE Atoms object of the calculation
+            vasp_params: VASP calculator parameters
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: POTCAR metadata of every species, None without VASP_PP_PATH
+        """
+        potcars = get_calculation_potcars(atoms, vasp_params)
+        if potcars and 'encut' in vasp_params:
+            min_encut = get_min_encut(potcars, cell_relax=vasp_params.get('isif', 2) >= 3)
+            if vasp_params['encut'] < min_encut:
+                self.logger.warning(f"ENCUT {vasp_params['encut']} of {execution.calculation_name} for "
+                                    f"{execution.material_name} is below the recommended {min_encut:.0f} eV")
+        return potcars
+
+    def apply_parallel_rules(
+        self,
+        config: Dict[str, Any],
+        batch_detail: WorkflowBatchDetail,
+        execution: WorkflowBatchExecution,
+        atoms: Any,
+        kpoints: Sequence[int],
+        vasp_params: Dict[str, Any],
+        slot: Optional[Dict[str, int]] = None,
+        n_bands: Optional[int] = None
+    ) -> Tuple[Optional[Dict[str, int]], Optional[List[Dict[str, Any]]]]:
+        """Tune the parallelization and INCAR settings of a calculation to its system size.
+
+        KPAR, NCORE, NSIM and LREAL are set in ``vasp_params`` and the tasks and GPUs of the
+        launch are derived from the atoms, k-points and bands. Every value that differs from
+        the configured one is returned as an override. The execution is not changed, as this
+        may run in a worker thread.
+
+        Args:
+            config: Configuration dictionary
+            batch_detail: Batch details from database
+            execution: Execution details from database
+            atoms: ASE Atoms object of the calculation
+            kpoints: k-point mesh
+            vasp_params: VASP calculator parameters, updated in place
+            slot: Nodes, tasks and GPUs the calculation may use, the whole allocation if None
+            n_bands: Number of bands, estimated from the species if None
+
+        Returns:
+            Tuple[Optional[Dict[str, int]], Optional[List[Dict[str, Any]]]]: Slot to launch VASP
+                in and the overrides, None if the rules are disabled
+        """
+        rules = config['parallelization']
+        if not rules['enabled']:
+            return slot, None
+
+        step_config = get_step_config(config, batch_detail.calculation_type, batch_detail.partition)
+        is_local = step_config['scheduler']['type'] == 'local'
+        submission_detail = step_config.get('submission_detail', {})
+        if is_local:
+            max_tasks, max_gpus = step_config['scheduler'].get('cpus_per_batch', 1), 0
+        elif slot:
+            max_tasks, max_gpus = slot['tasks'], slot['gpus']
+        else:
+            max_tasks, max_gpus = submission_detail['nTask'], submission_detail.get('gpu', 0)
+
+        n_bands = n_bands or get_system_size(atoms)['n_bands']
+        settings = get_parallel_settings(rules, len(atoms), get_irreducible_kpoints(kpoints), n_bands,
+                                         max_tasks, max_gpus)
+        reason = f"{len(atoms)} atoms, {int(math.prod(kpoints))} k-points, {n_bands} bands"
+
+        overrides = []
+        for parameter in ('kpar', 'ncore', 'nsim', 'lreal'):
+            value = settings[parameter]
+            if value is not None and vasp_params.get(parameter) != value:
+                overrides.append({'parameter': parameter, 'default': vasp_params.get(parameter), 'value': value})
+                vasp_params[parameter] = value
+        if 'npar' in vasp_params:
+            # NPAR takes precedence over NCORE in VASP
+            overrides.append({'parameter': 'npar', 'default': vasp_params.pop('npar'), 'value': None})
+
+        if not is_local and (settings['tasks'], settings['gpus']) != (max_tasks, max_gpus):
+            gpus_per_node = submission_detail.get('gpu', 0) / submission_detail.get('node', 1)
+            overrides.append({'parameter': 'tasks', 'default': max_tasks, 'value': settings['tasks']})
+            overrides.append({'parameter': 'gpus', 'default': max_gpus, 'value': settings['gpus']})
+            slot = {
+                'nodes': max(1, math.ceil(settings['gpus'] / gpus_per_node)) if gpus_per_node else 1,
+                'tasks': settings['tasks'],
+                'gpus': settings['gpus']
+            }
+
+        for override in overrides:
+            override['reason'] = reason
+        if overrides:
+            self.logger.info(f"Parallelization overrides for {execution.material_name}: "
+                             + ", ".join(f"{o['parameter']}={o['value']}" for o in overrides))
+        return slot, overrides
+
     @abstractmethod
+    def extract_result(
+            self,
+            config: Dict[str, Any],
+            workflow_detail: WorkflowDetail,
+            batch_detail: WorkflowBatchDetail,
+            execution: WorkflowBatchExecution,
+            results: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Extract the results of a finished calculation from its output files.
+
+        Does not use any database, so extraction can run in a separate process.
+
+        Args:
+            config: Configuration dictionary
+            workflow_detail: Workflow details from database
+            batch_detail: Batch details from database
+            execution: Execution details from database
+            results: Outputs already read by the executor, read from the files if None
+
+        Returns:
+            Dict[str, Any]: ``key`` and ``folder`` of the material row, its ``atoms`` and
+                ``data``, and whether the row is created if missing (``create``)
+        """
+        pass
+
+    def write_result(self, result: Dict[str, Any]) -> bool:
+        """Write extracted results to the results database.
+
+        The row of the material is updated if it exists, so writing the same results again
+        does not add rows.
+
+        Args:
+            result: Result returned by :meth:`extract_result`
+
+        Returns:
+            bool: False if the row of the material does not exist and may not be created
+        """
+        with self.container.get("result_ase_db_connector") as connector:
+            db = connector.db
+            rows = list(db.select(key=result['key']))
+            if rows:
+                db.update(rows[0].id, result['atoms'], key=result['key'], data=result['data'], folder=result['folder'])
+            elif result['create']:
+                db.write(result['atoms'], key=result['key'], data=result['data'], folder=result['folder'])
+            else:
+                self.logger.warning(f"No results row for {result['key']}, {', '.join(result['data'])} not saved")
+                return False
+        return True
+
     def save_result(
             self,
             config: Dict[str, Any],
             workflow_detail: WorkflowDetail,
             batch_detail: WorkflowBatchDetail,
-            execution: WorkflowBatchExecution
+            execution: WorkflowBatchExecution,
+            results: Optional[Dict[str, Any]] = None
     ) -> bool:
-        pass
+        """Extract the results of a finished calculation and write them to the results database."""
+        return self.write_result(self.extract_result(config, workflow_detail, batch_detail, execution, results))
+
+    def finish(
+            self,
+            config: Dict[str, Any],
+            workflow_detail: WorkflowDetail,
+            batch_detail: WorkflowBatchDetail,
+            execution: WorkflowBatchExecution,
+            results: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Save the results of a finished calculation, or leave them to ``autocatlab ingest``.
+
+        With ``ingestion.deferred`` the execution is only marked ``computed``, so the
+        allocation is not spent on parsing outputs.
+        """
+        if config['ingestion']['deferred']:
+            execution.status = 'computed'
+        else:
+            self.save_result(config, workflow_detail, batch_detail, execution, results)
+            execution.status = 'completed'
+        execution.success = True
+        execution.error = None
@@ -7,16 +7,14 @@ import numpy as np
 
 from pathlib import Path
 import subprocess
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import numpy as np
-from ase.calculators.singlepoint import SinglePointCalculator
-from ase.io.vasp import read_vasp_out, read_vasp_xml
-from pymatgen.io.vasp import Vasprun
 
 from AutoCatLab.executor.calculation_executor import CalculationExecutor
+from AutoCatLab.executor.util.completion import is_vasp_complete
+from AutoCatLab.executor.util.vasprun_reader import read_vasp_results
 from ase.io import read
-from ase.calculators.vasp import Vasp
 from AutoCatLab.executor.util.util import get_pdos_data, get_initial_magmoms, get_kpoints, get_LUJ_values, \
     get_nbands_cohp
 from AutoCatLab.db.models import WorkflowDetail, WorkflowBatchDetail, WorkflowBatchExecution
@@ -26,108 +24,89 @@ from AutoCatLab.util.util import get_bool_env
 class DFTDOSExecutor(CalculationExecutor):
     """Executor for DFT DOS calculations."""
 
-    def save_result(self, config, workflow_detail, batch_detail, execution) -> bool:
+    def extract_result(self, config, workflow_detail, batch_detail, execution, results=None) -> Dict[str, Any]:
         folder = execution.result_material_dir
 
-        # 1. Read Atoms from OUTCAR (initial+final data)
-        atoms = read_vasp_out(os.path.join(folder, 'OUTCAR'))  # contains initial_magmoms, charges, etc.
+        # 1. Read the final structure and results in one streaming pass over vasprun.xml,
+        #    magnetic moments from the OUTCAR
+        results = results or read_vasp_results(folder)
+        atoms = results['atoms']
 
-        # 2. Read final calculated values from vasprun.xml
-        vasprun_path = os.path.join(folder, 'vasprun.xml')
-        vasprun = Vasprun(vasprun_path)
-        atoms_final = list(read_vasp_xml(vasprun_path))[-1]
-
-        energy = atoms_final.get_potential_energy()
-        forces = atoms_final.get_forces()
-        stress = atoms_final.get_stress()
-        magmoms = atoms.get_magnetic_moments()
+        energy = results['energy']
+        forces = results['forces']
+        stress = results['stress']
+        magmoms = results['magmoms']
         magmom = np.sum(magmoms)
-        volume = atoms_final.get_volume()
-        mass = atoms_final.get_masses().sum()
+        volume = atoms.get_volume()
+        mass = atoms.get_masses().sum()
         fmax = np.max(np.abs(forces))
         smax = np.max(np.abs(stress))
 
-        # 3. Attach properties to Atoms
-        atoms.set_initial_magnetic_moments(atoms.get_initial_magnetic_moments())
-        atoms.set_initial_charges(atoms.get_initial_charges())
-
-        atoms.calc = SinglePointCalculator(
-            atoms_final,
-            energy=energy,
-            forces=forces,
-            stress=stress,
-            magmoms=magmoms
-        )
-
-        # incar_params = vasprun.incar.as_dict()
-        incar_params = json.dumps(vasprun.incar.as_dict())
-
-        pseudopotentials = [ps["titel"] for ps in vasprun.potcar_spec]
-        vasp_version = vasprun.vasp_version
-        kpoints = vasprun.kpoints.kpts
-        lda_u = vasprun.parameters.get("LDAUU", None)
-        lda_ul = vasprun.parameters.get("LDAUL", None)
-        lda_uj = vasprun.parameters.get("LDAUJ", None)
-
-        # 5. Optional extra values
+        incar_params = json.dumps(results['incar'])
+
+        pseudopotentials = results['pseudopotentials']
+        vasp_version = results['vasp_version']
+        kpoints = results['kpoints']
+        lda_u = results['parameters'].get("LDAUU", None)
+        lda_ul = results['parameters'].get("LDAUL", None)
+        lda_uj = results['parameters'].get("LDAUJ", None)
+
+        # 2. Optional extra values
         user = os.environ.get("USER", "unknown")  # or pull from execution.metadata
         charge = np.sum(atoms.get_initial_charges())
         with open(os.path.join(execution.result_material_dir, 'restart.json'), 'r') as f:
             restart_data = json.load(f)
             entry = restart_data["1"]
-            charges = np.array(entry["initial_charges"]["__ndarray__"][2])
+            # Bader charges are no longer part of restart.json, they are stored by the bader command
+            charges = np.array(entry["initial_charges"]["__ndarray__"][2]) if "initial_charges" in entry else None
         pdos_data, center_tm_d, center_ptm_p, center_o_2p = get_pdos_data(execution)
 
-        # 6. Save to ASE DB
-        with self.container.get("result_ase_db_connector") as connector:
-            db = connector.db
-            rows = list(db.select(key=str(Path(folder).parent)))
-            if rows:
-                db.update(rows[0].id,
-                    atoms,
-                    key=str(Path(folder).parent),
-                    data={
-                        execution.calculation_name: {
-                            "vasp_functional": json.loads(incar_params).get("GGA", "PBE"),
-                            "workflow_name": workflow_detail.calc_unique_name,
-                            "batch_id": batch_detail.batch_id,
-                            "vasp_version": vasp_version,
-                            "incar": incar_params,
-                            "volume": volume,
-                            "mass": mass,
-                            "calculator": "vasp",
-                            "pseudopotentials": pseudopotentials,
-                            "user": user,
-                            "kpoints": kpoints,
-                            "ldauu": lda_u,
-                            "ldaul": lda_ul,
-                            "ldauj": lda_uj,
-                            "forces": forces.tolist(),
-                            "stress": stress.tolist(),
-                            "magmoms": magmoms.tolist(),
-                            "magmom": magmom,
-                            "energy": energy,
-                            "charge": charge,
-                            "charges": charges,
-                            "fmax": fmax,
-                            "smax": smax,
-                            'd-band_center_tm': center_tm_d,
-                            'p-band_center_ptm': center_ptm_p,
-                            'p-center_o_2p': center_o_2p,
-                            'pdos_data': pdos_data
-                        }
-                    },
-                    folder=str(Path(folder).parent)
-                )
-
-        return True
+        # 3. Rows of the results database are keyed by the material directory
+        return {
+            'key': str(Path(folder).parent),
+            'folder': str(Path(folder).parent),
+            'atoms': atoms,
+            'create': False,
+            'data': {
+                execution.calculation_name: {
+                    "vasp_functional": json.loads(incar_params).get("GGA", "PBE"),
+                    "workflow_name": workflow_detail.calc_unique_name,
+                    "batch_id": batch_detail.batch_id,
+                    "vasp_version": vasp_version,
+                    "incar": incar_params,
+                    "volume": volume,
+                    "mass": mass,
+                    "calculator": "vasp",
+                    "pseudopotentials": pseudopotentials,
+                    "user": user,
+                    "kpoints": kpoints,
+                    "ldauu": lda_u,
+                    "ldaul": lda_ul,
+                    "ldauj": lda_uj,
+                    "forces": forces.tolist(),
+                    "stress": stress.tolist(),
+                    "magmoms": magmoms.tolist(),
+                    "magmom": magmom,
+                    "energy": energy,
+                    "charge": charge,
+                    "charges": charges,
+                    "fmax": fmax,
+                    "smax": smax,
+                    'd-band_center_tm': center_tm_d,
+                    'p-band_center_ptm': center_ptm_p,
+                    'p-center_o_2p': center_o_2p,
+                    'pdos_data': pdos_data
+                }
+            },
+        }
 
     def execute_calculation(
             self,
             config: Dict[str, Any],
             workflow_detail: WorkflowDetail,
             batch_detail: WorkflowBatchDetail,
-            execution: WorkflowBatchExecution
+            execution: WorkflowBatchExecution,
+            slot: Optional[Dict[str, int]] = None
     ) -> bool:
         """Execute DFT DOS calculation.
         
@@ -136,6 +115,7 @@ class DFTDOSExecutor(CalculationExecutor):
             workflow_detail: Workflow details from database
             batch_detail: Batch details from database
             execution: Execution details from database
+            slot: Nodes, tasks and GPUs of the allocation to run in
             
         Returns:
             bool: True if calculation executed successfully
@@ -146,14 +126,8 @@ class DFTDOSExecutor(CalculationExecutor):
             dir = execution.result_material_dir
             restart_json = Path(dir) / "restart.json"
             calculation_name = execution.calculation_name
-            submission_detail = config['workflow_steps'][batch_detail.calculation_type]['submission_detail']
-            nTask = submission_detail['nTask']
-            cpusPertask = submission_detail['cpusPertask']
-            gpu = submission_detail['gpu']
             is_bulk = "BULK" in calculation_name
 
-            command = 'srun -n ' + str(nTask) + ' -c ' + str(
-                cpusPertask) + ' --cpu-bind=cores --gpu-bind=none -G ' + str(gpu) + ' vasp_std'
 
             atoms = read(restart_json)
             initial_magmoms = get_initial_magmoms(atoms)
@@ -165,10 +139,15 @@ class DFTDOSExecutor(CalculationExecutor):
             user_luj = config['user_luj_values']
             LUJ_values = get_LUJ_values(atoms, user_luj)
 
-            nbands_cohp = get_nbands_cohp(directory=dir + '/')
+            vasp_params = dict(config['workflow_step_parameters'][calculation_name])
+            potcars = self.check_encut(execution, atoms, vasp_params)
+
+            nbands_cohp = get_nbands_cohp(directory=dir + '/', potcars=potcars)
             self.logger.info(f"computing DFT DOS NBANDS {nbands_cohp}")
 
-            vasp_params = config['workflow_step_parameters'][calculation_name]
+            slot, self.parameter_overrides = self.apply_parallel_rules(
+                config, batch_detail, execution, atoms, kpoints, vasp_params, slot, n_bands=nbands_cohp)
+            command = self.get_vasp_command(config, batch_detail, slot)
 
             vasp_params.update({
                 'command': command,
@@ -179,24 +158,29 @@ class DFTDOSExecutor(CalculationExecutor):
             })
 
 
-            calc = Vasp(**vasp_params)
+            calc = self.get_calculator(config, vasp_params)
 
             atoms.set_calculator(calc)
 
 
-            if not get_bool_env('local_dev'):
+            # POTCARs from the cache are sanitized when they are assembled
+            sanitize_potcar = not config['potcar_cache']['enabled']
+            potcar_path = Path(dir) / 'POTCAR'
+            if is_vasp_complete(dir):
+                # Finished before its status was saved, only ingest the outputs
+                self.logger.info(f"DFT DOS of {execution.material_name} already finished, ingesting its outputs")
+                if sanitize_potcar:
+                    subprocess.run(['sed', '-i', '/SHA256/d; /COPYR/d', str(potcar_path)], check=True)
+            elif not get_bool_env('local_dev'):
                 atoms.get_potential_energy()
-                potcar_path = Path(dir) / 'POTCAR'
-                subprocess.run(['sed', '-i', '/SHA256/d; /COPYR/d', str(potcar_path)], check=True)
+                if sanitize_potcar:
+                    subprocess.run(['sed', '-i', '/SHA256/d; /COPYR/d', str(potcar_path)], check=True)
             else:
                 self.logger.info("Running in local development mode. Skipping DFT DOS.")
 
             self.logger.info("Successfully processed POTCAR file")
             # raise Exception("Test error")
-            self.save_result(config, workflow_detail, batch_detail, execution)
-            execution.status = 'completed'
-            execution.success = True
-            execution.error = None
+            self.finish(config, workflow_detail, batch_detail, execution)
             execution.completed_at = datetime.now()
 
             return True
@@ -4,19 +4,19 @@ import traceback
 from datetime import datetime
 import os
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import numpy as np
-from ase.calculators.singlepoint import SinglePointCalculator
-from ase.io.vasp import read_vasp_xml, read_vasp_out
-from pymatgen.io.vasp import Vasprun
 
-from AutoCatLab.executor.util.util import get_initial_magmoms, get_kpoints, get_nbands_cohp, get_LUJ_values, get_restart
+from AutoCatLab.executor.util.util import get_initial_magmoms, get_kpoints, get_nbands_cohp, get_LUJ_values, get_restart, \
+    get_restart_atoms, backup_outputs, is_valid_wavecar
 from AutoCatLab.db.models import WorkflowDetail, WorkflowBatchDetail, WorkflowBatchExecution
 from AutoCatLab.util.util import copy_file, get_bool_env
 from AutoCatLab.executor.calculation_executor import CalculationExecutor
+from AutoCatLab.executor.util.completion import is_vasp_complete
+from AutoCatLab.executor.util.potcar_cache import link_potcar
+from AutoCatLab.executor.util.vasprun_reader import read_vasp_results
 from ase.io import read
-from ase.calculators.vasp import Vasp
 from ase import Atoms
 from AutoCatLab.util.formal_oxidation_state import get_formal_oxidation_state
 
@@ -25,105 +25,88 @@ from AutoCatLab.util.formal_oxidation_state import get_formal_oxidation_state
 class DFTRelaxExecutor(CalculationExecutor):
     """Executor for DFT relaxation calculations."""
 
-    def save_result(self, config, workflow_detail, batch_detail, execution) -> bool:
+    def extract_result(self, config, workflow_detail, batch_detail, execution, results=None) -> Dict[str, Any]:
         folder = execution.result_material_dir
 
-        # 1. Read Atoms from OUTCAR (initial+final data)
-        atoms = read_vasp_out(os.path.join(folder, 'OUTCAR'))  # contains initial_magmoms, charges, etc.
+        # 1. Read the final structure and results in one streaming pass over vasprun.xml,
+        #    magnetic moments from the OUTCAR
+        results = results or read_vasp_results(folder)
+        atoms = results['atoms']
 
-        # 2. Read final calculated values from vasprun.xml
-        vasprun_path = os.path.join(folder, 'vasprun.xml')
-        vasprun = Vasprun(vasprun_path)
-        atoms_final = list(read_vasp_xml(vasprun_path))[-1]
-
-        energy = atoms_final.get_potential_energy()
-        forces = atoms_final.get_forces()
-        stress = atoms_final.get_stress()
-        magmoms = atoms.get_magnetic_moments()
+        energy = results['energy']
+        forces = results['forces']
+        stress = results['stress']
+        magmoms = results['magmoms']
         magmom = np.sum(magmoms)
-        volume = atoms_final.get_volume()
-        mass = atoms_final.get_masses().sum()
+        volume = atoms.get_volume()
+        mass = atoms.get_masses().sum()
         fmax = np.max(np.abs(forces))
         smax = np.max(np.abs(stress))
 
-        # 3. Attach properties to Atoms
-        atoms.set_initial_magnetic_moments(atoms.get_initial_magnetic_moments())
-        atoms.set_initial_charges(atoms.get_initial_charges())
-
-        atoms.calc = SinglePointCalculator(
-            atoms_final,
-            energy=energy,
-            forces=forces,
-            stress=stress,
-            magmoms=magmoms
-        )
-
-        # incar_params = vasprun.incar.as_dict()
-        incar_params = json.dumps(vasprun.incar.as_dict())
-
-        pseudopotentials = [ps["titel"] for ps in vasprun.potcar_spec]
-        vasp_version = vasprun.vasp_version
-        kpoints = vasprun.kpoints.kpts
-        lda_u = vasprun.parameters.get("LDAUU", None)
-        lda_ul = vasprun.parameters.get("LDAUL", None)
-        lda_uj = vasprun.parameters.get("LDAUJ", None)
-
-        # 5. Optional extra values
+        incar_params = json.dumps(results['incar'])
+
+        pseudopotentials = results['pseudopotentials']
+        vasp_version = results['vasp_version']
+        kpoints = results['kpoints']
+        lda_u = results['parameters'].get("LDAUU", None)
+        lda_ul = results['parameters'].get("LDAUL", None)
+        lda_uj = results['parameters'].get("LDAUJ", None)
+
+        # 2. Optional extra values
         user = os.environ.get("USER", "unknown")  # or pull from execution.metadata
         charge = np.sum(atoms.get_initial_charges())
         with open(os.path.join(execution.result_material_dir, 'restart.json'), 'r') as f:
             restart_data = json.load(f)
             entry = restart_data["1"]
-            charges = np.array(entry["initial_charges"]["__ndarray__"][2])
+            # Bader charges are no longer part of restart.json, they are stored by the bader command
+            charges = np.array(entry["initial_charges"]["__ndarray__"][2]) if "initial_charges" in entry else None
 
         oxi_states = get_formal_oxidation_state(atoms)
         oxi_states_list = oxi_states.tolist()
 
-        # 6. Save to ASE DB
-        with self.container.get("result_ase_db_connector") as connector:
-            db = connector.db
-            db.write(
-                atoms,
-                key=str(Path(folder).parent),
-                data={
-                    execution.calculation_name: {
-                        "vasp_functional": json.loads(incar_params).get("GGA", "PBE"),
-                        "workflow_name": workflow_detail.calc_unique_name,
-                        "batch_id": batch_detail.batch_id,
-                        "vasp_version": vasp_version,
-                        "incar": incar_params,
-                        "volume": volume,
-                        "mass": mass,
-                        "calculator": "vasp",
-                        "pseudopotentials": pseudopotentials,
-                        "user": user,
-                        "kpoints": kpoints,
-                        "ldauu": lda_u,
-                        "ldaul": lda_ul,
-                        "ldauj": lda_uj,
-                        "forces": forces.tolist(),
-                        "stress": stress.tolist(),
-                        "magmoms": magmoms.tolist(),
-                        "magmom": magmom,
-                        "energy": energy,
-                        "charge": charge,
-                        "charges": charges,
-                        "fmax": fmax,
-                        "smax": smax,
-                        "oxidation_states": oxi_states_list
-                    }
-                },
-                folder=str(Path(folder).parent)
-            )
-
-        return True
+        # 3. Rows of the results database are keyed by the material directory
+        return {
+            'key': str(Path(folder).parent),
+            'folder': str(Path(folder).parent),
+            'atoms': atoms,
+            'create': True,
+            'data': {
+                execution.calculation_name: {
+                    "vasp_functional": json.loads(incar_params).get("GGA", "PBE"),
+                    "workflow_name": workflow_detail.calc_unique_name,
+                    "batch_id": batch_detail.batch_id,
+                    "vasp_version": vasp_version,
+                    "incar": incar_params,
+                    "volume": volume,
+                    "mass": mass,
+                    "calculator": "vasp",
+                    "pseudopotentials": pseudopotentials,
+                    "user": user,
+                    "kpoints": kpoints,
+                    "ldauu": lda_u,
+                    "ldaul": lda_ul,
+                    "ldauj": lda_uj,
+                    "forces": forces.tolist(),
+                    "stress": stress.tolist(),
+                    "magmoms": magmoms.tolist(),
+                    "magmom": magmom,
+                    "energy": energy,
+                    "charge": charge,
+                    "charges": charges,
+                    "fmax": fmax,
+                    "smax": smax,
+                    "oxidation_states": oxi_states_list
+                }
+            },
+        }
 
     def execute_calculation(
             self,
             config: Dict[str, Any],
             workflow_detail: WorkflowDetail,
             batch_detail: WorkflowBatchDetail,
-            execution: WorkflowBatchExecution
+            execution: WorkflowBatchExecution,
+            slot: Optional[Dict[str, int]] = None
     ) -> bool:
         """Execute DFT relaxation calculation.
         
@@ -132,6 +115,7 @@ class DFTRelaxExecutor(CalculationExecutor):
             workflow_detail: Workflow details from database
             batch_detail: Batch details from database
             execution: Execution details from database
+            slot: Nodes, tasks and GPUs of the allocation to run in
             
         Returns:
             bool: True if calculation executed successfully
@@ -143,14 +127,6 @@ class DFTRelaxExecutor(CalculationExecutor):
             start_json = Path(dir) / "start.json"
             calculation_name = execution.calculation_name
             is_bulk = "BULK" in calculation_name
-            # Get step configuration and submission details
-            submission_detail = config['workflow_steps'][batch_detail.calculation_type]['submission_detail']
-            nTask = submission_detail['nTask']
-            cpusPertask = submission_detail['cpusPertask']
-            gpu = submission_detail['gpu']
-
-            command = 'srun -n ' + str(nTask) + ' -c ' + str(
-                cpusPertask) + ' --cpu-bind=cores --gpu-bind=none -G ' + str(gpu) + ' vasp_std'
 
             atoms = read(start_json)
             initial_magmoms = get_initial_magmoms(atoms)
@@ -158,12 +134,32 @@ class DFTRelaxExecutor(CalculationExecutor):
             if not is_bulk:
                 atoms.pbc = [1, 1, 1]
 
+            # Outputs of a run that finished before its status was saved are only ingested
+            completed = is_vasp_complete(dir)
+
+            # Continue an interrupted relaxation from its last ionic step
+            istart = None
+            if not completed and config['relax_restart']['enabled'] and os.path.exists(os.path.join(dir, 'OUTCAR')):
+                restart_atoms = get_restart_atoms(atoms, dir)
+                if restart_atoms is not None:
+                    atoms = restart_atoms
+                    execution.restart_count = (execution.restart_count or 0) + 1
+                    backup_outputs(dir, execution.restart_count)
+                    istart = 1 if is_valid_wavecar(os.path.join(dir, 'WAVECAR')) else 0
+                    self.logger.info(f"Restarting relaxation of {execution.material_name} from CONTCAR "
+                                     f"(restart {execution.restart_count}, ISTART={istart})")
+
             kpoints = get_kpoints(atoms, effective_length=30, bulk=is_bulk)
             user_luj = config['user_luj_values']
             LUJ_values = get_LUJ_values(atoms, user_luj)
 
             # Get VASP parameters directly from config
-            vasp_params = config['workflow_step_parameters'][calculation_name]
+            vasp_params = dict(config['workflow_step_parameters'][calculation_name])
+            self.check_encut(execution, atoms, vasp_params)
+            # Launch VASP on the whole allocation or on the given slot, sized to the material
+            slot, self.parameter_overrides = self.apply_parallel_rules(
+                config, batch_detail, execution, atoms, kpoints, vasp_params, slot)
+            command = self.get_vasp_command(config, batch_detail, slot)
 
             # Add command and directory to parameters
             vasp_params.update({
@@ -172,16 +168,21 @@ class DFTRelaxExecutor(CalculationExecutor):
                 'kpts': kpoints,
                 'ldau_luj': LUJ_values
             })
+            if istart is not None:
+                vasp_params['istart'] = istart
 
-            calc = Vasp(**vasp_params)
+            calc = self.get_calculator(config, vasp_params)
 
             atoms.set_calculator(calc)
-            if not get_bool_env('local_dev'):
+            if completed:
+                self.logger.info(f"DFT relaxation of {execution.material_name} already finished, ingesting its outputs")
+            elif not get_bool_env('local_dev'):
                 atoms.get_potential_energy()
             else:
                 self.logger.info("Running in local development mode. Skipping DFT relaxation.")
 
-            get_restart('OUTCAR', dir + '/')
+            results = read_vasp_results(dir)
+            get_restart('OUTCAR', dir + '/', results)
 
             dos_dir_name = 'BULK_DFT_DOS'
 
@@ -189,15 +190,16 @@ class DFTRelaxExecutor(CalculationExecutor):
                 dos_dir_name = 'SURFACE_DFT_DOS'
 
             copy_file(Path(dir) / 'WAVECAR', Path(dir) / f'../{dos_dir_name}/')
-            copy_file(Path(dir) / 'POTCAR', Path(dir) / f'../{dos_dir_name}/')
+            if config['potcar_cache']['enabled']:
+                # Never copy into a POTCAR hardlinked to the read-only cache
+                link_potcar(Path(dir) / 'POTCAR', Path(dir) / f'../{dos_dir_name}/POTCAR')
+            else:
+                copy_file(Path(dir) / 'POTCAR', Path(dir) / f'../{dos_dir_name}/')
             copy_file(Path(dir) / 'POSCAR', Path(dir) / f'../{dos_dir_name}/')
             copy_file(Path(dir) / 'restart.json', Path(dir) / f'../{dos_dir_name}/restart.json')
 
             # raise Exception("Test error RELAX")
-            self.save_result(config, workflow_detail, batch_detail, execution)
-            execution.status = 'completed'
-            execution.success = True
-            execution.error = None
+            self.finish(config, workflow_detail, batch_detail, execution, results)
             execution.completed_at = datetime.now()
 
             return True
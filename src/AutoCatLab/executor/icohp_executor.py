@@ -4,7 +4,7 @@ from datetime import datetime
 import os
 from pathlib import Path
 import subprocess
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 import yaml
 from ase.io import read
 from yaml import Loader
@@ -15,6 +15,7 @@ from ase.io.vasp import read_vasp_out
 # from db.models import WorkflowDetail, WorkflowBatchDetail, WorkflowBatchExecution
 # from executor.util.calculation_helper import write_lobsterIn
 from AutoCatLab.executor.calculation_executor import CalculationExecutor
+from AutoCatLab.executor.util.completion import is_lobster_complete
 from AutoCatLab.executor.util.util import write_lobsterIn, get_icohp_vs_d, get_madelung_energies, get_doe
 from AutoCatLab.db.models import WorkflowDetail, WorkflowBatchDetail, WorkflowBatchExecution
 from AutoCatLab.util.util import get_bool_env
@@ -24,8 +25,8 @@ from AutoCatLab.executor.util.util import get_icohp_matrix
 class ICOHPExecutor(CalculationExecutor):
     """Executor for ICOHP calculations."""
 
-    def save_result(self, config: Dict[str, Any], workflow_detail: WorkflowDetail, batch_detail: WorkflowBatchDetail,
-                    execution: WorkflowBatchExecution) -> bool:
+    def extract_result(self, config: Dict[str, Any], workflow_detail: WorkflowDetail, batch_detail: WorkflowBatchDetail,
+                       execution: WorkflowBatchExecution, results: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         folder = execution.result_material_dir
         base_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'constant'))
         orbital_map = yaml.load(open(os.path.join(base_path, 'valence_orbital_mapping_new.yaml')), Loader)
@@ -67,45 +68,41 @@ class ICOHPExecutor(CalculationExecutor):
         doe = doe.to_numpy()
         doe = doe.astype(np.cfloat)
 
-        # 6. Save to ASE DB
-        with self.container.get("result_ase_db_connector") as connector:
-            db = connector.db
-            rows = list(db.select(key=str(Path(folder).parent)))
-            if rows:
-                db.update(
-                    rows[0].id,
-                    atoms,
-                    key=str(Path(folder).parent),
-                    data={
-                        execution.calculation_name: {
-                            'icohp_matrix': I_matrix,
-                            'icohp_sum': I_sum,
-                            'icohp_matrix_s_d': I_matrix_s_d,
-                            'icohp_sum_s_d': I_sum_s_d,
-                            'icohp_sum_s_d_o_2s_2p': I_sum_s_d_o_2s_2p,
-                            'icohp_sum_d_o2p': I_sum_d_o2p,
-                            'distances': distances,
-                            'icohps': icohps,
-                            'pairs': pairs,
-                            'doe_energy': doe[:, 0],
-                            'doe_up': doe[:, 1],
-                            'doe_down': doe[:, 2],
-                            'idoe_up': doe[:, 3],
-                            'idoe_down': doe[:, 4],
-                            'eband': float(eband),
-                            'madelung_energies': madelung_energies,
-                        }
-                    },
-                    folder=str(Path(folder).parent)
-                )
-        return True
+        # Rows of the results database are keyed by the material directory
+        return {
+            'key': str(Path(folder).parent),
+            'folder': str(Path(folder).parent),
+            'atoms': atoms,
+            'create': False,
+            'data': {
+                execution.calculation_name: {
+                    'icohp_matrix': I_matrix,
+                    'icohp_sum': I_sum,
+                    'icohp_matrix_s_d': I_matrix_s_d,
+                    'icohp_sum_s_d': I_sum_s_d,
+                    'icohp_sum_s_d_o_2s_2p': I_sum_s_d_o_2s_2p,
+                    'icohp_sum_d_o2p': I_sum_d_o2p,
+                    'distances': distances,
+                    'icohps': icohps,
+                    'pairs': pairs,
+                    'doe_energy': doe[:, 0],
+                    'doe_up': doe[:, 1],
+                    'doe_down': doe[:, 2],
+                    'idoe_up': doe[:, 3],
+                    'idoe_down': doe[:, 4],
+                    'eband': float(eband),
+                    'madelung_energies': madelung_energies,
+                }
+            },
+        }
 
     def execute_calculation(
             self,
             config: Dict[str, Any],
             workflow_detail: WorkflowDetail,
             batch_detail: WorkflowBatchDetail,
-            execution: WorkflowBatchExecution
+            execution: WorkflowBatchExecution,
+            slot: Optional[Dict[str, int]] = None
     ) -> bool:
         """Execute ICOHP calculation.
         
@@ -114,6 +111,7 @@ class ICOHPExecutor(CalculationExecutor):
             workflow_detail: Workflow details from database
             batch_detail: Batch details from database
             execution: Execution details from database
+            slot: Unused, LOBSTER runs on the allocation directly
             
         Returns:
             bool: True if calculation executed successfully
@@ -126,12 +124,16 @@ class ICOHPExecutor(CalculationExecutor):
 
             lobster_params = config['workflow_step_parameters']['BULK_ICOHP']
 
-            write_lobsterIn(str(source_dir) + '/', config_params=lobster_params)
-
-            if not get_bool_env('local_dev'):
-                subprocess.call(f'cd {source_dir} && lobster-4.1.0', shell=True)
+            if is_lobster_complete(dest_dir) or is_lobster_complete(source_dir):
+                # Finished before its status was saved, only ingest the outputs
+                self.logger.info(f"LOBSTER of {execution.material_name} already finished, ingesting its outputs")
             else:
-                self.logger.info("Running in local development mode. Skipping ICOHP.")
+                write_lobsterIn(str(source_dir) + '/', config_params=lobster_params)
+
+                if not get_bool_env('local_dev'):
+                    subprocess.call(f'cd {source_dir} && lobster-4.1.0', shell=True)
+                else:
+                    self.logger.info("Running in local development mode. Skipping ICOHP.")
 
             lobster_files = [
                 'OUTCAR',
@@ -166,10 +168,7 @@ class ICOHPExecutor(CalculationExecutor):
 
             # raise Exception("Test error ICOHP")
 
-            self.save_result(config, workflow_detail, batch_detail, execution)
-            execution.status = 'completed'
-            execution.success = True
-            execution.error = None
+            self.finish(config, workflow_detail, batch_detail, execution)
             execution.completed_at = datetime.now()
             return True
 
@@ -0,0 +1,91 @@
+"""Bader charge analysis of finished relaxations."""
+import os
+import subprocess
+from typing import Dict, Optional
+
+import numpy as np
+from ase.io import read
+
+from .potcar_index import read_potcar_headers
+
+
+def run_bader(directory: str, chgsum_command: str, bader_command: str) -> None:
+    """Run the Bader analysis of a calculation directory, writing its output to bader.log.
+
+    With core charges (AECCAR0 and AECCAR2, written with LAECHG) the analysis uses their
+    sum as the reference charge density.
+
+    Args:
+        directory: Calculation directory
+        chgsum_command: Command summing AECCAR0 and AECCAR2 into CHGCAR_sum
+        bader_command: Command of the Bader program
+    """
+    if not os.path.exists(os.path.join(directory, 'CHGCAR')):
+        raise FileNotFoundError(f"No CHGCAR in {directory}")
+
+    with open(os.path.join(directory, 'bader.log'), 'w') as log:
+        if os.path.exists(os.path.join(directory, 'AECCAR0')):
+            subprocess.run([chgsum_command, 'AECCAR0', 'AECCAR2'], cwd=directory, stdout=log,
+                           stderr=subprocess.STDOUT, check=True)
+            subprocess.run([bader_command, 'CHGCAR', '-ref', 'CHGCAR_sum'], cwd=directory, stdout=log,
+                           stderr=subprocess.STDOUT, check=True)
+        else:
+            subprocess.run([bader_command, 'CHGCAR'], cwd=directory, stdout=log,
+                           stderr=subprocess.STDOUT, check=True)
+
+
+def read_acf(path: str) -> np.ndarray:
+    """Read the atom rows of ACF.dat: index, x, y, z, charge, min dist and atomic volume."""
+    return np.genfromtxt(path, skip_header=2, skip_footer=4, ndmin=2)
+
+
+def read_bader(directory: str, zvals: Optional[Dict[str, float]] = None) -> Dict[str, np.ndarray]:
+    """Read the per-atom results of a finished Bader analysis.
+
+    Atoms are in the order VASP wrote them, the same order as the structure stored in the
+    results database.
+
+    Args:
+        directory: Relaxation directory with ACF.dat, CONTCAR and POTCAR
+        zvals: Valence electrons of every species, read from the POTCAR if None
+
+    Returns:
+        Dict[str, np.ndarray]: ``charges`` (net charge, ZVAL minus Bader electrons),
+            ``electrons``, ``volumes`` and ``min_dist`` of every atom
+    """
+    acf = read_acf(os.path.join(directory, 'ACF.dat'))
+
+    if zvals is None:
+        zvals = {header['symbol']: header['zval'] for header in read_potcar_headers(os.path.join(directory, 'POTCAR'))}
+    symbols = read(os.path.join(directory, 'CONTCAR'), format='vasp').get_chemical_symbols()
+    if len(symbols) != len(acf):
+        raise ValueError(f"ACF.dat of {directory} has {len(acf)} atoms, CONTCAR has {len(symbols)}")
+
+    electrons = acf[:, 4]
+    return {
+        'charges': np.array([zvals[symbol] for symbol in symbols]) - electrons,
+        'electrons': electrons,
+        'volumes': acf[:, 6],
+        'min_dist': acf[:, 5]
+    }
+
+
+def analyze_bader(
+        directory: str,
+        chgsum_command: str = 'chgsum.pl',
+        bader_command: str = 'bader',
+        zvals: Optional[Dict[str, float]] = None
+) -> Dict[str, np.ndarray]:
+    """Run the Bader analysis of a finished relaxation and return its per-atom arrays.
+
+    Args:
+        directory: Relaxation directory with CHGCAR, CONTCAR and POTCAR
+        chgsum_command: Command summing AECCAR0 and AECCAR2 into CHGCAR_sum
+        bader_command: Command of the Bader program
+        zvals: Valence electrons of every species, read from the POTCAR if None
+
+    Returns:
+        Dict[str, np.ndarray]: Per-atom arrays of :func:`read_bader`
+    """
+    run_bader(directory, chgsum_command, bader_command)
+    return read_bader(directory, zvals)
@@ -0,0 +1,41 @@
+"""Fast probes detecting calculations whose outputs are already complete."""
+import os
+
+# Bytes read from the end of an output file, enough for the OUTCAR and LOBSTER footers
+TAIL_BYTES = 256 * 1024
+
+OUTCAR_MARKERS = (b'reached required accuracy', b'General timing')
+
+
+def read_tail(path, size=TAIL_BYTES):
+    """Return the last bytes of a file, or None if it does not exist."""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - size))
+            return f.read()
+    except OSError:
+        return None
+
+
+def is_outcar_complete(directory):
+    """Check whether the OUTCAR of a directory shows a converged or normally ended VASP run."""
+    tail = read_tail(os.path.join(directory, 'OUTCAR'))
+    return tail is not None and any(marker in tail for marker in OUTCAR_MARKERS)
+
+
+def is_vasprun_complete(directory):
+    """Check whether the vasprun.xml of a directory was written up to its closing tag."""
+    tail = read_tail(os.path.join(directory, 'vasprun.xml'), 1024)
+    return tail is not None and tail.rstrip().endswith(b'</modeling>')
+
+
+def is_vasp_complete(directory):
+    """Check whether a VASP run finished with all outputs needed to save its results."""
+    return is_outcar_complete(directory) and is_vasprun_complete(directory)
+
+
+def is_lobster_complete(directory):
+    """Check whether the lobsterout of a directory shows a finished LOBSTER run."""
+    tail = read_tail(os.path.join(directory, 'lobsterout'), 4096)
+    return tail is not None and b'finished' in tail
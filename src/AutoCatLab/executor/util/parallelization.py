@@ -0,0 +1,73 @@
+"""Rules deriving VASP parallelization and INCAR settings from the system size."""
+import math
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+
+def get_irreducible_kpoints(kpts: Sequence[int]) -> int:
+    """Estimate the number of irreducible k-points of a Gamma-centered mesh.
+
+    Only time-reversal symmetry is taken into account, so this is an upper bound.
+    """
+    n_kpoints = int(np.prod(kpts))
+    return n_kpoints // 2 + 1 if n_kpoints > 1 else 1
+
+
+def get_largest_divisor(n: int, limit: int) -> int:
+    """Return the largest divisor of n that is not larger than limit."""
+    return max(d for d in range(1, max(1, min(n, limit)) + 1) if n % d == 0)
+
+
+def get_parallel_settings(
+    rules: Dict[str, Any],
+    n_atoms: int,
+    n_kpoints: int,
+    n_bands: int,
+    max_tasks: int,
+    max_gpus: int = 0,
+    ranks_per_gpu: Optional[int] = None
+) -> Dict[str, Any]:
+    """Derive MPI tasks, GPUs, KPAR, NCORE, NSIM and LREAL for a calculation.
+
+    On GPUs one GPU is used per ``atoms_per_gpu`` atoms, but no GPU gets fewer than
+    ``min_bands_per_gpu`` bands, and NCORE must be 1. On CPUs all tasks are used and NCORE
+    is the largest divisor of the tasks per k-point group up to ``max_ncore``. KPAR is the largest divisor of the tasks not exceeding the k-points,
+    and LREAL is switched to Auto above ``lreal_auto_atoms`` atoms.
+
+    Args:
+        rules: The ``parallelization`` config section
+        n_atoms: Number of atoms
+        n_kpoints: Number of irreducible k-points
+        n_bands: Number of bands
+        max_tasks: MPI tasks available to the calculation
+        max_gpus: GPUs available to the calculation, 0 for CPU runs
+        ranks_per_gpu: MPI tasks per GPU, by default max_tasks / max_gpus
+
+    Returns:
+        Dict[str, Any]: tasks, gpus, kpar, ncore, nsim and lreal (None to keep the INCAR value)
+    """
+    if max_gpus:
+        ranks_per_gpu = ranks_per_gpu or max(1, max_tasks // max_gpus)
+        gpus = min(max_gpus,
+                   max(1, math.ceil(n_atoms / rules['atoms_per_gpu'])),
+                   max(1, n_bands // rules['min_bands_per_gpu']))
+        tasks = gpus * ranks_per_gpu
+        kpar = get_largest_divisor(tasks, n_kpoints)
+        ncore = 1
+        nsim = rules['nsim_gpu']
+    else:
+        gpus = 0
+        tasks = max_tasks
+        kpar = get_largest_divisor(tasks, n_kpoints)
+        ncore = get_largest_divisor(tasks // kpar, rules['max_ncore'])
+        nsim = rules['nsim_cpu']
+
+    return {
+        'tasks': tasks,
+        'gpus': gpus,
+        'kpar': kpar,
+        'ncore': ncore,
+        'nsim': nsim,
+        'lreal': 'Auto' if n_atoms > rules['lreal_auto_atoms'] else None
+    }
@@ -0,0 +1,97 @@
+"""Node-local cache of assembled and sanitized POTCARs."""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+from ase.calculators.vasp import Vasp
+from ase.calculators.vasp.create_input import open_potcar
+
+# Lines removed from every POTCAR, as done for the stored DOS outputs before the cache existed
+SANITIZED_MARKERS = ('SHA256', 'COPYR')
+
+
+def get_cache_dir(directory: Optional[str] = None) -> Path:
+    """Return the POTCAR cache directory, by default in the node-local temporary directory."""
+    if directory:
+        return Path(os.path.expandvars(os.path.expanduser(directory)))
+    return Path(tempfile.gettempdir()) / f'autocatlab-potcar-{os.getuid()}'
+
+
+def get_potcar_key(ppp_list: Sequence[str]) -> str:
+    """Hash the ordered pseudopotential files of a calculation with their sizes and mtimes."""
+    digest = hashlib.sha256()
+    for filename in ppp_list:
+        stat = os.stat(filename)
+        digest.update(f'{os.path.abspath(filename)}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+    return digest.hexdigest()
+
+
+def get_cached_potcar(ppp_list: Sequence[str], cache_dir: Union[str, Path]) -> Path:
+    """Return the cached POTCAR of a list of pseudopotential files, assembling it on first use.
+
+    The POTCAR is concatenated in the order of ``ppp_list`` with the SHA256 and COPYR
+    lines removed, and made read-only so that hardlinks to it cannot be modified.
+
+    Args:
+        ppp_list: Pseudopotential files in the order of the species
+        cache_dir: Cache directory
+
+    Returns:
+        Path: Path of the cached POTCAR
+    """
+    cache_dir = Path(cache_dir)
+    potcar = cache_dir / f'POTCAR.{get_potcar_key(ppp_list)}'
+    if potcar.exists():
+        return potcar
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Written under a unique name and renamed, so concurrent writers never expose a partial file
+    tmp_path = cache_dir / f'{potcar.name}.{os.getpid()}.{threading.get_ident()}'
+    with open(tmp_path, 'w') as potfile:
+        for filename in ppp_list:
+            with open_potcar(filename=filename) as ppp_file:
+                for line in ppp_file:
+                    if not any(marker in line for marker in SANITIZED_MARKERS):
+                        potfile.write(line)
+    os.chmod(tmp_path, 0o444)
+    os.replace(tmp_path, potcar)
+    return potcar
+
+
+def link_potcar(src: Union[str, Path], dst: Union[str, Path]) -> None:
+    """Hardlink a POTCAR to a calculation directory, copying it across file systems.
+
+    An existing file at ``dst`` is removed first, so a hardlinked POTCAR is never
+    written through.
+    """
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists() or dst.is_symlink():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class CachedPotcarVasp(Vasp):
+    """Vasp calculator taking its POTCAR from the cache of assembled POTCARs."""
+
+    def __init__(self, potcar_cache_dir: Union[str, Path], **kwargs):
+        """Initialize the calculator.
+
+        Args:
+            potcar_cache_dir: Cache directory of assembled POTCARs
+            **kwargs: Parameters of the Vasp calculator
+        """
+        self.potcar_cache_dir = potcar_cache_dir
+        super().__init__(**kwargs)
+
+    def write_potcar(self, suffix: str = "", directory: str = './') -> None:
+        """Link the cached POTCAR of the calculation instead of concatenating the pseudopotentials."""
+        potcar = get_cached_potcar(self.ppp_list, self.potcar_cache_dir)
+        link_potcar(potcar, os.path.join(directory, 'POTCAR' + suffix))
@@ -0,0 +1,225 @@
+"""Cached index of the header metadata of the POTCAR files under VASP_PP_PATH."""
+import json
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+# Recommended ENCUT relative to the largest ENMAX when the cell changes shape or volume
+CELL_RELAX_ENMAX_FACTOR = 1.3
+
+
+def get_index_path() -> Path:
+    """Return the path of the on-disk POTCAR index."""
+    cache_dir = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache'))
+    return cache_dir / 'autocatlab' / 'potcar_index.json'
+
+
+def _parse_header_line(line: str, header: Dict[str, Any]) -> None:
+    """Read the ``KEY = value`` pairs of a POTCAR header line into the header."""
+    for field in line.split(';'):
+        key, sep, value = field.partition('=')
+        key = key.strip()
+        if not sep:
+            continue
+        if key == 'TITEL':
+            header['titel'] = value.strip()
+            header['psp'] = value.split()[1]
+        elif key == 'VRHFIN':
+            header['symbol'], _, valence = value.strip().partition(':')
+            header['valence'] = valence.strip()
+        elif key in ('ZVAL', 'ENMAX'):
+            header[key.lower()] = float(value.split()[0])
+
+
+def read_potcar_headers(path: str, first_only: bool = False) -> List[Dict[str, Any]]:
+    """Read TITEL, ZVAL, ENMAX and valence configuration of every dataset in a POTCAR.
+
+    The bodies of the datasets are skipped line by line without being parsed.
+
+    Args:
+        path: Path of a single or concatenated POTCAR
+        first_only: Stop after the header of the first dataset
+
+    Returns:
+        List[Dict[str, Any]]: ``titel``, ``psp``, ``symbol``, ``zval``, ``enmax`` and
+            ``valence`` of every dataset, in the order of the file
+    """
+    headers = []
+    # Header of the dataset being read, None while skipping its body
+    header = None
+    expect_title = True
+    with open(path, 'r', errors='replace') as f:
+        for line in f:
+            if expect_title:
+                header = {}
+                expect_title = False
+            elif header is not None:
+                if 'END of PSCTR' in line:
+                    headers.append(header)
+                    header = None
+                    if first_only:
+                        break
+                elif '=' in line:
+                    _parse_header_line(line, header)
+            elif 'End of Dataset' in line:
+                expect_title = True
+    return headers
+
+
+def _find_potcars(pp_path: str) -> List[str]:
+    """List the POTCAR files of all pseudopotential folders under a directory."""
+    potcars = []
+    for root, dirs, files in os.walk(pp_path):
+        if 'POTCAR' in files:
+            potcars.append(os.path.join(root, 'POTCAR'))
+    return potcars
+
+
+@lru_cache(maxsize=None)
+def _load_index() -> Dict[str, Dict[str, Any]]:
+    """Load the on-disk index once per process; lookups add to the returned dictionary."""
+    try:
+        with open(get_index_path(), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(entries: Dict[str, Dict[str, Any]], stale: Sequence[str] = ()) -> None:
+    """Merge entries into the on-disk index, keeping the entries other processes added meanwhile."""
+    index_path = get_index_path()
+    try:
+        with open(index_path, 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+    cached.update(entries)
+    for potcar in stale:
+        cached.pop(potcar, None)
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_name(f'{index_path.name}.{os.getpid()}')
+    with open(tmp_path, 'w') as f:
+        json.dump(cached, f)
+    os.replace(tmp_path, index_path)
+
+
+def build_potcar_index(pp_path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Scan a pseudopotential directory and bring its entries in the on-disk index up to date.
+
+    Every POTCAR file is checked with one ``stat`` and read again only if its
+    modification time changed. Lookups never scan, so this only runs when a directory
+    has no entries yet, or on request after the pseudopotentials changed.
+
+    Args:
+        pp_path: Pseudopotential directory, by default ``$VASP_PP_PATH``
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Metadata of :func:`read_potcar_headers` and ``mtime``
+            by absolute POTCAR path
+    """
+    pp_path = pp_path or os.environ.get('VASP_PP_PATH')
+    if not pp_path:
+        return {}
+
+    pp_path = os.path.abspath(pp_path)
+    cached = _load_index()
+    index = {}
+    changed = {}
+    for potcar in _find_potcars(pp_path):
+        mtime = os.stat(potcar).st_mtime
+        entry = cached.get(potcar)
+        if entry is None or entry['mtime'] != mtime:
+            headers = read_potcar_headers(potcar, first_only=True)
+            if not headers:
+                continue
+            entry = changed[potcar] = dict(headers[0], mtime=mtime)
+        index[potcar] = entry
+
+    # Entries of other pseudopotential directories stay in the file
+    stale = [potcar for potcar in cached if potcar not in index and potcar.startswith(pp_path + os.sep)]
+    if changed or stale:
+        cached.update(changed)
+        for potcar in stale:
+            del cached[potcar]
+        _save_index(changed, stale)
+    return index
+
+
+def get_potcar_index(pp_path: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Return the indexed header metadata of the POTCAR files under VASP_PP_PATH.
+
+    The on-disk index is trusted as it is, so no file is touched; the directory is only
+    scanned with :func:`build_potcar_index` if the index has no entries of it yet.
+
+    Args:
+        pp_path: Pseudopotential directory, by default ``$VASP_PP_PATH``
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Metadata of :func:`read_potcar_headers` and ``mtime``
+            by absolute POTCAR path
+    """
+    pp_path = pp_path or os.environ.get('VASP_PP_PATH')
+    if not pp_path:
+        return {}
+
+    prefix = os.path.join(os.path.abspath(pp_path), '')
+    index = {potcar: entry for potcar, entry in _load_index().items() if potcar.startswith(prefix)}
+    return index or build_potcar_index(pp_path)
+
+
+def get_potcar_metadata(path: str) -> Dict[str, Any]:
+    """Look up the metadata of a POTCAR file.
+
+    Only the requested file is checked: it is read again and its index entry updated if
+    it is missing from the index or its modification time changed.
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime
+    index = _load_index()
+    entry = index.get(path)
+    if entry is None or entry['mtime'] != mtime:
+        entry = index[path] = dict(read_potcar_headers(path, first_only=True)[0], mtime=mtime)
+        _save_index({path: entry})
+    return entry
+
+
+def get_titel_index() -> Dict[str, Dict[str, Any]]:
+    """Return the metadata of the indexed POTCAR files by TITEL."""
+    return {entry['titel']: entry for entry in get_potcar_index().values()}
+
+
+def get_calculation_potcars(atoms, vasp_params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Resolve the POTCAR metadata of every species of a calculation without reading the POTCAR.
+
+    The files are chosen by ASE from the ``setups``, ``xc`` and ``pp`` parameters, exactly as
+    when it writes the POTCAR.
+
+    Args:
+        atoms: ASE Atoms object
+        vasp_params: Parameters of the Vasp calculator
+
+    Returns:
+        Optional[List[Dict[str, Any]]]: Metadata of every species, None without VASP_PP_PATH
+    """
+    if not os.environ.get('VASP_PP_PATH'):
+        return None
+    from ase.calculators.vasp import Vasp
+
+    calc = Vasp(**{key: value for key, value in vasp_params.items() if key != 'command'})
+    calc.initialize(atoms)
+    return [get_potcar_metadata(path) for path in calc.ppp_list]
+
+
+def get_min_encut(potcars: List[Dict[str, Any]], cell_relax: bool = False) -> float:
+    """Return the smallest recommended ENCUT for a set of POTCARs.
+
+    Args:
+        potcars: Metadata of every species
+        cell_relax: Whether the cell shape or volume is relaxed (ISIF >= 3)
+
+    Returns:
+        float: Largest ENMAX, scaled by 1.3 for cell relaxations
+    """
+    enmax = max(potcar['enmax'] for potcar in potcars)
+    return enmax * CELL_RELAX_ENMAX_FACTOR if cell_relax else enmax
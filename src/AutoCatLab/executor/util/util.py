@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 import subprocess
@@ -6,14 +7,14 @@ import numpy as np
 import spglib
 import yaml
 from ase.io import read, write
-from mendeleev import element
 from yaml import Loader
 from pathlib import Path
 
-from ase.data import covalent_radii as cradii
+from ase.data import chemical_symbols, covalent_radii as cradii
 import pkgutil
 import pkg_resources
 
+from .potcar_index import read_potcar_headers
 from .rapidos import RapiDOS
 
 # Use Path to locate the YAML file within the installed package
@@ -21,50 +22,53 @@ yaml_path = Path(__file__).parent / 'valence_orbital_mapping.yaml'
 with open(yaml_path, 'r') as f:
     orbital_map = yaml.safe_load(f)
 
+# Precomputed group, period, spin class and default LUJ of every element
+element_properties_path = Path(__file__).parents[2] / 'constant' / 'element_properties.json'
+with open(element_properties_path, 'r') as f:
+    ELEMENT_PROPERTIES = json.load(f)
+
+NO_SPIN, HIGH_SPIN, LOW_SPIN = 0, 1, 2
+SPIN_CLASS_IDS = {None: NO_SPIN, 'high': HIGH_SPIN, 'low': LOW_SPIN}
+
+# Assumin 2tg-eg splitting (octahedral field)
+LOW_SPIN_FUNCTION = np.array([0, 1, 2, 3, 2, 1, 0, 1, 2, 1, 0])
+HIGH_SPIN_FUNCTION = np.array([0, 1, 2, 3, 4, 5, 4, 3, 2, 1, 0])
+
+# Indexed by atomic number, group 0 for elements without a group (f-block)
+ELEMENT_GROUPS = np.zeros(len(chemical_symbols), dtype=int)
+SPIN_CLASSES = np.zeros(len(chemical_symbols), dtype=int)
+for properties in ELEMENT_PROPERTIES.values():
+    ELEMENT_GROUPS[properties['number']] = properties['group'] or 0
+    SPIN_CLASSES[properties['number']] = SPIN_CLASS_IDS[properties['spin']]
+
+DEFAULT_LUJ = {symbol: properties['luj'] for symbol, properties in ELEMENT_PROPERTIES.items()
+               if properties['luj'] is not None}
+
 
 def get_initial_magmoms(atoms):
     # Guess spin on each atom based on number of outer electrons
     # What about AFM combinations? Need to check all symmetries?
-    high_spin_elements = ['Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe',
-                          'Y', 'Zr', 'Nb',
-                          'Hf', 'Ta']
-    low_spin_elements = ['Co', 'Ni',
-                         'Mo', 'Tc', 'Ru',
-                         'W', 'Re', 'Os', 'Ir']
-
-    # Assumin 2tg-eg splitting (octahedral field)
-    low_spin_function = np.array([0, 1, 2, 3, 2, 1, 0, 1, 2, 1, 0])
-    high_spin_function = np.array([0, 1, 2, 3, 4, 5, 4, 3, 2, 1, 0])
-
     # Whether Co is high or low spin depends on oxidation state?
+    numbers = atoms.numbers
 
-    N_oxygen = list(atoms.symbols).count('O')
+    N_oxygen = int(np.count_nonzero(numbers == 8))
     # N_H = list(atoms.symbols).count('H') # add more species later
     N_metal = len(atoms) - N_oxygen
     average_ox = N_oxygen / N_metal * 2
-    initial_magmoms = []
-    for a in atoms:
-        if a.symbol == 'O':
-            mag = 0
-        else:
-            ele = element(a.symbol)
-            group = int(ele.group_id)
-            period = int(ele.period)
-            if group > 1:
-                N_d = int(group - average_ox)  # Number of d electrons
-            else:
-                N_d = 0
-            if a.symbol in high_spin_elements:
-                mag = high_spin_function[N_d]
-            elif a.symbol in low_spin_elements:
-                mag = low_spin_function[N_d]
-            else:
-                mag = 0
-
-        mag += 0.01  # break symmetry
-        initial_magmoms += [mag]
-
-    return initial_magmoms
+
+    groups = ELEMENT_GROUPS[numbers]
+    spin_classes = SPIN_CLASSES[numbers]
+    # Number of d electrons, truncated towards zero
+    N_d = np.where(groups > 1, np.trunc(groups - average_ox), 0).astype(int)
+
+    magmoms = np.zeros(len(atoms))
+    high_spin = spin_classes == HIGH_SPIN
+    low_spin = spin_classes == LOW_SPIN
+    magmoms[high_spin] = HIGH_SPIN_FUNCTION[N_d[high_spin]]
+    magmoms[low_spin] = LOW_SPIN_FUNCTION[N_d[low_spin]]
+
+    magmoms += 0.01  # break symmetry
+    return magmoms.tolist()
 
 
 # def get_spin_state(symbol):
@@ -98,76 +102,22 @@ def get_kpoints(atoms, effective_length=25, bulk=True):
 
 
 def get_LUJ_values(atoms, user_luj=None):
-    selected_luj = {}
-
-    # Static values - can we do better than this?
-
-    ldau_luj = {
-        'Sc': {'L': 2, 'U': 3.00, 'J': 0.0},
-        'Ti': {'L': 2, 'U': 3.00, 'J': 0.0},
-        'V': {'L': 2, 'U': 3.25, 'J': 0.0},  # Materials Project
-        'Cr': {'L': 2, 'U': 3.50, 'J': 0.0},  # close to MP
-        'Mn': {'L': 2, 'U': 3.75, 'J': 0.0},
-        'Fe': {'L': 2, 'U': 4.30, 'J': 0.0},  # carter 4.3 eV Friebel 3.5 eV
-        'Co': {'L': 2, 'U': 3.32, 'J': 0.0},
-        'Ni': {'L': 2, 'U': 6.45, 'J': 0.0},  # This is simply too high, needs to be checked with HSE06
-        # 'Ni':{'L':  2, 'U': 6.45, 'J': 0.0}, # carter 5.5 Friebel 6.6 eV
-        'Cu': {'L': 2, 'U': 3.00, 'J': 0.0},  # we should have some U
-        'Zn': {'L': 2, 'U': 3.00, 'J': 0.0},  # used default U value
-        'Y': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Zr': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Nb': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Mo': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Tc': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Ru': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Rh': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Pd': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Ag': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Cd': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Hf': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Ta': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'W': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Re': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Os': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Ir': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Pt': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Au': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Hg': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'La': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Ce': {'L': 3, 'U': 0.00, 'J': 0.0},
-        'O': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'C': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'H': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Al': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Te': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Tl': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Sb': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Pb': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Ge': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Si': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'As': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'In': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Ga': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Sn': {'L': -1, 'U': 0.00, 'J': 0.0},
-        'Bi': {'L': -1, 'U': 0.00, 'J': 0.0}}
-
-    # Update with user-provided values if any
-    if user_luj:
-        for element, values in user_luj.items():
-            if element in ldau_luj:
-                # Update existing element with any of L, U, J that are provided
-                for param in ['L', 'U', 'J']:
-                    if param in values:
-                        ldau_luj[element][param] = values[param]
-            else:
-                # Add new element
-                ldau_luj[element] = values
-
-    # Select values for atoms in the system
+    # Static values from the element table, updated with user-provided values if any
     selected_luj = {}
 
     for sym in set(list(atoms.symbols)):
-        selected_luj[sym] = ldau_luj[sym]
+        values = (user_luj or {}).get(sym, {})
+        if sym in DEFAULT_LUJ:
+            # Update existing element with any of L, U, J that are provided
+            selected_luj[sym] = dict(DEFAULT_LUJ[sym])
+            for param in ['L', 'U', 'J']:
+                if param in values:
+                    selected_luj[sym][param] = values[param]
+        elif user_luj and sym in user_luj:
+            # Add new element
+            selected_luj[sym] = values
+        else:
+            raise KeyError(sym)
 
     return selected_luj
 
@@ -202,25 +152,22 @@ def get_afm_comp(atoms):
     return np.array(magmoms_list)[indices]
 
 
-def get_nbands_cohp(directory):
+def get_nbands_cohp(directory, potcars=None):
     # Get number of bands needed for lobster
     atoms = read(directory + 'POSCAR')
     symbols = list(atoms.symbols)
     Nbands = 0
     Nelectrons = 0
 
+    # POTCAR metadata of every species from the index, or from one pass over the POTCAR
+    potcars = potcars or read_potcar_headers(directory + 'POTCAR')
+    potcar_by_symbol = {potcar['symbol']: potcar for potcar in potcars}
+
     for sym in set(symbols):
         n = symbols.count(sym)
-        found = False
         Norb = 0
-        for line in open(directory + 'POTCAR', 'r'):
-            if found:
-                zval = int(float(line.rstrip('\n')))
-                found = False
-                break
-            if 'PBE ' + sym in line:
-                psp = [l for l in line.split(' ') if sym in l and not 'PAW' in l][0]
-                found = True
+        psp = potcar_by_symbol[sym]['psp']
+        zval = int(potcar_by_symbol[sym]['zval'])
 
         orbitals = orbital_map[psp]
         Norb += orbitals.count('s')
@@ -239,86 +186,91 @@ def get_nbands_cohp(directory):
     return Nbands
 
 
-def get_bader_charges(dir='.'):
-    if not (os.path.exists(dir + 'CHGCAR')):
-        quit('ERROR no CHGCAR present')
-    if os.path.exists(dir + 'AECCAR0'):
-        subprocess.call('cd ' + dir + '; /global/cfs/cdirs/m2997/bin/chgsum.pl AECCAR0 AECCAR2',
-                        shell=True)
-        subprocess.call('cd ' + dir + ';bader CHGCAR -ref CHGCAR_sum', shell=True)
+def get_restart(outcar, dir, results=None):
+    if results is not None:
+        # Final structure and moments already read by the streaming vasprun reader
+        atoms = results['atoms'].copy()
+        atoms.calc = results['atoms'].calc
+        moments = results['magmoms']
     else:
-        subprocess.call('cd ' + dir + '; bader CHGCAR', shell=True)
-
-    outfilename = dir + 'bader_charges.txt'
-
-    # Read bader output file
-    with open(dir + "ACF.dat", "r") as file:
-        lines = file.readlines()
-
-    newlines = []
-    for line in lines[2:-4]:
-        newline = map(float, line.split())
-        newlines.append(list(newline))
-
-    newlines = np.array(newlines)
-    charge = newlines[:, 4]
-
-    atoms = read(dir + 'OUTCAR')
-    names = list(atoms.symbols)
-
-    # Read PSP dependent number of valence electrons from OUTCAR
-    with open(dir + "OUTCAR", "r") as file:
-        outcar = file.readlines()
-
-    for line in outcar:
-        if 'ZVAL' in line and not 'valenz' in line:
-            zvals = [float(z) for z in line.split()[2:]]
-            break
-        if 'POSCAR:' in line:
-            atoms_short = [n for n in line.split()[1:]]
-    chargedict = {}
-    for i, a in enumerate(atoms_short):
-        chargedict[a] = zvals[i]
-
-    write_charge = []
-    with open(outfilename, 'w+') as outfile:
-        for i in range(len(charge)):
-            name_i = names[i]
-            index = i
-            charge_i = charge[i]
-            netcharge = -(charge_i - chargedict[name_i])
-            netcharge_round = round(netcharge, 2)
-
-            write_charge.append(netcharge_round)
-            print('index: ' + str(index) + ' name: ' + name_i +
-                  ' charge: ' + str(netcharge), file=outfile)
-
-    with open(outfilename, 'r') as outfile:
-        printout = outfile.readlines()
-        for line in printout:
-            print(line)
-    return write_charge
-
-
-def get_restart(outcar, dir):
-    relax_dir = dir + outcar
-    atoms = read(relax_dir)
-    moments = atoms.get_magnetic_moments()
+        relax_dir = dir + outcar
+        atoms = read(relax_dir)
+        moments = atoms.get_magnetic_moments()
 
     forces = np.linalg.norm(atoms.get_forces(), axis=1)
 
+    # Bader charges are computed afterwards on CPU nodes by the bader command
     atoms.set_initial_magnetic_moments(moments)
-    try:
-        atoms_charges = get_bader_charges(dir)
-        atoms.set_initial_charges(atoms_charges)
-    except:
-        print('bader charges failed')
-        pass
     print('Forces converged to fmax=', np.max(forces))
 
     write(dir + 'restart.json', atoms)
 
 
+# RTAG values written to the WAVECAR header by VASP (single/double precision, with/without SOC)
+WAVECAR_TAGS = {45200, 45210, 53300, 53310}
+
+
+def is_valid_wavecar(path):
+    """Check whether a WAVECAR has a complete header and consists of whole records."""
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            reclen, nspin, rtag = np.fromfile(f, dtype=np.float64, count=3)
+    except (OSError, ValueError):
+        return False
+    reclen = int(reclen)
+    return (int(rtag) in WAVECAR_TAGS and int(nspin) in (1, 2)
+            and reclen > 0 and size >= 2 * reclen and size % reclen == 0)
+
+
+def get_restart_atoms(atoms, directory):
+    """Return the atoms with the geometry of the last ionic step of an interrupted run.
+
+    The CONTCAR is in the species-sorted order ASE wrote the POSCAR in, ``ase-sort.dat``
+    maps it back to the order of ``atoms``. Returns None if there is no usable CONTCAR.
+    """
+    contcar_path = os.path.join(directory, 'CONTCAR')
+    if not os.path.exists(contcar_path) or os.path.getsize(contcar_path) == 0:
+        return None
+    try:
+        contcar = read(contcar_path, format='vasp')
+    except Exception:
+        return None
+    if len(contcar) != len(atoms):
+        return None
+
+    sort_path = os.path.join(directory, 'ase-sort.dat')
+    if os.path.exists(sort_path):
+        resort = np.loadtxt(sort_path, dtype=int, ndmin=2)[:, 1]
+        contcar = contcar[resort]
+    if contcar.get_chemical_symbols() != atoms.get_chemical_symbols():
+        return None
+
+    atoms = atoms.copy()
+    atoms.set_cell(contcar.get_cell())
+    atoms.set_positions(contcar.get_positions())
+    return atoms
+
+
+def backup_outputs(directory, restart_count, filenames=('OUTCAR', 'vasprun.xml', 'OSZICAR')):
+    """Move the outputs of an interrupted run aside before it is restarted."""
+    for filename in filenames:
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            os.replace(path, f"{path}.restart_{restart_count}")
+
+
+def get_orbital_map_key(symbol):
+    """Return the valence orbital mapping entry used for an element.
+
+    Semicore setups are preferred in the same order as the recommended VASP setups.
+    """
+    for suffix in ['_pv', '_sv', '_d', '_3', '_2']:
+        if symbol + suffix in orbital_map:
+            return symbol + suffix
+    return symbol
+
+
 def get_max_radii(directory):
     atoms = read(directory + 'POSCAR')
 
@@ -368,18 +320,7 @@ def write_lobsterIn(directory, config_params=None):
     atoms = read(restart_json)
 
     for symbol in set(atoms.get_chemical_symbols()):
-        if symbol + '_pv' in orbital_map:
-            calculation_lines.append("basisfunctions " + symbol + ' ' + orbital_map[symbol + '_pv'] + '\n')
-        elif symbol + '_sv' in orbital_map:
-            calculation_lines.append("basisfunctions " + symbol + ' ' + orbital_map[symbol + '_sv'] + '\n')
-        elif symbol + '_d' in orbital_map:
-            calculation_lines.append("basisfunctions " + symbol + ' ' + orbital_map[symbol + '_d'] + '\n')
-        elif symbol + '_3' in orbital_map:
-            calculation_lines.append("basisfunctions " + symbol + ' ' + orbital_map[symbol + '_3'] + '\n')
-        elif symbol + '_2' in orbital_map:
-            calculation_lines.append("basisfunctions " + symbol + ' ' + orbital_map[symbol + '_2'] + '\n')
-        else:
-            calculation_lines.append("basisfunctions " + symbol + ' ' + orbital_map[symbol] + '\n')
+        calculation_lines.append("basisfunctions " + symbol + ' ' + orbital_map[get_orbital_map_key(symbol)] + '\n')
 
     lines = lines + calculation_lines
     script.writelines(lines)
@@ -0,0 +1,207 @@
+"""Single-pass streaming reader for the results of a VASP run."""
+import os
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from ase import Atoms
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.units import GPa
+
+# kBar * A^3 to eV, for the PV term VASP includes in e_fr_energy
+KBAR_A3_TO_EV = 1e-22 / 1.602176634e-19
+
+# Large blocks that are not needed and are dropped as soon as they are parsed
+SKIPPED_TAGS = {'eigenvalues', 'projected', 'dos', 'partial', 'total'}
+
+
+def _parse_value(elem: ET.Element) -> Any:
+    """Convert an ``<i>`` or ``<v>`` element of vasprun.xml to a Python value."""
+    text = (elem.text or '').strip()
+    value_type = elem.get('type', 'float')
+    if elem.tag == 'v':
+        values = text.split()
+        if value_type == 'logical':
+            return [value.startswith('T') for value in values]
+        if value_type == 'int':
+            return [int(value) for value in values]
+        if value_type == 'string':
+            return values
+        return [float(value) for value in values]
+    if value_type == 'logical':
+        return text.startswith('T')
+    if value_type == 'int':
+        return int(text)
+    if value_type == 'string':
+        return text
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _parse_varray(elem: ET.Element) -> np.ndarray:
+    """Convert a ``<varray>`` element to a 2D array."""
+    return np.array([[float(value) for value in v.text.split()] for v in elem.findall('v')])
+
+
+def _parse_rows(elem: ET.Element) -> List[List[str]]:
+    """Return the columns of every row of an ``<array>`` element."""
+    return [[c.text.strip() for c in rc.findall('c')] for rc in elem.iter('rc')]
+
+
+def read_vasprun(path: str) -> Dict[str, Any]:
+    """Read the final results of a VASP run from vasprun.xml in a single streaming pass.
+
+    Only the last ionic step is kept, so memory does not grow with the number of ionic
+    steps, and eigenvalues, DOS and projections are discarded while parsing. Energies
+    follow ``ase.io.read_vasp_xml``: the free energy without the PV term and the energy
+    extrapolated to zero smearing.
+
+    Args:
+        path: Path of vasprun.xml
+
+    Returns:
+        Dict[str, Any]: ``atoms`` (final structure with a single point calculator),
+            ``energy``, ``free_energy``, ``forces``, ``stress`` (Voigt, eV/A^3),
+            ``incar``, ``parameters``, ``pseudopotentials``, ``kpoints`` and ``vasp_version``
+    """
+    results: Dict[str, Any] = {'incar': {}, 'parameters': {}, 'pseudopotentials': [], 'kpoints': None,
+                               'vasp_version': None}
+    symbols: List[str] = []
+    final_structure: Optional[ET.Element] = None
+    last_step: Dict[str, Any] = {}
+    step: Dict[str, Any] = {}
+    path_tags: List[str] = []
+
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            path_tags.append(elem.tag)
+            continue
+        path_tags.pop()
+        parent = path_tags[-1] if path_tags else None
+        tag = elem.tag
+
+        if tag in SKIPPED_TAGS:
+            elem.clear()
+        elif tag == 'generator':
+            version = elem.find("i[@name='version']")
+            results['vasp_version'] = version.text.strip() if version is not None else None
+        elif tag == 'incar':
+            results['incar'] = {child.get('name'): _parse_value(child) for child in elem if child.tag in ('i', 'v')}
+            elem.clear()
+        elif tag == 'parameters':
+            results['parameters'] = {child.get('name'): _parse_value(child)
+                                     for child in elem.iter() if child.tag in ('i', 'v') and child.get('name')}
+            elem.clear()
+        elif tag == 'kpoints' and parent == 'modeling':
+            divisions = elem.find("generation/v[@name='divisions']")
+            if divisions is not None:
+                results['kpoints'] = [[int(float(value)) for value in divisions.text.split()]]
+            else:
+                kpointlist = elem.find("varray[@name='kpointlist']")
+                results['kpoints'] = _parse_varray(kpointlist).tolist() if kpointlist is not None else None
+            elem.clear()
+        elif tag == 'atominfo':
+            for array in elem.findall('array'):
+                if array.get('name') == 'atoms':
+                    symbols = [row[0] for row in _parse_rows(array)]
+                elif array.get('name') == 'atomtypes':
+                    results['pseudopotentials'] = [row[4] for row in _parse_rows(array)]
+            elem.clear()
+        elif tag == 'scstep':
+            energy = elem.find('energy')
+            if energy is not None:
+                step['scf_correction'] = (float(energy.find("i[@name='e_0_energy']").text)
+                                          - float(energy.find("i[@name='e_fr_energy']").text))
+            elem.clear()
+        elif tag == 'calculation':
+            energy = elem.find("energy/i[@name='e_fr_energy']")
+            if energy is not None:
+                step['free_energy'] = float(energy.text)
+                for name in ('forces', 'stress'):
+                    varray = elem.find(f"varray[@name='{name}']")
+                    step[name] = _parse_varray(varray) if varray is not None else None
+                basis = elem.find("structure/crystal/varray[@name='basis']")
+                step['cell'] = _parse_varray(basis) if basis is not None else None
+                last_step = step
+            step = {}
+            elem.clear()
+        elif tag == 'structure' and elem.get('name') == 'finalpos':
+            final_structure = elem
+
+    if not last_step or final_structure is None:
+        raise ValueError(f"No completed ionic step found in {path}")
+
+    cell = _parse_varray(final_structure.find("crystal/varray[@name='basis']"))
+    scaled_positions = _parse_varray(final_structure.find("varray[@name='positions']"))
+    atoms = Atoms(symbols, cell=cell, scaled_positions=scaled_positions, pbc=True)
+
+    free_energy = last_step['free_energy']
+    if last_step.get('cell') is not None:
+        pstress = results['parameters'].get('PSTRESS', 0.0) or 0.0
+        free_energy -= pstress * KBAR_A3_TO_EV * abs(np.linalg.det(last_step['cell']))
+    energy = free_energy + last_step.get('scf_correction', 0.0)
+
+    forces = last_step.get('forces')
+    stress = last_step.get('stress')
+    if stress is not None:
+        stress = (stress * -0.1 * GPa).reshape(9)[[0, 4, 8, 5, 2, 1]]
+
+    atoms.calc = SinglePointCalculator(atoms, energy=energy, free_energy=free_energy, forces=forces, stress=stress)
+    results.update({
+        'atoms': atoms,
+        'energy': energy,
+        'free_energy': free_energy,
+        'forces': forces,
+        'stress': stress
+    })
+    return results
+
+
+def read_outcar_magmoms(path: str, natoms: int) -> np.ndarray:
+    """Read the final magnetic moments from an OUTCAR line by line.
+
+    Only the last ``magnetization (x)`` block is kept. Runs without spin polarization
+    have no such block and get zero moments.
+
+    Args:
+        path: Path of the OUTCAR
+        natoms: Number of atoms
+
+    Returns:
+        np.ndarray: Total magnetic moment of every atom
+    """
+    magmoms = np.zeros(natoms)
+    with open(path, 'r', errors='replace') as f:
+        for line in f:
+            if 'magnetization (x)' not in line:
+                continue
+            for line in f:
+                if line.startswith('---'):
+                    break
+            block = np.zeros(natoms)
+            for i in range(natoms):
+                block[i] = float(next(f).split()[-1])
+            magmoms = block
+    return magmoms
+
+
+def read_vasp_results(directory: str) -> Dict[str, Any]:
+    """Read the final results of the VASP run in a directory.
+
+    Combines :func:`read_vasprun` with the final magnetic moments from the OUTCAR, which
+    are also attached to the calculator of ``atoms``.
+
+    Args:
+        directory: Calculation directory
+
+    Returns:
+        Dict[str, Any]: Results of :func:`read_vasprun` and ``magmoms``
+    """
+    results = read_vasprun(os.path.join(directory, 'vasprun.xml'))
+    atoms = results['atoms']
+    results['magmoms'] = read_outcar_magmoms(os.path.join(directory, 'OUTCAR'), len(atoms))
+    atoms.calc.results['magmoms'] = results['magmoms']
+    atoms.calc.results['magmom'] = float(np.sum(results['magmoms']))
+    return results
@@ -1,12 +1,13 @@
 """Batch processor for AutoCatLab."""
 import json
 import math
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from pathlib import Path
 
 from AutoCatLab.container_base import Container
-from AutoCatLab.db.models import WorkflowDetail, WorkflowBatchDetail, WorkflowBatchExecution
+from AutoCatLab.db.models import WorkflowDetail, WorkflowBatchDetail, WorkflowBatchExecution, FINISHED_STATUSES
 from AutoCatLab.util.util import copy_file
+from AutoCatLab.util.cost_model import pack_by_cost
 
 
 class BatchProcessor:
@@ -23,6 +24,7 @@ class BatchProcessor:
         self.config = container.get('config')
         self.batch_crud = container.get('batch_crud')
         self.execution_crud = container.get('execution_crud')
+        self.material_crud = container.get('material_crud')
         self.job_script_generator = container.get('job_script_generator')
 
     def process(self, workflow_detail: WorkflowDetail, calculation: str, input_data: List[Dict[str, Any]]) -> Tuple[
@@ -38,29 +40,51 @@ class BatchProcessor:
             List[Dict[str, Any]]: List of batch configurations
         """
         self.logger.info(f"Processing batches for {calculation}")
-        batch_size = self.config['batch_size']
-        batch_count = math.ceil(len(input_data) / batch_size)
+        planned_batches = []
+        for partition, materials in self.route_materials(calculation, input_data):
+            planned_batches.extend((partition, batch_data) for batch_data in self.plan_batches(materials))
         batches = []
+        workflow_batch_executions = []
         connector = self.container.get('sqlite_connector')
-        for i in range(batch_count):
-            start_idx = i * batch_size
-            end_idx = min((i + 1) * batch_size, len(input_data))
-            batch_data = input_data[start_idx:end_idx]
+
+        # Continue numbering after batches that already exist, e.g. when extending a workflow
+        existing_batches = [batch for batch in self.batch_crud.get_batches(connector.get_session(),
+                                                                           workflow_detail.calc_unique_name)
+                            if batch.calculation_type == calculation]
+        batch_offset = len(existing_batches)
+        material_offset = sum(len(json.loads(batch.materials)) for batch in existing_batches)
+
+        end_idx = material_offset
+        for i, (partition, batch_data) in enumerate(planned_batches):
+            batch_number = batch_offset + i + 1
+            start_idx = end_idx
+            end_idx = start_idx + len(batch_data)
 
             workflow_batch_data = {
                 'workflow_unique_name': workflow_detail.calc_unique_name,
                 'calculation_type': calculation,
+                'partition': partition,
                 'materials': [material['name'] for material in batch_data],
                 'result_batch_dir': Path(self.config[
-                                             'workflow_output_directory']) / workflow_detail.calc_unique_name / 'results' / f'batch_{i + 1}_{start_idx}_{end_idx}',
+                                             'workflow_output_directory']) / workflow_detail.calc_unique_name / 'results' / f'batch_{batch_number}_{start_idx}_{end_idx}',
                 'script_path': Path(self.config[
-                                        'workflow_output_directory']) / workflow_detail.calc_unique_name / 'scripts' / f'batch_{i + 1}_{calculation}_{start_idx}_{end_idx}.sh'
+                                        'workflow_output_directory']) / workflow_detail.calc_unique_name / 'scripts' / f'batch_{batch_number}_{calculation}_{start_idx}_{end_idx}.sh'
             }
 
             workflow_batch_detail = self.batch_crud.create_batch(connector.get_session(), workflow_batch_data)
+            for material in batch_data:
+                self.material_crud.create_material(connector.get_session(), {
+                    'workflow_unique_name': workflow_detail.calc_unique_name,
+                    'material_name': material['name'],
+                    'structure_hash': material.get('structure_hash'),
+                    'json_file_path': material['json_file_path'],
+                    'batch_id': workflow_batch_detail.batch_id,
+                    'system_size': material.get('system_size')
+                })
+            # Make the material index visible to the walltime prediction of the script
+            connector.get_session().flush()
 
             script_path = self.job_script_generator.generate_script(workflow_detail, workflow_batch_detail)
-            workflow_batch_executions = []
             for material in batch_data:
                 material_dir = Path(workflow_batch_detail.result_batch_dir) / material['name']
                 for calculation_step in self.config['workflow_steps'][calculation]['calculations']:
@@ -92,7 +116,174 @@ class BatchProcessor:
 
         return batches, workflow_batch_executions
 
-    
+
+    def route_materials(self, calculation: str, input_data: List[Dict[str, Any]]) -> List[
+        Tuple[Optional[str], List[Dict[str, Any]]]]:
+        """Split materials between the CPU and the default (GPU) partition of a step.
+
+        With ``routing.enabled`` and a ``cpu_submission_detail`` for the step, materials with
+        at most ``routing.cpu_max_atoms`` atoms and, if set, an estimated cost of at most
+        ``routing.cpu_max_cost`` are routed to the CPU partition. Pilot workers claim from a
+        single queue, so materials are not routed in pilot mode.
+
+        Args:
+            calculation (str): Calculation type
+            input_data (List[Dict[str, Any]]): Processed input materials
+
+        Returns:
+            List[Tuple[Optional[str], List[Dict[str, Any]]]]: Non-empty material groups with
+                their partition, ``cpu`` or None for the step's default
+        """
+        params = self.config['routing']
+        if (not params['enabled'] or 'cpu_submission_detail' not in self.config['workflow_steps'][calculation]
+                or self.config['submission']['mode'] == 'pilot'):
+            return [(None, input_data)]
+
+        cpu, default = [], []
+        for material in input_data:
+            system_size = material.get('system_size')
+            on_cpu = (system_size is not None and system_size['n_atoms'] <= params['cpu_max_atoms']
+                      and (params['cpu_max_cost'] is None or system_size['cost'] <= params['cpu_max_cost']))
+            (cpu if on_cpu else default).append(material)
+
+        self.logger.info(f"Routed {len(cpu)} materials to the CPU partition and {len(default)} to the default partition")
+        return [(partition, materials) for partition, materials in ((None, default), ('cpu', cpu)) if materials]
+
+    def plan_batches(self, input_data: List[Dict[str, Any]], batch_size: int = None) -> List[List[Dict[str, Any]]]:
+        """Split materials into batches.
+
+        With ``batch_strategy`` set to ``cost`` materials are bin-packed on their
+        estimated cost so that every batch has a similar predicted walltime. The
+        number of batches stays the one implied by ``batch_size``. Otherwise, or when
+        the cost of a material is unknown, the input is sliced into chunks of
+        ``batch_size``.
+
+        Args:
+            input_data (List[Dict[str, Any]]): Processed input materials
+            batch_size (int, optional): Materials per batch, ``batch_size`` from the config if not given
+
+        Returns:
+            List[List[Dict[str, Any]]]: Materials of each batch
+        """
+        batch_size = batch_size or self.config['batch_size']
+        batch_count = math.ceil(len(input_data) / batch_size)
+
+        if self.config['batch_strategy'] == 'cost' and input_data:
+            if all(material.get('system_size') for material in input_data):
+                costs = [material['system_size']['cost'] for material in input_data]
+                planned_batches = [[input_data[idx] for idx in batch] for batch in pack_by_cost(costs, batch_count)]
+                batch_costs = [sum(material['system_size']['cost'] for material in batch) for batch in planned_batches]
+                self.logger.info(f"Packed {len(input_data)} materials into {len(planned_batches)} batches by cost "
+                                 f"(max/mean batch cost {max(batch_costs) / (sum(batch_costs) / len(batch_costs)):.2f})")
+                return planned_batches
+            self.logger.warning("Cost estimate missing for some materials. Falling back to batch_size slicing.")
+
+        return [input_data[i * batch_size:(i + 1) * batch_size] for i in range(batch_count)]
+
+    def schedule_icohp(self, workflow_detail: WorkflowDetail, flush: bool = False) -> Tuple[
+        List[WorkflowBatchDetail], List[WorkflowBatchExecution]]:
+        """Create ICOHP batches for materials whose DFT DOS is done, independently of their DFT batch.
+
+        Every material becomes ready for ICOHP as soon as its own ``BULK_DFT_DOS`` execution
+        completed. Ready materials are packed into batches of ``icohp_pipeline.batch_size``;
+        a partial batch is held back while DFT work that could fill it is still outstanding,
+        unless ``flush`` is set. With ``icohp_pipeline.use_dependency``, materials of submitted
+        DFT batches are scheduled too, with a scheduler dependency on the DFT jobs.
+
+        Args:
+            workflow_detail (WorkflowDetail): Workflow details from database
+            flush (bool): Also create a partial batch
+
+        Returns:
+            Tuple[List[WorkflowBatchDetail], List[WorkflowBatchExecution]]: Created batches and executions
+        """
+        params = self.config['icohp_pipeline']
+        connector = self.container.get('sqlite_connector')
+        session = connector.get_session()
+        workflow_name = workflow_detail.calc_unique_name
+
+        dos_executions = self.execution_crud.get_workflow_executions(session, workflow_name, 'BULK_DFT_DOS')
+        scheduled = {execution.material_name for execution in
+                     self.execution_crud.get_workflow_executions(session, workflow_name, 'BULK_ICOHP')}
+
+        ready, waiting = [], []
+        for execution in dos_executions:
+            if execution.material_name in scheduled or execution.status in ('failed', 'timeout'):
+                continue
+            if execution.status in FINISHED_STATUSES:
+                ready.append(execution)
+            elif params['use_dependency'] and execution.batch.job_id:
+                waiting.append(execution)
+
+        outstanding = sum(execution.material_name not in scheduled and execution.status not in FINISHED_STATUSES + ('failed', 'timeout')
+                          for execution in dos_executions)
+        costs = {material.material_name: material.estimated_cost
+                 for material in self.material_crud.get_materials(session, workflow_name)}
+
+        batches, executions = [], []
+        groups = [(ready, None)]
+        if waiting:
+            # One batch group per set of DFT jobs, so every batch waits only for its own materials
+            by_job: Dict[str, List[WorkflowBatchExecution]] = {}
+            for execution in waiting:
+                by_job.setdefault(execution.batch.job_id, []).append(execution)
+            groups.extend((job_executions, [job_id]) for job_id, job_executions in by_job.items())
+
+        for group, dependency in groups:
+            input_data = [{'name': execution.material_name,
+                           'dos_execution': execution,
+                           'system_size': {'cost': costs[execution.material_name]} if costs.get(execution.material_name) else None}
+                          for execution in group]
+            planned_batches = self.plan_batches(input_data, params['batch_size']) if input_data else []
+            if dependency is None and planned_batches and len(planned_batches[-1]) < params['batch_size'] \
+                    and outstanding and not flush:
+                planned_batches = planned_batches[:-1]
+            for batch_data in planned_batches:
+                batch, batch_executions = self.create_icohp_batch(workflow_detail, batch_data, dependency)
+                batches.append(batch)
+                executions.extend(batch_executions)
+
+        self.logger.info(f"Scheduled {sum(len(json.loads(batch.materials)) for batch in batches)} materials "
+                         f"for ICOHP in {len(batches)} batches")
+        return batches, executions
+
+    def create_icohp_batch(self, workflow_detail: WorkflowDetail, batch_data: List[Dict[str, Any]],
+                           dependency: List[str] = None) -> Tuple[WorkflowBatchDetail, List[WorkflowBatchExecution]]:
+        """Create an ICOHP batch for materials of any DFT batches.
+
+        The ICOHP executions live in the DFT material directories, next to the DOS they read.
+        """
+        connector = self.container.get('sqlite_connector')
+        calculation = 'icohp'
+        batch_number = len([batch for batch in self.batch_crud.get_batches(connector.get_session(),
+                                                                           workflow_detail.calc_unique_name)
+                            if batch.calculation_type == calculation]) + 1
+        workflow_dir = Path(self.config['workflow_output_directory']) / workflow_detail.calc_unique_name
+        workflow_batch_detail = self.batch_crud.create_batch(connector.get_session(), {
+            'workflow_unique_name': workflow_detail.calc_unique_name,
+            'calculation_type': calculation,
+            'materials': [material['name'] for material in batch_data],
+            'result_batch_dir': workflow_dir / 'results' / f'icohp_batch_{batch_number}',
+            'script_path': workflow_dir / 'scripts' / f'batch_{batch_number}_{calculation}_pipeline.sh'
+        })
+
+        script_path = self.job_script_generator.generate_script(workflow_detail, workflow_batch_detail, dependency)
+        workflow_batch_executions = []
+        for material in batch_data:
+            material_dir = Path(material['dos_execution'].result_material_dir).parent
+            for calculation_step in self.config['workflow_steps'][calculation]['calculations']:
+                calculation_step_dir = material_dir / calculation_step
+                calculation_step_dir.mkdir(parents=True, exist_ok=True)
+                workflow_batch_executions.append(self.execution_crud.create_execution(connector.get_session(), {
+                    'workflow_unique_name': workflow_detail.calc_unique_name,
+                    'batch_id': workflow_batch_detail.batch_id,
+                    'material_name': material['name'],
+                    'result_material_dir': str(calculation_step_dir),
+                    'calculation_name': calculation_step,
+                    'script_path': script_path
+                }))
+        return workflow_batch_detail, workflow_batch_executions
+
     def update_batch_scripts(self, workflow_detail: WorkflowDetail, batches: List[WorkflowBatchDetail]) -> None:
         for batch in batches:
             self.job_script_generator.generate_script(workflow_detail, batch)
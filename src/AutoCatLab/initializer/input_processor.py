@@ -1,11 +1,14 @@
 """Input processor for AutoCatLab."""
+import itertools
+import json
+import re
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Tuple, List, Optional
 
 import ase.db
 from ase import Atoms
-from ase.io import read, write
+from ase.io import read, write, iread
 from mp_api.client import MPRester
 from pymatgen.core import Structure
 from pymatgen.io.ase import AseAtomsAdaptor, MSONAtoms, Atoms
@@ -13,9 +16,14 @@ from pymatgen.io.ase import AseAtomsAdaptor, MSONAtoms, Atoms
 from AutoCatLab.client.mpi_api import MPIClient
 from AutoCatLab.container_base import Container
 from AutoCatLab.db.models import WorkflowDetail
-from AutoCatLab.util.util import prompt_yes_no, create_directory, copy_file
+from AutoCatLab.util.util import prompt_yes_no, create_directory, copy_file, get_structure_hash
+from AutoCatLab.util.structure_screening import screen_structure
+from AutoCatLab.util.cost_model import get_system_size
 from catkit.gen.surface import SlabGenerator
 
+# Keys looked up in ``atoms.info`` to name frames of a trajectory input
+FRAME_NAME_KEYS = ('name', 'material_id', 'mp_id', 'id', 'uid')
+
 
 class InputProcessor:
     """Processes input data for calculations."""
@@ -29,6 +37,10 @@ class InputProcessor:
         self.container = container
         self.logger = container.get('logger')
         self.config = container.get('config')
+        self.registered = {}
+        self.registered_hashes = set()
+        self.skipped_registered = 0
+        self.screening_report = {}
 
     def _get_timestamped_name(self, original_name: str) -> str:
         """
@@ -42,17 +54,24 @@ class InputProcessor:
         """
         return original_name
 
-    def process(self, workflow_detail: WorkflowDetail) -> list[Dict[str, Any]]:
+    def process(self, workflow_detail: WorkflowDetail,
+                registered: Optional[Dict[str, Optional[str]]] = None) -> list[Dict[str, Any]]:
         """Process input for a calculation.
         
         Args:
-            calculation (str): Calculation type
-            params (Dict[str, Any]): Calculation parameters
+            workflow_detail (WorkflowDetail): Workflow details from database
+            registered (Dict[str, Optional[str]], optional): Structure hashes of the materials
+                already registered in the workflow, keyed by material name. Inputs matching a
+                registered material are skipped and their files are left untouched.
             
         Returns:
             Dict[str, Any]: Processed input data
         """
         self.logger.info(f"Processing input for {workflow_detail.calc_unique_name}")
+        self.registered = registered or {}
+        self.registered_hashes = {structure_hash for structure_hash in self.registered.values() if structure_hash}
+        self.skipped_registered = 0
+        self.screening_report = {}
         materials, failed_input = None, []
         match self.config['workflow_input']['type']:
             case "location":
@@ -63,10 +82,13 @@ class InputProcessor:
                 materials, failed_input = self._process_mpi_custom_query()
             case "ase_db":
                 materials, failed_input = self._process_ase_db_input()
+            case "trajectory":
+                materials, failed_input = self._process_trajectory_input()
             case _:
                 raise ValueError(f"Unsupported input type: {self.config['workflow_input']['type']}")
 
-        if len(materials) == 0:
+        # Streamed inputs are screened while they are read, so rejections are reported below
+        if len(materials) == 0 and not self.skipped_registered and not self.screening_report:
             self.logger.error(
                 f"No valid materials found in input directory. Please check the input directory and try again.")
             raise ValueError("No valid materials found in input directory")
@@ -75,16 +97,125 @@ class InputProcessor:
             self.logger.error(f"Failed to process {len(failed_input)} files. Please correct the files and try again.")
             raise ValueError("Failed to process some files in input directory")
 
+        new_materials = []
         for material in materials:
-            create_directory(material['raw_file_path'].parent)
-            create_directory(material['json_file_path'].parent)
-            if self.config['workflow_input']['type'] == "location":
-                copy_file(material['raw_file'], material['raw_file_path'])
-            else:
-                write(str(material['raw_file_path']), material['structure'], format='cif')
-            write(str(material['json_file_path']), material['structure'], format='json')
-        self.logger.info(f"Processed {len(materials)} materials")
-        return materials
+            if 'structure' in material:
+                material.setdefault('structure_hash', get_structure_hash(material['structure']))
+                if self._is_registered(material) or not self._screen_material(material):
+                    continue
+                material['system_size'] = self._get_system_size(material)
+                self._write_material_files(material)
+            # Streamed inputs are filtered and written while they are read
+            new_materials.append(material)
+
+        if self.skipped_registered:
+            self.logger.info(f"Skipped {self.skipped_registered} materials already registered in the workflow")
+        self._write_screening_report()
+        if not new_materials and not self.skipped_registered:
+            self.logger.error("All input structures were rejected by the input screening.")
+            raise ValueError("No valid materials left after input screening")
+        self.logger.info(f"Processed {len(new_materials)} materials")
+        return new_materials
+
+    def _is_registered(self, material: Dict[str, Any]) -> bool:
+        """Check whether a material is already registered in the workflow.
+
+        Args:
+            material (Dict[str, Any]): Material dictionary with a structure hash
+
+        Returns:
+            bool: True if the material should be skipped
+        """
+        registered = False
+        if material['structure_hash'] in self.registered_hashes:
+            registered = True
+        elif material['name'] in self.registered:
+            if self.registered[material['name']] is not None:
+                self.logger.warning(f"Input for {material['name']} differs from the registered material "
+                                    f"of the same name and is ignored")
+            registered = True
+
+        if registered:
+            self.skipped_registered += 1
+        return registered
+
+    def _screen_material(self, material: Dict[str, Any]) -> bool:
+        """Run the geometric pre-screen on a material before it is batched.
+
+        Depending on ``input_screening.action`` a structure failing a check is either
+        rejected or kept with its issues recorded under ``screening_issues``.
+
+        Args:
+            material (Dict[str, Any]): Material dictionary with its structure
+
+        Returns:
+            bool: False if the material is rejected
+        """
+        params = self.config['input_screening']
+        if not params['enabled']:
+            return True
+
+        atoms = material['structure']
+        is_surface = "_SURFACE_" in material['name'] or not atoms.pbc.all()
+        issues = screen_structure(atoms, params, is_surface=is_surface)
+        if not issues:
+            return True
+
+        rejected = params['action'] == 'reject'
+        self.screening_report[material['name']] = {'rejected': rejected, 'issues': issues}
+        if rejected:
+            self.logger.warning(f"Rejected {material['name']}: {'; '.join(issues)}")
+            return False
+
+        self.logger.warning(f"Flagged {material['name']}: {'; '.join(issues)}")
+        material['screening_issues'] = issues
+        return True
+
+    def _get_system_size(self, material: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Estimate the system size features used to plan batches.
+
+        Args:
+            material (Dict[str, Any]): Material dictionary with its structure
+
+        Returns:
+            Optional[Dict[str, Any]]: System size features, or None if they cannot be estimated
+        """
+        calculations = self.config['workflow_steps']['dft']['calculations']
+        is_bulk = "_SURFACE_" not in material['name'] and any("BULK" in calc for calc in calculations)
+        try:
+            return get_system_size(material['structure'], is_bulk=is_bulk)
+        except Exception as e:
+            self.logger.warning(f"Could not estimate system size of {material['name']}: {str(e)}")
+            return None
+
+    def _write_screening_report(self) -> None:
+        """Write the structures rejected or flagged by the pre-screen to the input directory."""
+        if not self.screening_report:
+            return
+        rejected = sum(1 for entry in self.screening_report.values() if entry['rejected'])
+        self.logger.warning(f"Input screening rejected {rejected} and flagged "
+                            f"{len(self.screening_report) - rejected} structures")
+        report_path = Path(self.config['workflow_output_directory']) / self.config[
+            'workflow_unique_name'] / 'input' / 'screening_report.json'
+        create_directory(report_path.parent)
+        with open(report_path, 'w') as f:
+            json.dump(self.screening_report, f, indent=2)
+
+    def _write_material_files(self, material: Dict[str, Any]) -> None:
+        """Write the raw and processed input files of a material.
+
+        Args:
+            material (Dict[str, Any]): Material dictionary
+        """
+        create_directory(material['raw_file_path'].parent)
+        create_directory(material['json_file_path'].parent)
+        if self.config['workflow_input']['type'] == "location":
+            copy_file(material['raw_file'], material['raw_file_path'])
+        elif self.config['workflow_input']['type'] == "trajectory":
+            write(str(material['raw_file_path']), material['structure'], format='extxyz')
+        else:
+            write(str(material['raw_file_path']), material['structure'], format='cif')
+        write(str(material['json_file_path']), material['structure'], format='json')
 
     def generate_surface_input_files(self):
         input_dir = Path(self.config['workflow_input']['value'])
@@ -169,6 +300,9 @@ class InputProcessor:
             materials = []
             failed_ids = []
             for mp_id in mp_ids:
+                if mp_id in self.registered:
+                    self.skipped_registered += 1
+                    continue
                 try:
                     mp_structure = mpr.get_structure_by_material_id(mp_id)
                     timestamped_id = self._get_timestamped_name(mp_id)
@@ -193,7 +327,7 @@ class InputProcessor:
                     failed_ids.append(mp_id)
                     continue
 
-            if not materials:
+            if not materials and not self.skipped_registered:
                 raise ValueError("No valid materials found from Materials Project")
 
             return materials, failed_ids
@@ -294,3 +428,95 @@ class InputProcessor:
                 raise ValueError("No valid materials found in ASE database")
 
             return materials, failed_input
+
+    def _get_frame_name(self, atoms: Atoms, structure_hash: str) -> str:
+        """Get a stable material name for a trajectory frame.
+
+        Args:
+            atoms (Atoms): Frame structure
+            structure_hash (str): Hash of the frame structure
+
+        Returns:
+            str: Material name taken from the frame info, or derived from the
+                chemical formula and structure hash
+        """
+        name_key = self.config['workflow_input'].get('name_key')
+        keys = (name_key,) if name_key else FRAME_NAME_KEYS
+        for key in keys:
+            value = atoms.info.get(key)
+            if value is not None and str(value).strip():
+                return re.sub(r'[^A-Za-z0-9_.+-]', '_', str(value).strip())
+        return f"{atoms.get_chemical_formula()}_{structure_hash[:10]}"
+
+    def _process_trajectory_input(self) -> tuple[list[Dict[str, Any]], list[Any]]:
+        """
+        Process input from a multi-frame structure file (extxyz, ASE trajectory, ...).
+
+        Frames are streamed with ``ase.io.iread`` and their input files are written
+        as they are read, so the returned material dictionaries do not hold the
+        structures and the file is never loaded as a whole.
+
+        Returns:
+            List of material dictionaries
+        """
+        input_file = Path(self.config['workflow_input']['value'])
+        if not input_file.is_file():
+            raise ValueError(f"Input file does not exist: {input_file}")
+
+        input_dir = Path(self.config['workflow_output_directory']) / self.config['workflow_unique_name'] / 'input'
+        materials = []
+        failed_input = []
+        names = set()
+        frames = iread(str(input_file), index=':', format=self.config['workflow_input'].get('format'))
+        for idx in itertools.count():
+            try:
+                atoms = next(frames)
+            except StopIteration:
+                break
+            except Exception as e:
+                # A generator that raised cannot be resumed, so the frames after it are lost as well
+                self.logger.warning(f"Error reading frame {idx} of {input_file}: {str(e)}")
+                failed_input.append(idx)
+                break
+
+            try:
+                structure_hash = get_structure_hash(atoms)
+                name = self._get_frame_name(atoms, structure_hash)
+                if name in names:
+                    name = f"{name}_{structure_hash[:10]}"
+                if name in names:
+                    self.logger.warning(f"Skipping frame {idx}: duplicate of material {name}")
+                    continue
+                names.add(name)
+
+                timestamped_id = self._get_timestamped_name(name)
+                material = {
+                    "name": timestamped_id,
+                    "structure": atoms,
+                    "structure_hash": structure_hash,
+                    "raw_file_path": input_dir / 'raw' / f"{timestamped_id}.xyz",
+                    "json_file_path": input_dir / 'processed' / f"{timestamped_id}.json",
+                }
+                if self._is_registered(material) or not self._screen_material(material):
+                    continue
+                material['system_size'] = self._get_system_size(material)
+                self._write_material_files(material)
+                del material['structure']
+                materials.append(material)
+
+            except Exception as e:
+                self.logger.warning(f"Error processing frame {idx} of {input_file}: {str(e)}")
+                failed_input.append(idx)
+                continue
+
+        if failed_input:
+            # The input is rejected as a whole, so the files of its readable frames are removed
+            for material in materials:
+                material['raw_file_path'].unlink(missing_ok=True)
+                material['json_file_path'].unlink(missing_ok=True)
+            return materials, failed_input
+
+        if not materials and not self.skipped_registered and not self.screening_report:
+            raise ValueError(f"No valid materials found in {input_file}")
+
+        return materials, failed_input
@@ -1,9 +1,10 @@
 """Job processor for AutoCatLab."""
+from datetime import datetime
+from pathlib import Path
 from typing import Dict, Any, List
-import subprocess
 
 from AutoCatLab.container_base import Container
-from AutoCatLab.db.models import WorkflowBatchDetail
+from AutoCatLab.db.models import WorkflowBatchDetail, WorkflowJobArray, WorkflowExecutionLease
 from AutoCatLab.util.util import get_bool_env, show_message
 
 
@@ -15,36 +16,149 @@ class JobProcessor:
         self.logger = container.get('logger')
         self.config = container.get('config')
 
-    def process(self, batches: List[WorkflowBatchDetail]) -> None:
-        
+    def process(self, batches: List[WorkflowBatchDetail]) -> bool:
+        """Submit the job scripts of batches.
+
+        Args:
+            batches: Batches to submit
+
+        Returns:
+            bool: True if every batch was submitted
+        """
         if get_bool_env('local_dev'):
             self.logger.info("Running in local development mode. Skipping job submission.")
             # raise Exception("Running in local development mode. Skipping job submission.")
-            return
-        
+            return True
+
+        if batches and all(self.get_scheduler_type(batch.calculation_type) == 'local' for batch in batches):
+            success = self.container.get('local_scheduler').run(batches)
+            show_message("All local jobs finished" + ("" if success else " (some failed)"),
+                         "success" if success else "error")
+            return success
+
+        if self.config['submission']['mode'] == 'daemon':
+            # Leave the batches to the submission daemon, which picks up batches without a job id
+            session = self.container.get('sqlite_connector').get_session()
+            for batch in batches:
+                self.container.get('batch_crud').update_batch(session, batch.batch_id, {'job_id': None})
+            session.commit()
+            show_message(f"{len(batches)} batches queued for the submission daemon "
+                         f"(autocatlab submit-daemon)", "success")
+            return True
+
+        if self.config['submission']['mode'] == 'pilot':
+            self.process_pilot(batches)
+            return True
+
+        if self.config['submission']['mode'] == 'array' and len(batches) > 1:
+            self.process_array(batches)
+            return True
+
+        # Batch rows must be visible to the jobs as soon as they start
+        self.container.get('sqlite_connector').get_session().commit()
+        failed = self.container.get('job_submitter').submit_batches(batches)
+        if failed:
+            message = (f"Failed to submit {len(failed)} of {len(batches)} batches: "
+                       f"{', '.join(str(batch.batch_id) for batch in failed)}")
+            show_message(message, "error")
+            self.logger.error(message)
+            return False
 
+        show_message("All jobs submitted successfully", "success")
+        self.logger.info("All jobs submitted successfully")
+        return True
+
+    def process_array(self, batches: List[WorkflowBatchDetail]) -> None:
+        """Submit batches as one job array per calculation type and partition.
+
+        Array task ``i`` runs the i-th batch; the batch ids are stored in the workflow DB
+        and every batch records the job id of its array task.
+
+        Args:
+            batches: Batches to submit
+        """
         connector = self.container.get('sqlite_connector')
-        success = True
-        for batch in batches:
-            try:
-                result = subprocess.run(['sbatch', str(batch.script_path)],
-                                    capture_output=True,
-                                    text=True)
-                if result.returncode == 0:               
-                    job_id = result.stdout.strip().split()[-1]
-                    self.container.get('batch_crud').update_batch(
-                        connector.get_session(),
-                        batch.batch_id,
-                        {'job_id': job_id}
-                    )
-                else:
-                    success = False
-                    raise Exception(f"Job submission failed: {result.stderr}")
+        session = connector.get_session()
+        groups = list(dict.fromkeys((batch.calculation_type, batch.partition) for batch in batches))
+
+        for calculation_type, partition in groups:
+            array_batches = [batch for batch in batches
+                             if batch.calculation_type == calculation_type and batch.partition == partition]
+            workflow_detail = array_batches[0].workflow
+            job_array = self.container.get('job_array_crud').create_job_array(session, {
+                'workflow_unique_name': workflow_detail.calc_unique_name,
+                'calculation_type': calculation_type,
+                'batch_ids': [batch.batch_id for batch in array_batches]
+            })
+            job_array.script_path = str(Path(array_batches[0].script_path).parent /
+                                        f'array_{job_array.array_id}_{calculation_type}.sh')
+            self.container.get('job_script_generator').generate_array_script(
+                workflow_detail, job_array, array_batches)
 
+            session.commit()
+            try:
+                job_id = self.container.get('job_submitter').submit_script(calculation_type, job_array.script_path)
             except Exception as e:
-                self.logger.error(f"Failed to submit batch {batch.batch_id}: {str(e)}")
+                self.logger.error(f"Failed to submit job array {job_array.array_id}: {str(e)}")
                 raise
 
-        if success:
-            show_message("All jobs submitted successfully", "success")
-            self.logger.info("All jobs submitted successfully")
+            job_array.job_id = job_id
+            for task_id, batch in enumerate(array_batches):
+                self.container.get('batch_crud').update_batch(
+                    session,
+                    batch.batch_id,
+                    {'job_id': self.get_array_task_job_id(calculation_type, job_id, task_id)}
+                )
+            session.commit()
+            self.logger.info(f"Submitted {len(array_batches)} {calculation_type} batches as job array {job_id}")
+
+        show_message("All jobs submitted successfully", "success")
+        self.logger.info("All jobs submitted successfully")
+
+    def process_pilot(self, batches: List[WorkflowBatchDetail]) -> None:
+        """Submit pilot workers that claim the executions of the batches from the workflow DB.
+
+        Unfinished executions of the batches are put back into the queue of claimable
+        executions, unless a worker currently holds their lease.
+
+        Args:
+            batches: Batches whose executions the workers run
+        """
+        session = self.container.get('sqlite_connector').get_session()
+        for batch in batches:
+            for execution in batch.executions:
+                if execution.status in ('failed', 'timeout', 'running') and not self.has_active_lease(execution):
+                    execution.status = 'created'
+        session.commit()
+
+        calculation_types = list(dict.fromkeys(batch.calculation_type for batch in batches))
+        for calculation_type in calculation_types:
+            type_batches = [batch for batch in batches if batch.calculation_type == calculation_type]
+            workflow_detail = type_batches[0].workflow
+            worker_count = min(self.config['pilot']['workers'], len(type_batches))
+            for worker_index in range(worker_count):
+                script_path = self.container.get('job_script_generator').generate_worker_script(
+                    workflow_detail, calculation_type, worker_index)
+                job_id = self.container.get('job_submitter').submit_script(calculation_type, script_path)
+                self.logger.info(f"Submitted {calculation_type} pilot worker {worker_index} as job {job_id}")
+
+        show_message("All pilot workers submitted successfully", "success")
+        self.logger.info("All pilot workers submitted successfully")
+
+    def has_active_lease(self, execution) -> bool:
+        """Check whether a pilot worker currently holds the lease of an execution."""
+        lease = self.container.get('sqlite_connector').get_session().get(WorkflowExecutionLease, execution.execution_id)
+        return lease is not None and lease.expires_time >= datetime.now()
+
+    def get_scheduler_type(self, calculation_type: str) -> str:
+        """Get the scheduler type configured for a calculation type."""
+        return self.config['workflow_steps'][calculation_type]['scheduler']['type']
+
+    def get_array_task_job_id(self, calculation_type: str, job_id: str, task_id: int) -> str:
+        """Get the scheduler job id of a task of a job array.
+
+        SLURM reports array tasks as ``<job_id>_<task_id>``, PBS as ``<sequence>[<task_id>].<server>``.
+        """
+        if self.get_scheduler_type(calculation_type) == 'pbs':
+            return job_id.replace('[]', f'[{task_id}]', 1)
+        return f"{job_id}_{task_id}"
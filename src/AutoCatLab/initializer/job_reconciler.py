@@ -0,0 +1,85 @@
+"""Job reconciler for AutoCatLab."""
+from datetime import datetime
+from typing import Dict, List
+
+from AutoCatLab.container_base import Container
+from AutoCatLab.db.models import WorkflowDetail, WorkflowBatchDetail
+from AutoCatLab.util.scheduler import ACTIVE_STATES, get_job_states, get_local_job_states
+from AutoCatLab.util.util import get_bool_env
+
+
+class JobReconciler:
+    """Reconciles batch states in the workflow DB with the state of their scheduler jobs.
+
+    A batch whose job ended without the batch reaching a final state (node failure,
+    walltime, cancellation, a crashed executor) would otherwise stay ``running`` forever.
+    Batches of the local scheduler are checked by the liveness of their process.
+    """
+
+    def __init__(self, container: Container):
+        """Initialize job reconciler.
+
+        Args:
+            container (Container): Service container
+        """
+        self.container = container
+        self.logger = container.get('logger')
+        self.config = container.get('config')
+
+    def get_open_batches(self, workflow_detail: WorkflowDetail) -> List[WorkflowBatchDetail]:
+        """Get submitted batches that did not reach a final state."""
+        batches = self.container.get('batch_crud').get_batches(
+            self.container.get('sqlite_connector').get_session(),
+            workflow_detail.calc_unique_name)
+        return [batch for batch in batches
+                if batch.job_id and batch.status not in ('completed', 'failed', 'timeout')
+                and self.config['workflow_steps'][batch.calculation_type]['scheduler']['type'] in ('slurm', 'local')]
+
+    def reconcile(self, workflow_detail: WorkflowDetail) -> Dict[int, str]:
+        """Mark batches whose job is gone as failed or timed out.
+
+        Running executions of such batches get the same status, so resume runs them again.
+
+        Args:
+            workflow_detail (WorkflowDetail): Workflow details from database
+
+        Returns:
+            Dict[int, str]: Scheduler state of every reconciled batch by batch id
+        """
+        if get_bool_env('local_dev'):
+            return {}
+
+        batches = self.get_open_batches(workflow_detail)
+        if not batches:
+            return {}
+
+        local_ids = [batch.job_id for batch in batches if str(batch.job_id).startswith('local-')]
+        job_ids = [batch.job_id for batch in batches if not str(batch.job_id).startswith('local-')]
+        states = get_local_job_states(local_ids)
+        if job_ids:
+            states.update(get_job_states(job_ids))
+        reconciled = {}
+        now = datetime.now()
+        for batch in batches:
+            state = states.get(str(batch.job_id), 'LOST')
+            if state in ACTIVE_STATES:
+                continue
+
+            status = 'timeout' if state in ('TIMEOUT', 'DEADLINE') else 'failed'
+            error = f"Job {batch.job_id} ended with state {state}"
+            batch.status = status
+            batch.success = False
+            batch.error = error
+            batch.end_time = now
+            for execution in batch.executions:
+                if execution.status == 'running':
+                    execution.status = status
+                    execution.success = False
+                    execution.error = error
+                    execution.end_time = now
+            reconciled[batch.batch_id] = state
+            self.logger.warning(f"Batch {batch.batch_id}: {error}, marked as {status}")
+
+        self.container.get('sqlite_connector').get_session().commit()
+        self.logger.info(f"Reconciled {len(reconciled)} of {len(batches)} open batches with the scheduler")
+        return reconciled
@@ -1,8 +1,9 @@
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from AutoCatLab.container_base import Container
-from AutoCatLab.db.models import WorkflowDetail, WorkflowBatchDetail
+from AutoCatLab.db.models import WorkflowDetail, WorkflowBatchDetail, WorkflowJobArray
+from AutoCatLab.util.util import get_step_config, parse_walltime
 
 
 class JobScriptGenerator:
@@ -15,11 +16,23 @@ class JobScriptGenerator:
             logger: Optional logger instance
         """
         self.config = config
+        self.container = container
         self.logger = container.get('logger')
     
-    def generate_script(self, workflow_detail: WorkflowDetail, workflow_batch_detail: WorkflowBatchDetail) -> str:
-       
-        step_config = self.config['workflow_steps'][workflow_batch_detail.calculation_type]
+    def generate_script(self, workflow_detail: WorkflowDetail, workflow_batch_detail: WorkflowBatchDetail,
+                        dependency: Optional[List[str]] = None) -> str:
+        """Generate the job script of a batch.
+
+        Args:
+            workflow_detail: Workflow details from database
+            workflow_batch_detail: Batch details from database
+            dependency: Job ids that have to end before the batch may start
+
+        Returns:
+            str: Path of the generated script
+        """
+
+        step_config = get_step_config(self.config, workflow_batch_detail.calculation_type, workflow_batch_detail.partition)
         scheduler_config = step_config['scheduler']
         scheduler_type = scheduler_config['type']
         prepend_commands = scheduler_config.get('prepend_commands', [])
@@ -27,15 +40,32 @@ class JobScriptGenerator:
         script_dir = Path(workflow_batch_detail.script_path).parent
         script_dir.mkdir(parents=True, exist_ok=True)
 
+        # Predictions are fitted to timings of the batch's partition, but min_time and max_time
+        # are the limits of the default partition, so CPU batches use the configured time
+        walltime = None
+        if workflow_batch_detail.partition != 'cpu':
+            walltime = self.container.get('walltime_predictor').get_batch_walltime(workflow_detail, workflow_batch_detail)
+        if walltime:
+            self.logger.info(f"Requesting predicted walltime {walltime} for batch {workflow_batch_detail.batch_id}")
+
         script_lines = ["#!/bin/bash"]
         
         # Add scheduler-specific header
         if scheduler_type == 'slurm':
-            script_lines.extend(self._generate_slurm_header(batch_script_file_name_prefix, step_config, workflow_detail.calc_unique_name, script_dir))
+            script_lines.extend(self._generate_slurm_header(batch_script_file_name_prefix, step_config, workflow_detail.calc_unique_name, script_dir, walltime))
         elif scheduler_type == 'pbs':
-            script_lines.extend(self._generate_pbs_header(batch_script_file_name_prefix, step_config, workflow_detail.calc_unique_name, script_dir))
+            script_lines.extend(self._generate_pbs_header(batch_script_file_name_prefix, step_config, workflow_detail.calc_unique_name, script_dir, walltime))
+        elif scheduler_type == 'local':
+            # Run directly by the local scheduler, no header needed
+            pass
         else:
             raise ValueError(f"Unsupported scheduler type: {scheduler_type}")
+
+        if dependency and scheduler_type != 'local':
+            if scheduler_type == 'slurm':
+                script_lines.append(f"#SBATCH --dependency=afterany:{':'.join(dependency)}")
+            else:
+                script_lines.append(f"#PBS -W depend=afterany:{':'.join(dependency)}")
         
         # Add prepend commands
         script_lines.extend(prepend_commands)
@@ -52,13 +82,163 @@ class JobScriptGenerator:
             f.write(script_content)
         return script_path
     
-    def _generate_slurm_header(self, batch_script_file_name_prefix:str, step_config: Dict, workflow_id: str, script_dir: str) -> List[str]:
+    def generate_array_script(self, workflow_detail: WorkflowDetail, job_array: WorkflowJobArray,
+                              batches: List[WorkflowBatchDetail]) -> str:
+        """Generate a single job array script running one batch per array task.
+
+        Each task looks up its batch id from the job array record in the workflow DB.
+        At most ``submission.array_throttle`` tasks run at the same time (0 for no limit).
+
+        Args:
+            workflow_detail: Workflow details from database
+            job_array: Job array details from database
+            batches: Batches of the array, in task order
+
+        Returns:
+            str: Path of the generated script
+        """
+        partition = batches[0].partition
+        step_config = get_step_config(self.config, job_array.calculation_type, partition)
+        scheduler_config = step_config['scheduler']
+        scheduler_type = scheduler_config['type']
+        prepend_commands = scheduler_config.get('prepend_commands', [])
+        array_script_file_name_prefix = Path(job_array.script_path).stem
+        script_dir = Path(job_array.script_path).parent
+        script_dir.mkdir(parents=True, exist_ok=True)
+
+        # All tasks share one time limit, so request the longest predicted batch walltime
+        predictor = self.container.get('walltime_predictor')
+        walltimes = [predictor.get_batch_walltime(workflow_detail, batch) for batch in batches]
+        walltime = max(walltimes, key=parse_walltime) if all(walltimes) and partition != 'cpu' else None
+
+        throttle = self.config['submission']['array_throttle']
+        last_task_id = len(batches) - 1
+
+        script_lines = ["#!/bin/bash"]
+        if scheduler_type == 'slurm':
+            script_lines.extend(self._generate_slurm_header(array_script_file_name_prefix, step_config, workflow_detail.calc_unique_name, script_dir, walltime, log_suffix='_%a'))
+            script_lines.append(f"#SBATCH --array=0-{last_task_id}" + (f"%{throttle}" if throttle else ""))
+            task_id = "$SLURM_ARRAY_TASK_ID"
+        elif scheduler_type == 'pbs':
+            script_lines.extend(self._generate_pbs_header(array_script_file_name_prefix, step_config, workflow_detail.calc_unique_name, script_dir, walltime))
+            script_lines.append(f"#PBS -J 0-{last_task_id}")
+            if throttle:
+                script_lines.append(f"#PBS -W max_run_subjobs={throttle}")
+            task_id = "$PBS_ARRAY_INDEX"
+        else:
+            raise ValueError(f"Job arrays are not supported for scheduler type: {scheduler_type}")
+
+        script_lines.extend(prepend_commands)
+        script_lines.append("")
+        script_lines.append(f"autocatlab execute-batch --array-id {job_array.array_id} --array-task-id {task_id} --workflow-name {workflow_detail.calc_unique_name} --config-path {workflow_detail.config_path}")
+
+        with open(job_array.script_path, 'w') as f:
+            f.write("\n".join(script_lines))
+        return job_array.script_path
+
+    def generate_worker_script(self, workflow_detail: WorkflowDetail, calculation_type: str, worker_index: int) -> str:
+        """Generate the job script of a pilot worker.
+
+        Workers do not own a batch, they claim executions of the calculation type from the
+        workflow DB until their allocation runs out of time.
+
+        Args:
+            workflow_detail: Workflow details from database
+            calculation_type: Calculation type the worker takes executions from
+            worker_index: Index of the worker, used in the script and job name
+
+        Returns:
+            str: Path of the generated script
+        """
+        step_config = self.config['workflow_steps'][calculation_type]
+        scheduler_config = step_config['scheduler']
+        scheduler_type = scheduler_config['type']
+        prepend_commands = scheduler_config.get('prepend_commands', [])
+        worker_script_file_name_prefix = f'worker_{calculation_type}_{worker_index}'
+        script_dir = Path(self.config['workflow_output_directory']) / workflow_detail.calc_unique_name / 'scripts'
+        script_dir.mkdir(parents=True, exist_ok=True)
+        script_path = script_dir / f'{worker_script_file_name_prefix}.sh'
+
+        script_lines = ["#!/bin/bash"]
+        if scheduler_type == 'slurm':
+            script_lines.extend(self._generate_slurm_header(worker_script_file_name_prefix, step_config, workflow_detail.calc_unique_name, script_dir))
+        elif scheduler_type == 'pbs':
+            script_lines.extend(self._generate_pbs_header(worker_script_file_name_prefix, step_config, workflow_detail.calc_unique_name, script_dir))
+
+        script_lines.extend(prepend_commands)
+        script_lines.append("")
+        script_lines.append(f"autocatlab worker --calculation-type {calculation_type} --workflow-name {workflow_detail.calc_unique_name} --config-path {workflow_detail.config_path}")
+
+        with open(script_path, 'w') as f:
+            f.write("\n".join(script_lines))
+        return str(script_path)
+
+    def get_cpu_step_config(self) -> Dict:
+        """Get the step config of jobs that run on a CPU node outside the batches.
+
+        The CPU partition of the DFT step (``cpu_submission_detail``) is used if configured,
+        otherwise the ICOHP step, which runs on CPU nodes.
+
+        Returns:
+            Dict: Step configuration
+
+        Raises:
+            ValueError: If neither step has CPU submission details
+        """
+        steps = self.config['workflow_steps']
+        if 'cpu_submission_detail' in steps.get('dft', {}):
+            return get_step_config(self.config, 'dft', 'cpu')
+        if 'icohp' in steps:
+            return steps['icohp']
+        raise ValueError("No CPU submission details configured, add a cpu_submission_detail to the DFT step")
+
+    def generate_bader_script(self, workflow_detail: WorkflowDetail, force: bool = False) -> str:
+        """Generate the job script running the Bader analysis of a workflow on a CPU node.
+
+        The job requests ``bader.time`` and runs ``autocatlab bader`` with ``bader.workers``.
+
+        Args:
+            workflow_detail: Workflow details from database
+            force: Also analyze materials that already have Bader charges
+
+        Returns:
+            str: Path of the generated script
+        """
+        step_config = self.get_cpu_step_config()
+        scheduler_config = step_config['scheduler']
+        scheduler_type = scheduler_config['type']
+        prepend_commands = scheduler_config.get('prepend_commands', [])
+        bader_config = self.config['bader']
+        bader_script_file_name_prefix = 'bader'
+        script_dir = Path(self.config['workflow_output_directory']) / workflow_detail.calc_unique_name / 'scripts'
+        script_dir.mkdir(parents=True, exist_ok=True)
+        script_path = script_dir / f'{bader_script_file_name_prefix}.sh'
+
+        script_lines = ["#!/bin/bash"]
+        if scheduler_type == 'slurm':
+            script_lines.extend(self._generate_slurm_header(bader_script_file_name_prefix, step_config, workflow_detail.calc_unique_name, script_dir, bader_config.get('time')))
+        elif scheduler_type == 'pbs':
+            script_lines.extend(self._generate_pbs_header(bader_script_file_name_prefix, step_config, workflow_detail.calc_unique_name, script_dir, bader_config.get('time')))
+
+        script_lines.extend(prepend_commands)
+        script_lines.append("")
+        script_lines.append(f"autocatlab bader --config {workflow_detail.config_path} --workers {bader_config['workers']}"
+                            + (" --force" if force else ""))
+
+        with open(script_path, 'w') as f:
+            f.write("\n".join(script_lines))
+        return str(script_path)
+
+    def _generate_slurm_header(self, batch_script_file_name_prefix:str, step_config: Dict, workflow_id: str, script_dir: str, walltime: Optional[str] = None, log_suffix: str = "") -> List[str]:
         
-        """Generate SLURM-specific header for the job script."""
+        """Generate SLURM-specific header for the job script.
+
+        The configured time is replaced by ``walltime`` when one is given.
+        """
         header = [
             f"#SBATCH --job-name=workflow_{workflow_id}_{batch_script_file_name_prefix}",
-            f"#SBATCH -e {script_dir}/{batch_script_file_name_prefix}_error.log",
-            f"#SBATCH -o {script_dir}/{batch_script_file_name_prefix}_output.log"
+            f"#SBATCH -e {script_dir}/{batch_script_file_name_prefix}{log_suffix}_error.log",
+            f"#SBATCH -o {script_dir}/{batch_script_file_name_prefix}{log_suffix}_output.log"
         ]
         
         submission_detail = step_config.get('submission_detail', {})
@@ -66,7 +246,7 @@ class JobScriptGenerator:
         if submission_detail and 'gpu_queue' in submission_detail and submission_detail['gpu_queue'] is not None:
             header.extend([
                 f"#SBATCH -q {submission_detail['gpu_queue']}",
-                f"#SBATCH -t {submission_detail['time']}",
+                f"#SBATCH -t {walltime or submission_detail['time']}",
                 f"#SBATCH -N {submission_detail['node']}",
                 f"#SBATCH -G {submission_detail['gpu']}",
                 "#SBATCH -C gpu",
@@ -84,18 +264,28 @@ class JobScriptGenerator:
         elif submission_detail and 'cpu_queue' in submission_detail and submission_detail['cpu_queue'] is not None:
             header.extend([
                 f"#SBATCH -q {submission_detail['cpu_queue']}",
-                f"#SBATCH -t {submission_detail['cpu_time']}",
+                f"#SBATCH -t {walltime or submission_detail['cpu_time']}",
                 f"#SBATCH -N {submission_detail['cpu_node']}",
                 "#SBATCH -C cpu",
                 "#SBATCH --exclusive"
             ])
+
+            # Add nTask and cpusPertask if present and not None
+            if submission_detail.get('nTask') is not None and submission_detail.get('cpusPertask') is not None:
+                header.extend([
+                    f"#SBATCH --ntasks={submission_detail['nTask']}",
+                    f"#SBATCH --cpus-per-task={submission_detail['cpusPertask']}"
+                ])
         else:
             self.logger.warning(f"No valid submission details found in step config: {step_config}")
         
         return header
     
-    def _generate_pbs_header(self,batch_script_file_name_prefix, step_config: Dict, workflow_id: str) -> List[str]:
-        """Generate PBS-specific header for the job script."""
+    def _generate_pbs_header(self,batch_script_file_name_prefix, step_config: Dict, workflow_id: str, script_dir: str, walltime: Optional[str] = None) -> List[str]:
+        """Generate PBS-specific header for the job script.
+
+        The configured time is replaced by ``walltime`` when one is given.
+        """
         header = [
             f"#PBS -N workflow_{workflow_id}_{batch_script_file_name_prefix}",
             "#PBS -l walltime=24:00:00",
@@ -110,7 +300,7 @@ class JobScriptGenerator:
         if submission_detail and 'gpu_queue' in submission_detail:
             header.extend([
                 f"#PBS -q {submission_detail['gpu_queue']}",
-                f"#PBS -l walltime={submission_detail['time']}",
+                f"#PBS -l walltime={walltime or submission_detail['time']}",
                 f"#PBS -l nodes={submission_detail['node']}:gpus={submission_detail['gpu']}",
                 "#PBS -l feature=gpu",
                 "#PBS -l place=excl"
@@ -126,11 +316,17 @@ class JobScriptGenerator:
         elif submission_detail and 'cpu_queue' in submission_detail:
             header.extend([
                 f"#PBS -q {submission_detail['cpu_queue']}",
-                f"#PBS -l walltime={submission_detail['cpu_time']}",
+                f"#PBS -l walltime={walltime or submission_detail['cpu_time']}",
                 f"#PBS -l nodes={submission_detail['cpu_node']}",
                 "#PBS -l feature=cpu",
                 "#PBS -l place=excl"
             ])
+
+            # Add nTask and cpusPertask if present and not None
+            if submission_detail.get('nTask') is not None and submission_detail.get('cpusPertask') is not None:
+                header.extend([
+                    f"#PBS -l nodes={submission_detail['cpu_node']}:ppn={submission_detail['nTask'] * submission_detail['cpusPertask']}"
+                ])
         else:
             self.logger.warning(f"No valid submission details found in step config: {step_config}")
         
@@ -0,0 +1,172 @@
+"""Asynchronous job submitter for AutoCatLab."""
+import asyncio
+from pathlib import Path
+from typing import List, Optional
+
+from AutoCatLab.container_base import Container
+from AutoCatLab.db.models import WorkflowBatchDetail
+from AutoCatLab.util.scheduler import get_job_name_prefix, get_queued_jobs
+
+
+class JobSubmitter:
+    """Submits job scripts to the scheduler concurrently.
+
+    At most ``max_concurrent_submissions`` submission commands run at once and at most
+    ``submissions_per_second`` are started per second. Submissions failing with one of the
+    ``transient_errors`` (e.g. a busy controller) are retried with exponential backoff.
+    The job id of every batch is committed as soon as its submission succeeds, so an
+    interrupted or partially failed submission never loses track of submitted jobs. A
+    submission killed after ``submit_timeout`` may still have queued its job, so before
+    retrying it the job is looked up by name in ``squeue`` and adopted if found. ``qsub``
+    timeouts are not retried.
+    """
+
+    def __init__(self, container: Container):
+        """Initialize job submitter.
+
+        Args:
+            container (Container): Service container
+        """
+        self.container = container
+        self.logger = container.get('logger')
+        self.config = container.get('config')
+        self._next_start = 0.0
+
+    def get_submit_command(self, calculation_type: str) -> str:
+        """Get the submission command of the scheduler configured for a calculation type."""
+        scheduler_type = self.config['workflow_steps'][calculation_type]['scheduler']['type']
+        return 'qsub' if scheduler_type == 'pbs' else 'sbatch'
+
+    def submit_script(self, calculation_type: str, script_path: str) -> str:
+        """Submit a single job script, retrying transient errors.
+
+        Args:
+            calculation_type (str): Calculation type of the script
+            script_path (str): Path of the job script
+
+        Returns:
+            str: Scheduler job id
+        """
+        return asyncio.run(self.submit(self.get_submit_command(calculation_type), str(script_path)))
+
+    def submit_batches(self, batches: List[WorkflowBatchDetail]) -> List[WorkflowBatchDetail]:
+        """Submit the job scripts of batches concurrently.
+
+        Args:
+            batches (List[WorkflowBatchDetail]): Batches to submit
+
+        Returns:
+            List[WorkflowBatchDetail]: Batches whose submission failed
+        """
+        results = asyncio.run(self._submit_batches(batches))
+        return [batch for batch, submitted in zip(batches, results) if not submitted]
+
+    async def _submit_batches(self, batches: List[WorkflowBatchDetail]) -> List[bool]:
+        """Submit batches with bounded concurrency."""
+        semaphore = asyncio.Semaphore(max(1, self.config['submission']['max_concurrent_submissions']))
+        self._next_start = 0.0
+        return await asyncio.gather(*[self._submit_batch(batch, semaphore) for batch in batches])
+
+    async def _submit_batch(self, batch: WorkflowBatchDetail, semaphore: asyncio.Semaphore) -> bool:
+        """Submit one batch and persist its job id."""
+        async with semaphore:
+            try:
+                job_id = await self.submit(self.get_submit_command(batch.calculation_type), str(batch.script_path))
+            except Exception as e:
+                self.logger.error(f"Failed to submit batch {batch.batch_id}: {str(e)}")
+                return False
+
+        # Submissions run in a single thread, so the shared session is only used between awaits
+        session = self.container.get('sqlite_connector').get_session()
+        self.container.get('batch_crud').update_batch(session, batch.batch_id, {'job_id': job_id})
+        session.commit()
+        self.logger.info(f"Submitted batch {batch.batch_id} as job {job_id}")
+        return True
+
+    async def _wait_for_start(self) -> None:
+        """Wait until the rate limit allows starting another submission."""
+        rate = self.config['submission']['submissions_per_second']
+        if not rate:
+            return
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next_start)
+        self._next_start = start + 1.0 / rate
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def is_transient(self, error: str) -> bool:
+        """Check whether a scheduler error is worth retrying."""
+        error = error.lower()
+        return any(pattern.lower() in error for pattern in self.config['submission']['transient_errors'])
+
+    async def find_queued_job(self, script_path: str) -> Optional[str]:
+        """Look up the job id of a job script in the queue by its job name.
+
+        Args:
+            script_path (str): Path of the job script
+
+        Returns:
+            Optional[str]: Job id, None if no job of the script is queued
+
+        Raises:
+            Exception: If squeue fails
+        """
+        name = get_job_name_prefix(self.config['workflow_unique_name']) + Path(script_path).stem
+        jobs = await asyncio.get_running_loop().run_in_executor(None, get_queued_jobs, name)
+        return next((job['job_id'] for job in jobs if job['name'] == name), None)
+
+    async def submit(self, command: str, script_path: str) -> str:
+        """Run a submission command, retrying transient errors with exponential backoff.
+
+        Args:
+            command (str): Submission command, sbatch or qsub
+            script_path (str): Path of the job script
+
+        Returns:
+            str: Scheduler job id
+
+        Raises:
+            Exception: If the submission fails with a permanent error or runs out of retries
+        """
+        params = self.config['submission']
+        for attempt in range(params['max_retries'] + 1):
+            await self._wait_for_start()
+            returncode, stdout, stderr = await self._run(command, script_path, params['submit_timeout'])
+            if returncode == 0:
+                return stdout.strip().split()[-1]
+
+            # A killed sbatch may have queued the job, which is checked before retrying
+            timed_out = returncode is None
+            if (attempt == params['max_retries'] or not self.is_transient(stderr)
+                    or (timed_out and command != 'sbatch')):
+                raise Exception(f"Job submission failed: {stderr.strip()}")
+
+            delay = min(params['retry_backoff_seconds'] * 2 ** attempt, params['max_backoff_seconds'])
+            self.logger.warning(f"Transient error submitting {script_path}, retrying in {delay:.0f}s: "
+                                f"{stderr.strip()}")
+            await asyncio.sleep(delay)
+
+            if timed_out:
+                try:
+                    job_id = await self.find_queued_job(script_path)
+                except Exception as e:
+                    raise Exception(f"Job submission failed: {stderr.strip()}, "
+                                    f"and the queue could not be checked for the job: {str(e)}")
+                if job_id:
+                    self.logger.warning(f"Submission of {script_path} timed out but queued job {job_id}")
+                    return job_id
+
+    @staticmethod
+    async def _run(command: str, script_path: str, timeout: Optional[float]):
+        """Run a submission command and return its exit code, stdout and stderr."""
+        process = await asyncio.create_subprocess_exec(
+            command, script_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return None, '', f"{command} timed out after {timeout} seconds"
+        return process.returncode, stdout.decode(), stderr.decode()
@@ -0,0 +1,114 @@
+"""Local scheduler for AutoCatLab."""
+import os
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from AutoCatLab.container_base import Container
+from AutoCatLab.db.models import WorkflowBatchDetail
+
+
+class LocalScheduler:
+    """Runs batch scripts as local processes on a workstation.
+
+    Every batch reserves ``cpus_per_batch`` of the ``max_cpus`` CPUs of the machine; batches
+    start as soon as enough CPUs are free. Each started batch records the pseudo job id
+    ``local-<pid>`` and updates its status in the workflow DB like a scheduler job.
+    """
+
+    def __init__(self, container: Container):
+        """Initialize local scheduler.
+
+        Args:
+            container (Container): Service container
+        """
+        self.container = container
+        self.logger = container.get('logger')
+        self.config = container.get('config')
+
+    def get_scheduler_config(self, calculation_type: str) -> Dict:
+        """Get the scheduler config of a calculation type."""
+        return self.config['workflow_steps'][calculation_type]['scheduler']
+
+    def get_batch_cpus(self, batch: WorkflowBatchDetail) -> int:
+        """Get the number of CPUs a batch reserves."""
+        return self.get_scheduler_config(batch.calculation_type).get('cpus_per_batch', 1)
+
+    def run(self, batches: List[WorkflowBatchDetail]) -> bool:
+        """Run batches locally, as many at once as the CPUs allow, and wait for all of them.
+
+        Args:
+            batches (List[WorkflowBatchDetail]): Batches to run
+
+        Returns:
+            bool: True if every batch process exited successfully
+        """
+        session = self.container.get('sqlite_connector').get_session()
+        # Batch rows must be visible to the batch processes
+        session.commit()
+
+        scheduler_config = self.get_scheduler_config(batches[0].calculation_type)
+        max_cpus = scheduler_config.get('max_cpus') or os.cpu_count()
+        poll_seconds = scheduler_config.get('poll_seconds', 5)
+        pending = list(batches)
+        running: Dict[int, Tuple[subprocess.Popen, WorkflowBatchDetail, int]] = {}
+        free = max_cpus
+        success = True
+
+        while pending or running:
+            for batch in list(pending):
+                cpus = min(self.get_batch_cpus(batch), max_cpus)
+                if cpus > free:
+                    continue
+                pending.remove(batch)
+                free -= cpus
+                process = self.launch(batch)
+                running[process.pid] = (process, batch, cpus)
+
+            time.sleep(poll_seconds)
+            for pid, (process, batch, cpus) in list(running.items()):
+                if process.poll() is None:
+                    continue
+                del running[pid]
+                free += cpus
+                session.expire(batch)
+                if process.returncode != 0:
+                    success = False
+                    self.mark_failed(batch, f"Local job {batch.job_id} exited with code {process.returncode}")
+                self.logger.info(f"Batch {batch.batch_id} finished with status {batch.status}")
+
+        return success
+
+    def launch(self, batch: WorkflowBatchDetail) -> subprocess.Popen:
+        """Start the script of a batch and record its pseudo job id."""
+        script_path = Path(batch.script_path)
+        log_prefix = script_path.parent / script_path.stem
+        with open(f"{log_prefix}_output.log", 'w') as stdout, open(f"{log_prefix}_error.log", 'w') as stderr:
+            process = subprocess.Popen(['bash', str(script_path)], stdout=stdout, stderr=stderr,
+                                       start_new_session=True)
+
+        session = self.container.get('sqlite_connector').get_session()
+        self.container.get('batch_crud').update_batch(session, batch.batch_id, {'job_id': f"local-{process.pid}"})
+        session.commit()
+        self.logger.info(f"Started batch {batch.batch_id} as local job local-{process.pid}")
+        return process
+
+    def mark_failed(self, batch: WorkflowBatchDetail, error: str) -> None:
+        """Mark a batch whose process died before reaching a final state as failed."""
+        if batch.status in ('completed', 'failed'):
+            return
+        now = datetime.now()
+        batch.status = 'failed'
+        batch.success = False
+        batch.error = error
+        batch.end_time = now
+        for execution in batch.executions:
+            if execution.status == 'running':
+                execution.status = 'failed'
+                execution.success = False
+                execution.error = error
+                execution.end_time = now
+        self.container.get('sqlite_connector').get_session().commit()
+        self.logger.error(f"Batch {batch.batch_id}: {error}")
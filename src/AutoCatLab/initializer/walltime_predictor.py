@@ -0,0 +1,137 @@
+"""Walltime predictor for AutoCatLab."""
+import json
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from AutoCatLab.container_base import Container
+from AutoCatLab.db.models import WorkflowDetail, WorkflowBatchDetail
+from AutoCatLab.util.util import format_walltime, parse_walltime
+
+
+class WalltimePredictor:
+    """Predicts batch walltimes from the timings of earlier executions.
+
+    For every calculation and partition a power law ``wall = A * cost**b`` is fitted in
+    log space to the successful executions recorded in the workflow database, which is
+    shared by all workflows writing to the same output directory. The prediction for a material
+    is shifted by the ``quantile`` of the fit residuals, so that a batch only runs over
+    its walltime if most of its materials are slower than usual.
+    """
+
+    def __init__(self, container: Container):
+        """Initialize walltime predictor.
+
+        Args:
+            container (Container): Service container
+        """
+        self.container = container
+        self.logger = container.get('logger')
+        self.config = container.get('config')
+        self.models: Dict[Tuple[str, Optional[str]], Optional[Tuple[float, float, float]]] = {}
+
+    def fit(self, calculation_name: str, partition: Optional[str] = None) -> Optional[Tuple[float, float, float]]:
+        """Fit the walltime model of a calculation on a partition.
+
+        Args:
+            calculation_name (str): Calculation name, e.g. BULK_DFT_RELAX
+            partition (str, optional): Partition of the timings, None for the step's default
+
+        Returns:
+            Optional[Tuple[float, float, float]]: Intercept, slope and residual quantile in
+                log space, or None if there are not enough timings
+        """
+        if (calculation_name, partition) in self.models:
+            return self.models[(calculation_name, partition)]
+
+        params = self.config['walltime_prediction']
+        timings = self.container.get('timing_crud').get_timings(
+            self.container.get('sqlite_connector').get_session(), calculation_name, partition=partition)
+        timings = [timing for timing in timings if timing.estimated_cost and timing.wall_seconds > 0]
+
+        model = None
+        if len(timings) >= params['min_samples']:
+            x = np.log([timing.estimated_cost for timing in timings])
+            y = np.log([timing.wall_seconds for timing in timings])
+            slope, intercept = np.polyfit(x, y, 1) if np.ptp(x) > 0 else (0.0, y.mean())
+            residual = np.quantile(y - (intercept + slope * x), params['quantile'])
+            model = (float(intercept), float(slope), float(residual))
+            self.logger.info(f"Fitted walltime model for {calculation_name} on {len(timings)} executions"
+                             + (f" of the {partition} partition" if partition else ""))
+
+        self.models[(calculation_name, partition)] = model
+        return model
+
+    def predict_batch_seconds(self, workflow_detail: WorkflowDetail, batch: WorkflowBatchDetail) -> Optional[float]:
+        """Predict the walltime of a batch in seconds.
+
+        Args:
+            workflow_detail (WorkflowDetail): Workflow details from database
+            batch (WorkflowBatchDetail): Batch details from database
+
+        Returns:
+            Optional[float]: Predicted walltime, or None if a calculation of the batch has no model
+                or a material has no cost estimate
+        """
+        material_names = json.loads(batch.materials)
+        materials = self.container.get('material_crud').get_materials(
+            self.container.get('sqlite_connector').get_session(),
+            workflow_detail.calc_unique_name,
+            material_names)
+        costs = {material.material_name: material.estimated_cost for material in materials}
+
+        seconds = 0.0
+        for material_name in material_names:
+            if not costs.get(material_name):
+                return None
+            for calculation_step in self.config['workflow_steps'][batch.calculation_type]['calculations']:
+                if self.config['is_bulk_surface']:
+                    if "_SURFACE_" in material_name and "BULK" in calculation_step:
+                        continue
+                    if "_SURFACE_" not in material_name and "SURFACE" in calculation_step:
+                        continue
+                step_seconds = self.predict_seconds(calculation_step, costs[material_name], batch.partition)
+                if step_seconds is None:
+                    return None
+                seconds += step_seconds
+        return seconds
+
+    def predict_seconds(self, calculation_name: str, cost: float, partition: Optional[str] = None) -> Optional[float]:
+        """Predict the walltime of one calculation of a material in seconds.
+
+        Args:
+            calculation_name (str): Calculation name, e.g. BULK_DFT_RELAX
+            cost (float): Estimated cost of the material
+            partition (str, optional): Partition the calculation runs on, None for the step's default
+
+        Returns:
+            Optional[float]: Predicted walltime, or None if the calculation has no model
+        """
+        model = self.fit(calculation_name, partition)
+        if model is None or not cost:
+            return None
+        intercept, slope, residual = model
+        return float(np.exp(intercept + slope * np.log(cost) + residual))
+
+    def get_batch_walltime(self, workflow_detail: WorkflowDetail, batch: WorkflowBatchDetail) -> Optional[str]:
+        """Get the walltime to request for a batch.
+
+        Args:
+            workflow_detail (WorkflowDetail): Workflow details from database
+            batch (WorkflowBatchDetail): Batch details from database
+
+        Returns:
+            Optional[str]: Walltime as HH:MM:SS, or None to keep the configured time
+        """
+        params = self.config['walltime_prediction']
+        if not params['enabled']:
+            return None
+
+        seconds = self.predict_batch_seconds(workflow_detail, batch)
+        if seconds is None:
+            self.logger.info(f"Not enough timing data to predict walltime of batch {batch.batch_id}")
+            return None
+
+        seconds += params['overhead_minutes'] * 60
+        seconds = min(max(seconds, parse_walltime(params['min_time'])), parse_walltime(params['max_time']))
+        return format_walltime(seconds)
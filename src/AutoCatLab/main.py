@@ -37,6 +37,15 @@ def resume_dft(config: str):
     except Exception as e:
         raise click.Abort()
 
+@cli.command()
+@click.option('--config', required=True, help='Path to the configuration file')
+def extend_dft(config: str):
+    """Add new materials from the input to an existing DFT workflow."""
+    try:
+        run_workflow(config, command_step='extend-dft')
+    except Exception as e:
+        raise click.Abort()
+
 @cli.command()
 @click.option('--config', required=True, help='Path to the configuration file')
 def start_icohp(config: str):
@@ -55,6 +64,68 @@ def resume_icohp(config: str):
     except Exception as e:
         raise click.Abort()
 
+@cli.command()
+@click.option('--config', required=True, help='Path to the configuration file')
+def reconcile(config: str):
+    """Mark batches whose scheduler job ended unexpectedly as failed or timed out."""
+    try:
+        run_workflow(config, command_step='reconcile')
+    except Exception as e:
+        raise click.Abort()
+
+@cli.command()
+@click.option('--config', required=True, help='Path to the configuration file')
+@click.option('--workers', type=int, default=None, help='Number of worker processes')
+def ingest(config: str, workers: int):
+    """Save the results of computed calculations to the results database."""
+    try:
+        run_workflow(config, command_step='ingest', args={'workers': workers})
+    except Exception as e:
+        raise click.Abort()
+
+@cli.command()
+@click.option('--config', required=True, help='Path to the configuration file')
+@click.option('--workers', type=int, default=None, help='Number of worker processes')
+def rebuild_results(config: str, workers: int):
+    """Rebuild the results database from the result directories."""
+    try:
+        run_workflow(config, command_step='rebuild-results', args={'workers': workers})
+    except Exception as e:
+        raise click.Abort()
+
+@cli.command()
+@click.option('--config', required=True, help='Path to the configuration file')
+@click.option('--workers', type=int, default=None, help='Number of worker processes')
+@click.option('--force', is_flag=True, help='Also analyze materials that already have Bader charges')
+@click.option('--submit', is_flag=True, help='Submit the analysis as a job on a CPU node instead of running it here')
+def bader(config: str, workers: int, force: bool, submit: bool):
+    """Compute Bader charges of finished relaxations and store them in the results database."""
+    try:
+        run_workflow(config, command_step='bader', args={'workers': workers, 'force': force, 'submit': submit})
+    except Exception as e:
+        raise click.Abort()
+
+@cli.command()
+@click.option('--config', required=True, help='Path to the configuration file')
+@click.option('--flush', is_flag=True, help='Also create a partial batch while DFT is still running')
+def schedule_icohp(config: str, flush: bool):
+    """Schedule ICOHP for every material whose DFT DOS is done."""
+    try:
+        run_workflow(config, command_step='schedule-icohp', args={'flush': flush})
+    except Exception as e:
+        raise click.Abort()
+
+@cli.command()
+@click.option('--config', required=True, help='Path to the configuration file')
+@click.option('--once', is_flag=True, help='Run a single submission round and exit')
+@click.option('--follow', is_flag=True, help='Keep running when all batches are submitted')
+def submit_daemon(config: str, once: bool, follow: bool):
+    """Keep the scheduler queue topped up with the batches of the workflow."""
+    try:
+        run_workflow(config, command_step='submit-daemon', args={'once': once, 'follow': follow})
+    except Exception as e:
+        raise click.Abort()
+
 @cli.command()
 @click.option('--config', required=True, help='Path to the configuration file')
 @click.argument('calculation_type', required=False)
@@ -90,28 +161,54 @@ def show_report(config: str, calculation_type: str):
 @cli.command()
 @click.option('--config', '--config-path', required=True, help='Path to the configuration file')
 @click.option('--workflow-name', required=True, help='Name of the workflow')
-@click.option('--batch-id', required=True, help='ID of the batch to execute')
-def execute_batch(config: str, workflow_name: str, batch_id: str):
+@click.option('--batch-id', help='ID of the batch to execute')
+@click.option('--array-id', type=int, help='ID of the job array the batch belongs to')
+@click.option('--array-task-id', type=int, help='Scheduler array task index mapping to the batch')
+def execute_batch(config: str, workflow_name: str, batch_id: str, array_id: int, array_task_id: int):
     """Execute a specific batch of calculations.
     
     Args:
         config (str): Path to the configuration file
         workflow_name (str): Name of the workflow
         batch_id (str): ID of the batch to execute
+        array_id (int): ID of the job array, used with array_task_id instead of batch_id
+        array_task_id (int): Array task index of the batch
     """
+    if batch_id is None and (array_id is None or array_task_id is None):
+        raise click.UsageError("Either --batch-id or both --array-id and --array-task-id are required")
     try:
-        run_executor(config, workflow_name, batch_id)
+        run_executor(config, workflow_name, batch_id, array_id, array_task_id)
     except Exception as e:
         raise click.Abort()
 
 
-def run_executor(config_path: str, workflow_name: str, batch_id: str):
+@cli.command()
+@click.option('--config', '--config-path', required=True, help='Path to the configuration file')
+@click.option('--workflow-name', required=True, help='Name of the workflow')
+@click.option('--calculation-type', default='dft', help='Calculation type to take executions from (dft/icohp)')
+@click.option('--walltime', help='Walltime of the allocation as [D-]HH:MM:SS, queried from SLURM if not given')
+def worker(config: str, workflow_name: str, calculation_type: str, walltime: str):
+    """Run pending executions of a workflow until the allocation runs out of time."""
+    try:
+        container = create_container(config)
+        success = container.get('batch_executor_manager').run_worker(
+            container.get('config'), workflow_name, calculation_type, walltime)
+        if not success:
+            raise Exception("Worker execution failed")
+    except Exception as e:
+        raise click.Abort()
+
+
+def run_executor(config_path: str, workflow_name: str, batch_id: str, array_id: int = None,
+                 array_task_id: int = None):
     """Run a specific batch execution.
     
     Args:
         config_path (str): Path to the configuration file
         workflow_name (str): Name of the workflow
         batch_id (str): ID of the batch to execute
+        array_id (int, optional): ID of the job array to look the batch up in
+        array_task_id (int, optional): Array task index of the batch
     """
     try:
         # Create container with dependencies
@@ -121,7 +218,10 @@ def run_executor(config_path: str, workflow_name: str, batch_id: str):
         executor_manager = container.get('batch_executor_manager')
         config = container.get('config')
         
-        success = executor_manager.execute_batch(config, workflow_name, batch_id)
+        if batch_id is None:
+            success = executor_manager.execute_array_task(config, workflow_name, array_id, array_task_id)
+        else:
+            success = executor_manager.execute_batch(config, workflow_name, batch_id)
         if not success:
             raise Exception("Batch execution failed")
             
@@ -0,0 +1,119 @@
+"""Cost model estimating the relative DFT cost of a material."""
+import heapq
+import math
+from typing import Any, Dict, List
+
+import numpy as np
+from ase.data import atomic_numbers
+
+from AutoCatLab.executor.util.util import get_kpoints, get_orbital_map_key, orbital_map
+
+# Subshells in Madelung (aufbau) filling order
+AUFBAU_ORDER = ['1s', '2s', '2p', '3s', '3p', '4s', '3d', '4p', '5s', '4d', '5p', '6s',
+                '4f', '5d', '6p', '7s', '5f', '6d', '7p']
+SUBSHELL_CAPACITY = {'s': 2, 'p': 6, 'd': 10, 'f': 14}
+SUBSHELL_ORBITALS = {'s': 1, 'p': 3, 'd': 5, 'f': 7}
+NOBLE_GAS_CORES = [0, 2, 10, 18, 36, 54, 86]
+
+# Volume per atom used when a structure has no 3D cell
+DEFAULT_VOLUME_PER_ATOM = 15.0
+
+
+def get_subshell_occupations(symbol: str) -> Dict[str, int]:
+    """Return the aufbau occupation of each subshell of a neutral atom."""
+    electrons = atomic_numbers[symbol]
+    occupations = {}
+    for subshell in AUFBAU_ORDER:
+        if electrons <= 0:
+            break
+        occupations[subshell] = min(electrons, SUBSHELL_CAPACITY[subshell[-1]])
+        electrons -= occupations[subshell]
+    return occupations
+
+
+def get_valence_orbitals(symbol: str) -> List[str]:
+    """Return the valence subshells treated explicitly for an element.
+
+    Taken from the valence orbital mapping of the recommended setups when available,
+    otherwise the subshells filled after the preceding noble gas core, without a
+    completely filled d or f shell below an occupied p shell.
+    """
+    key = get_orbital_map_key(symbol)
+    if key in orbital_map:
+        return orbital_map[key].split()
+
+    z = atomic_numbers[symbol]
+    core = max(n for n in NOBLE_GAS_CORES if n < z)
+    occupations = get_subshell_occupations(symbol)
+    orbitals, filled = [], 0
+    for subshell, occupation in occupations.items():
+        filled += occupation
+        if filled > core:
+            orbitals.append(subshell)
+    if any(subshell.endswith('p') for subshell in orbitals):
+        orbitals = [subshell for subshell in orbitals
+                    if subshell[-1] not in 'df' or occupations[subshell] < SUBSHELL_CAPACITY[subshell[-1]]]
+    return orbitals
+
+
+def get_valence_electrons(symbol: str) -> int:
+    """Estimate the number of valence electrons (ZVAL) of an element."""
+    occupations = get_subshell_occupations(symbol)
+    return sum(occupations.get(subshell, 0) for subshell in get_valence_orbitals(symbol))
+
+
+def get_system_size(atoms, is_bulk: bool = True, effective_length: float = 30) -> Dict[str, Any]:
+    """Estimate the system size features and relative cost of a DFT calculation.
+
+    The cost follows the dominant plane-wave DFT scaling,
+    ``n_kpoints * n_bands**2 * volume``, where the volume stands in for the number
+    of plane waves. Only ratios between costs are meaningful.
+
+    Args:
+        atoms: ASE Atoms object
+        is_bulk: Whether the structure is a bulk (otherwise a single k-point along z)
+        effective_length: k-point density used by the relaxation step
+
+    Returns:
+        Dict[str, Any]: n_atoms, n_kpoints, n_electrons, n_bands and cost
+    """
+    symbols = atoms.get_chemical_symbols()
+    counts = {symbol: symbols.count(symbol) for symbol in set(symbols)}
+    n_atoms = len(atoms)
+    n_electrons = sum(get_valence_electrons(symbol) * n for symbol, n in counts.items())
+    n_orbitals = sum(sum(SUBSHELL_ORBITALS[subshell[-1]] for subshell in get_valence_orbitals(symbol)) * n
+                     for symbol, n in counts.items())
+    n_bands = max(n_orbitals, math.ceil(n_electrons / 2 + n_atoms / 2))
+    n_kpoints = int(np.prod(get_kpoints(atoms, effective_length=effective_length, bulk=is_bulk)))
+    volume = atoms.get_volume() if atoms.cell.rank == 3 else DEFAULT_VOLUME_PER_ATOM * n_atoms
+
+    return {
+        'n_atoms': n_atoms,
+        'n_kpoints': n_kpoints,
+        'n_electrons': n_electrons,
+        'n_bands': n_bands,
+        'cost': float(n_kpoints * n_bands ** 2 * volume)
+    }
+
+
+def pack_by_cost(costs: List[float], batch_count: int) -> List[List[int]]:
+    """Pack items into batches with balanced total cost.
+
+    Uses the longest-processing-time-first heuristic: items are assigned in order of
+    decreasing cost to the batch with the lowest total so far.
+
+    Args:
+        costs: Cost of every item
+        batch_count: Number of batches
+
+    Returns:
+        List[List[int]]: Item indices of each non-empty batch, in input order
+    """
+    batch_count = max(1, min(batch_count, len(costs)))
+    loads = [(0.0, i) for i in range(batch_count)]
+    batches = [[] for _ in range(batch_count)]
+    for idx in sorted(range(len(costs)), key=lambda i: costs[i], reverse=True):
+        load, batch_idx = heapq.heappop(loads)
+        batches[batch_idx].append(idx)
+        heapq.heappush(loads, (load + costs[idx], batch_idx))
+    return [sorted(batch) for batch in batches if batch]
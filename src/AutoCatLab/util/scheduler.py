@@ -0,0 +1,146 @@
+"""Helpers for querying the SLURM scheduler."""
+import getpass
+import os
+import subprocess
+from typing import Dict, List, Optional, Tuple
+
+from AutoCatLab.util.util import parse_walltime
+
+PENDING_STATES = {'PENDING', 'CONFIGURING', 'REQUEUED', 'RESIZING', 'SUSPENDED'}
+RUNNING_STATES = {'RUNNING', 'COMPLETING', 'STAGE_OUT'}
+ACTIVE_STATES = PENDING_STATES | RUNNING_STATES
+
+# Job ids per sacct/squeue call, keeps command lines short for large campaigns
+JOB_QUERY_CHUNK_SIZE = 500
+
+
+def get_job_name_prefix(workflow_unique_name: str) -> str:
+    """Return the prefix of the scheduler job names of a workflow."""
+    return f"workflow_{workflow_unique_name}_"
+
+
+def get_queued_jobs(name_prefix: str) -> List[Dict[str, str]]:
+    """List the queued jobs of the current user whose name starts with a prefix.
+
+    Args:
+        name_prefix (str): Job name prefix
+
+    Returns:
+        List[Dict[str, str]]: Job id, name and state of every matching job
+
+    Raises:
+        Exception: If squeue fails
+    """
+    result = subprocess.run(['squeue', '-h', '-u', getpass.getuser(), '-o', '%i|%j|%T'],
+                            capture_output=True,
+                            text=True)
+    if result.returncode != 0:
+        raise Exception(f"squeue failed: {result.stderr}")
+
+    jobs = []
+    for line in result.stdout.splitlines():
+        job_id, name, state = line.strip().split('|', 2)
+        if name.startswith(name_prefix):
+            jobs.append({'job_id': job_id, 'name': name, 'state': state})
+    return jobs
+
+
+def get_queue_counts(name_prefix: str) -> Tuple[int, int]:
+    """Count the pending and running jobs whose name starts with a prefix.
+
+    Args:
+        name_prefix (str): Job name prefix
+
+    Returns:
+        Tuple[int, int]: Number of pending and running jobs
+    """
+    jobs = get_queued_jobs(name_prefix)
+    pending = sum(job['state'] in PENDING_STATES for job in jobs)
+    running = sum(job['state'] in RUNNING_STATES for job in jobs)
+    return pending, running
+
+
+def get_job_time_left(job_id: str) -> Optional[int]:
+    """Get the remaining walltime of a running job in seconds.
+
+    Args:
+        job_id (str): Scheduler job id
+
+    Returns:
+        Optional[int]: Remaining seconds, or None if the job has no time limit or squeue
+            does not report it
+    """
+    result = subprocess.run(['squeue', '-h', '-j', str(job_id), '-o', '%L'],
+                            capture_output=True,
+                            text=True)
+    time_left = result.stdout.strip()
+    if result.returncode != 0 or not time_left or not time_left[0].isdigit():
+        return None
+    return parse_walltime(time_left)
+
+
+def get_job_states(job_ids: List[str]) -> Dict[str, str]:
+    """Get the scheduler state of many jobs with bulk sacct and squeue calls.
+
+    sacct reports finished jobs; squeue covers running and pending jobs when accounting is
+    unavailable or lags behind, including pending array tasks that are only listed under
+    their array job.
+
+    Args:
+        job_ids (List[str]): Job ids, array tasks as ``<job_id>_<task_id>``
+
+    Returns:
+        Dict[str, str]: Base state (e.g. COMPLETED, TIMEOUT, RUNNING) of every job found
+    """
+    job_ids = list(dict.fromkeys(str(job_id) for job_id in job_ids))
+    states = {}
+    for start in range(0, len(job_ids), JOB_QUERY_CHUNK_SIZE):
+        chunk = job_ids[start:start + JOB_QUERY_CHUNK_SIZE]
+        result = subprocess.run(['sacct', '-n', '-P', '-X', '-j', ','.join(chunk), '-o', 'JobID,State,ExitCode'],
+                                capture_output=True,
+                                text=True)
+        if result.returncode == 0:
+            for line in result.stdout.splitlines():
+                fields = line.strip().split('|')
+                if len(fields) >= 2 and fields[1]:
+                    # e.g. "CANCELLED by 1234"
+                    states[fields[0]] = fields[1].split()[0]
+
+    missing = [job_id for job_id in job_ids if job_id not in states]
+    if missing:
+        result = subprocess.run(['squeue', '-h', '-u', getpass.getuser(), '-o', '%i|%T'],
+                                capture_output=True,
+                                text=True)
+        if result.returncode != 0:
+            raise Exception(f"squeue failed: {result.stderr}")
+        queued = {}
+        for line in result.stdout.splitlines():
+            job_id, state = line.strip().split('|', 1)
+            queued[job_id] = state
+            queued.setdefault(job_id.split('_')[0], state)
+        for job_id in missing:
+            state = queued.get(job_id) or queued.get(job_id.split('_')[0])
+            if state:
+                states[job_id] = state
+    return states
+
+
+def get_local_job_states(job_ids: List[str]) -> Dict[str, str]:
+    """Get the state of jobs started by the local scheduler from their process ids.
+
+    Args:
+        job_ids (List[str]): Pseudo job ids as ``local-<pid>``
+
+    Returns:
+        Dict[str, str]: RUNNING for every job whose process is still alive
+    """
+    states = {}
+    for job_id in job_ids:
+        try:
+            os.kill(int(str(job_id).split('-', 1)[1]), 0)
+        except (ValueError, IndexError, ProcessLookupError):
+            continue
+        except PermissionError:
+            pass
+        states[str(job_id)] = 'RUNNING'
+    return states
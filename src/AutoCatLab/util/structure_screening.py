@@ -0,0 +1,118 @@
+"""Fast geometric sanity checks for input structures."""
+import itertools
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from ase.data import atomic_masses, covalent_radii
+from scipy.spatial import cKDTree
+
+# amu / Angstrom^3 to g / cm^3
+AMU_PER_A3_TO_G_PER_CM3 = 1.66053907
+
+
+def get_periodic_images(atoms, cutoff: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the positions of the atoms and of their periodic images up to a distance from the cell.
+
+    Args:
+        atoms: ASE Atoms object
+        cutoff: Distance in Angstrom the images have to cover
+
+    Returns:
+        Tuple of image positions and the atom index of every image, the images of the
+        zero shift coming first in the order of the atoms
+    """
+    positions = atoms.get_positions(wrap=atoms.pbc.any())
+    reciprocal = atoms.cell.reciprocal()
+    repeats = [int(np.ceil(cutoff * np.linalg.norm(reciprocal[k])))
+               if atoms.pbc[k] and atoms.cell[k].any() else 0 for k in range(3)]
+    shifts = np.array(sorted(itertools.product(*(range(-n, n + 1) for n in repeats)),
+                             key=lambda shift: any(shift)))
+    images = (positions[None, :, :] + (shifts @ atoms.cell.array)[:, None, :]).reshape(-1, 3)
+    return images, np.tile(np.arange(len(atoms)), len(shifts))
+
+
+def get_pair_distance_ratios(atoms, cutoff_factor: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Get neighbour pairs with their distance relative to the sum of covalent radii.
+
+    Pairs are searched with a k-d tree over the atoms and their periodic images within
+    the largest cutoff, and only pairs closer than ``cutoff_factor * (r_i + r_j)`` are
+    returned.
+
+    Args:
+        atoms: ASE Atoms object
+        cutoff_factor: Largest ratio of distance to covalent radii sum to include
+
+    Returns:
+        Tuple of first atom indices and distance ratios of every pair
+    """
+    radii = covalent_radii[atoms.numbers]
+    cutoff = cutoff_factor * 2 * radii.max()
+    images, image_atoms = get_periodic_images(atoms, cutoff)
+    pairs = cKDTree(images[:len(atoms)]).sparse_distance_matrix(cKDTree(images), cutoff, output_type='ndarray')
+
+    i, image, d = pairs['i'], pairs['j'], pairs['v']
+    j = image_atoms[image]
+    ratios = d / (radii[i] + radii[j])
+    # The first images are the atoms themselves
+    keep = (image != i) & (ratios <= cutoff_factor)
+    return i[keep], ratios[keep]
+
+
+def get_density(atoms) -> float:
+    """Return the mass density of a periodic structure in g/cm^3."""
+    return atomic_masses[atoms.numbers].sum() / atoms.get_volume() * AMU_PER_A3_TO_G_PER_CM3
+
+
+def get_vacuum_gaps(atoms) -> np.ndarray:
+    """Return the largest empty gap in Angstrom along each lattice direction.
+
+    The gap is measured between atomic planes, perpendicular to the plane spanned
+    by the two other lattice vectors, including the gap across the cell boundary.
+    """
+    scaled = np.sort(np.mod(atoms.get_scaled_positions(wrap=False), 1.0), axis=0)
+    gaps = np.diff(scaled, axis=0, append=scaled[:1] + 1.0).max(axis=0)
+    plane_spacing = 1.0 / np.linalg.norm(atoms.cell.reciprocal(), axis=1)
+    return gaps * plane_spacing
+
+
+def screen_structure(atoms, params: Dict[str, Any], is_surface: bool = False) -> List[str]:
+    """Check a structure for overlapping or isolated atoms, absurd densities and vacuum.
+
+    Args:
+        atoms: ASE Atoms object
+        params: Screening parameters (``input_screening`` section of the config)
+        is_surface: Whether the structure is a slab with vacuum along the third lattice vector
+
+    Returns:
+        List[str]: Description of every failed check, empty if the structure looks sane
+    """
+    issues = []
+    if len(atoms) == 0:
+        return ["structure has no atoms"]
+
+    i, ratios = get_pair_distance_ratios(atoms, params['isolation_distance_factor'])
+    if len(ratios) and ratios.min() < params['min_distance_factor']:
+        issues.append(f"overlapping atoms at {ratios.min():.2f} x the covalent radii sum")
+
+    isolated = np.flatnonzero(np.bincount(i, minlength=len(atoms)) == 0)
+    if len(atoms) > 1 and len(isolated):
+        issues.append(f"{len(isolated)} isolated atoms (first index {isolated[0]})")
+
+    if atoms.cell.rank < 3:
+        return issues
+
+    if atoms.pbc.all() and not is_surface:
+        density = get_density(atoms)
+        if not params['min_density'] <= density <= params['max_density']:
+            issues.append(f"density {density:.2f} g/cm^3 outside "
+                          f"[{params['min_density']}, {params['max_density']}]")
+
+    gaps = get_vacuum_gaps(atoms)
+    if is_surface:
+        if gaps[2] < params['min_surface_vacuum']:
+            issues.append(f"vacuum of {gaps[2]:.2f} A along c is below {params['min_surface_vacuum']} A")
+    elif gaps.max() > params['max_bulk_vacuum']:
+        issues.append(f"vacuum gap of {gaps.max():.2f} A along lattice vector {int(gaps.argmax())} "
+                      f"in a bulk structure")
+
+    return issues
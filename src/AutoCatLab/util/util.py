@@ -1,4 +1,5 @@
 """Utility functions for AutoCatLab."""
+import hashlib
 import json
 import logging
 import os
@@ -8,6 +9,7 @@ from typing import Dict, Any
 from typing import Optional
 from typing import Union
 
+import numpy as np
 from sympy import false
 
 
@@ -33,6 +35,56 @@ def copy_file(src: Union[str, Path], dst: Union[str, Path]) -> None:
     
     shutil.copy2(src_path, dst_path)
 
+def get_structure_hash(atoms) -> str:
+    """Return a stable hash identifying an atomic structure.
+
+    The hash covers atomic numbers, cell, wrapped fractional positions and
+    periodicity. Floats are rounded so that round-tripping a structure through
+    CIF/JSON does not change its hash.
+
+    Args:
+        atoms: ASE Atoms object
+
+    Returns:
+        str: Hex digest of the structure hash
+    """
+    digest = hashlib.sha1()
+    digest.update(np.asarray(atoms.numbers, dtype=np.int64).tobytes())
+    digest.update(np.asarray(atoms.pbc, dtype=np.int8).tobytes())
+    cell = np.asarray(atoms.cell[:], dtype=float)
+    digest.update((np.round(cell, 4) + 0.0).tobytes())
+    if atoms.cell.rank == 3:
+        positions = np.mod(np.round(atoms.get_scaled_positions(wrap=True), 4), 1.0)
+    else:
+        positions = np.round(atoms.positions, 4)
+    digest.update((positions + 0.0).tobytes())
+    return digest.hexdigest()
+
+def parse_walltime(walltime: str) -> int:
+    """Convert a scheduler walltime string to seconds.
+
+    Args:
+        walltime (str): Walltime as ``[D-]HH:MM:SS``, ``MM:SS`` or minutes
+
+    Returns:
+        int: Walltime in seconds
+    """
+    days = 0
+    if '-' in walltime:
+        days, walltime = walltime.split('-', 1)
+    parts = [int(float(part)) for part in walltime.split(':')]
+    if len(parts) == 1:
+        parts = [0, parts[0], 0]
+    while len(parts) < 3:
+        parts.insert(0, 0)
+    hours, minutes, seconds = parts
+    return ((int(days) * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def format_walltime(seconds: float) -> str:
+    """Convert seconds to a ``HH:MM:SS`` scheduler walltime string, rounded up to the minute."""
+    minutes = int(-(-seconds // 60))
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
 def create_directory(path: Union[str, Path]) -> None:
     """Create directory for given path if it doesn't exist.
     
@@ -162,6 +214,29 @@ def get_config(config_path: Path = None) -> Dict[str, Any]:
     custom_config['is_bulk_surface'] = is_bulk_surface
     return merge_configs(default_config, custom_config)
 
+def get_step_config(config: Dict[str, Any], calculation_type: str, partition: Optional[str] = None) -> Dict[str, Any]:
+    """Return the config of a workflow step for the partition a batch is routed to.
+
+    For the ``cpu`` partition ``cpu_submission_detail`` and ``scheduler.cpu_prepend_commands``
+    replace the submission details and prepend commands of the step.
+
+    Args:
+        config (Dict[str, Any]): Workflow configuration
+        calculation_type (str): Calculation type of the step
+        partition (Optional[str]): Partition of the batch, None for the step's default
+
+    Returns:
+        Dict[str, Any]: Step configuration
+    """
+    step_config = config['workflow_steps'][calculation_type]
+    if partition != 'cpu':
+        return step_config
+
+    scheduler_config = dict(step_config['scheduler'])
+    scheduler_config['prepend_commands'] = scheduler_config.get('cpu_prepend_commands',
+                                                                scheduler_config.get('prepend_commands', []))
+    return {**step_config, 'submission_detail': step_config['cpu_submission_detail'], 'scheduler': scheduler_config}
+
 def prompt_yes_no(prompt_text: str, default: bool = False) -> bool:
     """Show a yes/no prompt and return user's choice.
     
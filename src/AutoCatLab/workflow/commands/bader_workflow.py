@@ -0,0 +1,131 @@
+"""Bader command manager for workflow."""
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from AutoCatLab.db.models import WorkflowBatchDetail, WorkflowBatchExecution, WorkflowDetail, FINISHED_STATUSES
+from AutoCatLab.executor.util.bader import analyze_bader
+from AutoCatLab.executor.util.potcar_index import get_titel_index
+from AutoCatLab.util.util import show_message
+from .workflow_base import WorkflowBase
+
+# Steps whose charge densities are analyzed
+RELAX_CALCULATIONS = ('BULK_DFT_RELAX', 'SURFACE_DFT_RELAX')
+
+
+def get_zvals(data: Dict[str, Any], calculation_name: str) -> Optional[Dict[str, float]]:
+    """Look up the valence electrons of the pseudopotentials of a results row in the POTCAR index."""
+    titels = data.get(calculation_name, {}).get('pseudopotentials') or []
+    titel_index = get_titel_index()
+    if not titels or not all(titel in titel_index for titel in titels):
+        return None
+    return {titel_index[titel]['symbol']: titel_index[titel]['zval'] for titel in titels}
+
+
+def get_pending_relaxations(container: Any, workflow_detail: WorkflowDetail, force: bool = False
+                            ) -> Tuple[Dict[str, Tuple[WorkflowBatchExecution, Optional[Dict[str, float]]]], int]:
+    """Find the finished relaxations of a workflow that wait for Bader analysis.
+
+    Args:
+        container: Service container for dependency injection
+        workflow_detail: Workflow details from database
+        force: Also return relaxations that already have Bader charges
+
+    Returns:
+        Tuple[Dict[str, Tuple[WorkflowBatchExecution, Optional[Dict[str, float]]]], int]: Execution
+            and valence electrons by results row key, and the number of relaxations without a results row
+    """
+    session = container.get('sqlite_connector').get_session()
+    pending = {}
+    missing_rows = 0
+    with container.get('result_ase_db_connector') as result_connector:
+        for calculation_name in RELAX_CALCULATIONS:
+            for execution in container.get('execution_crud').get_workflow_executions(
+                    session, workflow_detail.calc_unique_name, calculation_name):
+                if execution.status not in FINISHED_STATUSES:
+                    continue
+                key = str(Path(execution.result_material_dir).parent)
+                rows = list(result_connector.db.select(key=key))
+                if not rows:
+                    missing_rows += 1
+                    continue
+                if 'bader' in rows[0].data and not force:
+                    continue
+                pending[key] = (execution, get_zvals(rows[0].data, calculation_name))
+    return pending, missing_rows
+
+
+class BaderManager(WorkflowBase):
+    """Manager for the Bader charge analysis of finished relaxations.
+
+    With ``submit`` the analysis is not run here but submitted as a job on a CPU node.
+    """
+
+    def validate(self, workflow_detail: WorkflowDetail, workflow_batches: list[WorkflowBatchDetail], args: Dict[str, Any]) -> bool:
+        if workflow_detail is None:
+            self.logger.error("No workflow found")
+            return False
+        return True
+
+    def execute(self, args: Dict[str, Any]) -> Any:
+        args = args or {}
+        with self.container.get('sqlite_connector') as connector:
+            try:
+                session = connector.get_session()
+                workflow_detail = self.container.get('workflow_crud').get_workflow(
+                    session, self.config['workflow_unique_name'])
+                if not self.validate(workflow_detail, [], args):
+                    return False
+
+                if args.get('submit'):
+                    script_path = self.container.get('job_script_generator').generate_bader_script(workflow_detail, args.get('force'))
+                    job_id = self.container.get('job_submitter').submit_script('dft', script_path)
+                    show_message(f"Submitted Bader analysis as job {job_id}", "success")
+                    return True
+
+                # Relaxations whose results row exists and has no Bader charges yet
+                pending, missing_rows = get_pending_relaxations(self.container, workflow_detail, args.get('force'))
+
+                if missing_rows:
+                    show_message(f"{missing_rows} relaxations have no results row yet, run ingest first", "warning")
+                if not pending:
+                    show_message("No relaxations waiting for Bader analysis", "success")
+                    return True
+
+                bader_config = self.config['bader']
+                workers = args.get('workers') or bader_config['workers']
+                show_message(f"Running Bader analysis of {len(pending)} materials with {workers} workers", "info")
+
+                analyzed = 0
+                failed = 0
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {
+                        pool.submit(analyze_bader, execution.result_material_dir, bader_config['chgsum_command'],
+                                    bader_config['bader_command'], zvals): key
+                        for key, (execution, zvals) in pending.items()
+                    }
+                    for future in as_completed(futures):
+                        key = futures[future]
+                        execution = pending[key][0]
+                        try:
+                            bader = future.result()
+                            with self.container.get('result_ase_db_connector') as result_connector:
+                                row_id = next(result_connector.db.select(key=key)).id
+                                result_connector.db.update(row_id, data={'bader': bader})
+                            analyzed += 1
+                        except Exception as e:
+                            self.logger.error(f"Error in Bader analysis of {execution.material_name}: {str(e)}")
+                            show_message(f"{execution.material_name}: {str(e)}", "warning")
+                            failed += 1
+
+                show_message(f"Stored Bader charges of {analyzed} materials", "success")
+                if failed:
+                    show_message(f"Bader analysis failed for {failed} materials, see bader.log in their "
+                                 f"relaxation directories", "warning")
+                return True
+
+            except Exception as e:
+                self.logger.error(f"Error running Bader analysis: {str(e)}")
+                self.logger.error("".join(traceback.format_exc()))
+                return False
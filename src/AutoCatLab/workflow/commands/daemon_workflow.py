@@ -0,0 +1,175 @@
+"""Submission daemon command manager for workflow."""
+import os
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from AutoCatLab.db.models import WorkflowDetail, WorkflowBatchDetail
+from AutoCatLab.util.scheduler import get_job_name_prefix, get_queue_counts, get_queued_jobs
+from AutoCatLab.util.util import show_message
+from .bader_workflow import get_pending_relaxations
+from .workflow_base import WorkflowBase
+
+
+class SubmitDaemonManager(WorkflowBase):
+    """Manager for keeping the scheduler queue topped up with the batches of a workflow.
+
+    Every ``daemon_poll_seconds`` the pending and running jobs of the workflow are counted
+    with ``squeue`` and unsubmitted batches are submitted until ``max_queued_jobs`` jobs are
+    pending, without exceeding ``max_running_jobs`` jobs in the queue in total (0 for no limit).
+    Submitted job ids are stored per batch and the daemon state in the workflow DB, so a
+    stopped daemon can be restarted at any time. With ``icohp_pipeline.enabled`` the daemon
+    also schedules ICOHP for materials whose DFT is done. With ``bader.auto_submit`` it submits
+    a Bader job on a CPU node once ``bader.min_pending`` relaxations wait for Bader charges, or
+    for the rest when no DFT batch is left. The daemon stops once every batch is submitted and
+    no DFT batch is left to feed ICOHP or Bader, unless ``follow`` is set.
+    """
+
+    def __init__(self, container: Any):
+        super().__init__(container)
+        # Results rows handed to a Bader job, so rows whose analysis failed are not resubmitted
+        self.bader_submitted = set()
+
+    def validate(self, workflow_detail: WorkflowDetail, batches: list[WorkflowBatchDetail], args: Dict[str, Any]) -> bool:
+        if workflow_detail is None:
+            self.logger.error("No workflow found. Please use start command to start the workflow.")
+            return False
+
+        for step in self.config['workflow_steps'].values():
+            if step['scheduler']['type'] != 'slurm':
+                self.logger.error("The submission daemon only supports SLURM schedulers.")
+                return False
+
+        daemon = self.container.get('daemon_crud').get_daemon(
+            self.container.get('sqlite_connector').get_session(),
+            workflow_detail.calc_unique_name)
+        stale_after = timedelta(seconds=3 * self.config['submission']['daemon_poll_seconds'])
+        if daemon and daemon.status == 'running' and datetime.now() - daemon.last_heartbeat < stale_after:
+            self.logger.error(f"A submission daemon is already running for this workflow "
+                              f"on {daemon.hostname} (pid {daemon.pid}).")
+            return False
+
+        return True
+
+    def get_free_slots(self, pending: int, running: int) -> int:
+        """Get the number of jobs that can be submitted given the current queue."""
+        params = self.config['submission']
+        free = params['max_queued_jobs'] - pending
+        if params['max_running_jobs']:
+            free = min(free, params['max_running_jobs'] - pending - running)
+        return max(0, free)
+
+    def has_unfinished_dft(self, workflow_detail: WorkflowDetail) -> bool:
+        """Check whether DFT batches of the workflow are unfinished."""
+        batches = self.container.get('batch_crud').get_batches(
+            self.container.get('sqlite_connector').get_session(),
+            workflow_detail.calc_unique_name)
+        return any(batch.calculation_type == 'dft' and batch.status not in ('completed', 'failed', 'timeout')
+                   for batch in batches)
+
+    def has_pipeline_work(self, workflow_detail: WorkflowDetail) -> bool:
+        """Check whether DFT batches that can still make materials ready for ICOHP are unfinished."""
+        return self.config['icohp_pipeline']['enabled'] and self.has_unfinished_dft(workflow_detail)
+
+    def submit_bader(self, workflow_detail: WorkflowDetail, name_prefix: str) -> bool:
+        """Submit a Bader job for the relaxations waiting for Bader charges.
+
+        No job is submitted while one is queued, or while fewer than ``bader.min_pending``
+        relaxations wait and DFT batches are unfinished.
+
+        Args:
+            workflow_detail: Workflow details from database
+            name_prefix: Job name prefix of the workflow
+
+        Returns:
+            bool: True if relaxations are left for a later Bader job
+        """
+        dft_running = self.has_unfinished_dft(workflow_detail)
+        if any(job['name'] == f"{name_prefix}bader" for job in get_queued_jobs(name_prefix)):
+            return True
+        pending, _ = get_pending_relaxations(self.container, workflow_detail)
+        keys = set(pending) - self.bader_submitted
+        if not keys or (len(keys) < self.config['bader']['min_pending'] and dft_running):
+            return dft_running
+
+        script_path = self.container.get('job_script_generator').generate_bader_script(workflow_detail)
+        job_id = self.container.get('job_submitter').submit_script('dft', script_path)
+        self.bader_submitted.update(pending)
+        self.logger.info(f"Submitted Bader analysis of {len(pending)} materials as job {job_id}")
+        return dft_running
+
+    def execute(self, args: Dict[str, Any]) -> Any:
+        connector = self.container.get('sqlite_connector')
+        session = connector.get_session()
+        daemon_crud = self.container.get('daemon_crud')
+        daemon = None
+        try:
+            workflow_detail = self.container.get('workflow_crud').get_workflow(
+                session,
+                self.config['workflow_unique_name'])
+            if not self.validate(workflow_detail, [], args):
+                return False
+
+            daemon = daemon_crud.start_daemon(session, {
+                'workflow_unique_name': workflow_detail.calc_unique_name,
+                'hostname': socket.gethostname(),
+                'pid': os.getpid()
+            })
+            name_prefix = get_job_name_prefix(workflow_detail.calc_unique_name)
+            auto_bader = self.config['bader']['auto_submit']
+            if auto_bader:
+                try:
+                    self.container.get('job_script_generator').get_cpu_step_config()
+                except ValueError as e:
+                    self.logger.warning(f"Bader jobs are not submitted: {str(e)}")
+                    auto_bader = False
+            self.logger.info(f"Submission daemon started for workflow {workflow_detail.calc_unique_name}")
+
+            while True:
+                # Pick up batches created or released by other commands since the last round
+                session.expire_all()
+                if self.config['icohp_pipeline']['enabled']:
+                    self.container.get('batch_processor').schedule_icohp(workflow_detail)
+                    session.commit()
+                batches = self.container.get('batch_crud').get_unsubmitted_batches(
+                    session, workflow_detail.calc_unique_name)
+                pending, running = get_queue_counts(name_prefix)
+                free = self.get_free_slots(pending, running)
+
+                submitted = 0
+                if batches and free:
+                    to_submit = batches[:free]
+                    failed = self.container.get('job_submitter').submit_batches(to_submit)
+                    submitted = len(to_submit) - len(failed)
+                    self.logger.info(f"Submitted {submitted} batches "
+                                     f"({pending} pending, {running} running, {len(batches) - submitted} left)")
+
+                bader_work = False
+                if auto_bader:
+                    bader_work = self.submit_bader(workflow_detail, name_prefix)
+
+                daemon_crud.update_heartbeat(session, daemon, pending, running, submitted)
+
+                if (len(batches) == submitted and not args.get('follow') and not bader_work
+                        and not self.has_pipeline_work(workflow_detail)):
+                    show_message("All batches submitted, stopping the submission daemon", "success")
+                    break
+                if args.get('once'):
+                    break
+                time.sleep(self.config['submission']['daemon_poll_seconds'])
+
+            return True
+
+        except KeyboardInterrupt:
+            self.logger.info("Submission daemon interrupted")
+            return True
+        except Exception as e:
+            self.logger.error(f"Error in submission daemon: {str(e)}")
+            self.logger.error("".join(traceback.format_exc()))
+            session.rollback()
+            return False
+        finally:
+            if daemon is not None:
+                daemon_crud.stop_daemon(session, daemon)
@@ -1,4 +1,5 @@
 """DFT command managers for workflow."""
+import json
 import traceback
 from typing import Any, Dict
 from AutoCatLab.db.models import WorkflowBatchDetail, WorkflowDetail
@@ -11,7 +12,8 @@ class StartDFTManager(WorkflowBase):
     def validate(self, workflow_detail: WorkflowDetail, workflow_batches: list[WorkflowBatchDetail], args: Dict[str, Any]) -> bool:
         
         if workflow_detail is not None:
-            self.logger.error("Workflow with name {} already exists. Please use resume command to resume the workflow.".format(workflow_detail.calc_unique_name))
+            self.logger.error("Workflow with name {} already exists. Please use resume command to resume the workflow "
+                              "or extend-dft to add new materials.".format(workflow_detail.calc_unique_name))
             return False
         return True
     
@@ -83,6 +85,10 @@ class ResumeDFTManager(WorkflowBase):
                     self.container.get('config')['workflow_unique_name']
                 )
 
+                if workflow_detail is not None:
+                    # Batches whose job is gone are still marked running
+                    self.container.get('job_reconciler').reconcile(workflow_detail)
+
                 batches = self.container.get('batch_crud').get_batches(
                     connector.get_session(),
                     workflow_detail.calc_unique_name)
@@ -106,4 +112,77 @@ class ResumeDFTManager(WorkflowBase):
             self.logger.error(f"Error resuming DFT calculations: {str(e)}")
             self.logger.error("".join(traceback.format_exc()))
             connector.get_session().rollback()
-            return False 
\ No newline at end of file
+            return False 
+
+class ExtendDFTManager(WorkflowBase):
+    """Manager for adding new materials to an existing DFT workflow."""
+
+    def validate(self, workflow_detail: WorkflowDetail, workflow_batches: list[WorkflowBatchDetail], args: Dict[str, Any]) -> bool:
+
+        if workflow_detail is None:
+            self.logger.error("No workflow found to extend. Please use start command to start the workflow.")
+            return False
+        return True
+
+    def get_registered_materials(self, workflow_detail: WorkflowDetail, batches: list[WorkflowBatchDetail]) -> Dict[str, Any]:
+        """Get the structure hashes of the materials registered in the workflow.
+
+        Materials of workflows created before the material index existed are only
+        known by name and map to None.
+
+        Args:
+            workflow_detail: Workflow details from database
+            batches: DFT batches of the workflow
+
+        Returns:
+            Dict[str, Any]: Structure hash keyed by material name
+        """
+        registered = {}
+        for batch in batches:
+            for material_name in json.loads(batch.materials):
+                registered[material_name] = None
+
+        materials = self.container.get('material_crud').get_materials(
+            self.container.get('sqlite_connector').get_session(),
+            workflow_detail.calc_unique_name)
+        for material in materials:
+            registered[material.material_name] = material.structure_hash
+        return registered
+
+    def execute(self, args: Dict[str, Any]) -> Any:
+        try:
+            with self.container.get('sqlite_connector') as connector:
+                self.logger.info("Extending DFT calculation workflow")
+                workflow_detail = self.container.get('workflow_crud').get_workflow(
+                    connector.get_session(),
+                    self.container.get('config')['workflow_unique_name']
+                )
+
+                if not self.validate(workflow_detail, [], args):
+                    return False
+
+                batches = [batch for batch in self.container.get('batch_crud').get_batches(
+                    connector.get_session(), workflow_detail.calc_unique_name) if batch.calculation_type == 'dft']
+                registered = self.get_registered_materials(workflow_detail, batches)
+                self.logger.info(f"Found {len(registered)} materials registered in the workflow")
+
+                input_processor = self.container.get('input_processor')
+                batch_processor = self.container.get('batch_processor')
+                job_processor = self.container.get('job_processor')
+
+                input_data = input_processor.process(workflow_detail, registered=registered)
+                if not input_data:
+                    self.logger.info("No new materials found in the input. Nothing to do.")
+                    return True
+
+                batches, executions = batch_processor.process(workflow_detail, 'dft', input_data)
+                result = job_processor.process(batches)
+
+                connector.get_session().commit()
+                return result
+
+        except Exception as e:
+            self.logger.error(f"Error extending DFT workflow: {str(e)}")
+            self.logger.error("".join(traceback.format_exc()))
+            connector.get_session().rollback()
+            return False
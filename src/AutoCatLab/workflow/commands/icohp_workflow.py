@@ -2,7 +2,7 @@
 import traceback
 from typing import Any, Dict
 from AutoCatLab.db.models import WorkflowBatchDetail, WorkflowDetail
-from AutoCatLab.util.util import prompt_yes_no
+from AutoCatLab.util.util import prompt_yes_no, show_message
 from .workflow_base import WorkflowBase
 
 class StartICOHPManager(WorkflowBase):
@@ -103,6 +103,10 @@ class ResumeICOHPManager(WorkflowBase):
                     self.container.get('config')['workflow_unique_name']
                 )
 
+                if workflow_detail is not None:
+                    # Batches whose job is gone are still marked running
+                    self.container.get('job_reconciler').reconcile(workflow_detail)
+
                 batches = self.container.get('batch_crud').get_batches(
                     connector.get_session(),
                     workflow_detail.calc_unique_name)
@@ -125,4 +129,57 @@ class ResumeICOHPManager(WorkflowBase):
                 self.logger.error(f"Error resuming ICOHP calculations: {str(e)}")
                 self.logger.error("".join(traceback.format_exc()))
                 connector.get_session().rollback()
-                return False 
\ No newline at end of file
+                return False 
+
+
+class ScheduleICOHPManager(WorkflowBase):
+    """Manager for scheduling ICOHP per material as soon as its DFT DOS is done."""
+
+    def validate(self, workflow_detail: WorkflowDetail, batches: list[WorkflowBatchDetail], args: Dict[str, Any]) -> bool:
+
+        if workflow_detail is None:
+            self.logger.error("No workflow found. Please use start DFT command to start the workflow.")
+            return False
+
+        if not [batch for batch in batches if batch.calculation_type == 'dft']:
+            self.logger.error("No DFT batches found. Please check the DFT workflow status.")
+            return False
+
+        return True
+
+    def execute(self, args: Dict[str, Any]) -> Any:
+
+        with self.container.get('sqlite_connector') as connector:
+
+            try:
+                self.logger.info("Scheduling ICOHP calculations")
+
+                workflow_detail = self.container.get('workflow_crud').get_workflow(
+                    connector.get_session(),
+                    self.container.get('config')['workflow_unique_name']
+                )
+                batches = self.container.get('batch_crud').get_batches(
+                    connector.get_session(),
+                    workflow_detail.calc_unique_name) if workflow_detail else []
+
+                if not self.validate(workflow_detail, batches, args):
+                    return False
+
+                batch_processor = self.container.get('batch_processor')
+                job_processor = self.container.get('job_processor')
+
+                icohp_batches, executions = batch_processor.schedule_icohp(workflow_detail, args.get('flush', False))
+                if not icohp_batches:
+                    show_message("No materials ready for ICOHP", "info")
+                    connector.get_session().commit()
+                    return True
+
+                results = job_processor.process(icohp_batches)
+                connector.get_session().commit()
+                return results
+
+            except Exception as e:
+                self.logger.error(f"Error scheduling ICOHP calculations: {str(e)}")
+                self.logger.error("".join(traceback.format_exc()))
+                connector.get_session().rollback()
+                return False
@@ -0,0 +1,113 @@
+"""Ingest command manager for workflow."""
+import logging
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict
+
+from AutoCatLab.container_base import Container
+from AutoCatLab.db.models import WorkflowBatchDetail, WorkflowDetail
+from AutoCatLab.executor.batch_executor_manager import CALCULATION_EXECUTORS
+from AutoCatLab.util.util import show_message
+from .workflow_base import WorkflowBase
+
+
+def extract_execution_result(config: Dict[str, Any], workflow_name: str, batch_id: int,
+                             execution_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract the results of a computed execution in a worker process.
+
+    Workers get plain values instead of database objects and only read the calculation
+    outputs, the results database is written by the main process.
+
+    Args:
+        config: Configuration dictionary
+        workflow_name: Unique name of the workflow
+        batch_id: Batch ID of the execution
+        execution_data: Calculation name, material name and result directory of the execution
+
+    Returns:
+        Dict[str, Any]: Result returned by the executor's ``extract_result``
+    """
+    container = Container()
+    container.set('config', config)
+    container.set('logger', logging.getLogger(__name__))
+    executor = CALCULATION_EXECUTORS[execution_data['calculation_name']](container)
+    return executor.extract_result(
+        config,
+        SimpleNamespace(calc_unique_name=workflow_name),
+        SimpleNamespace(batch_id=batch_id),
+        SimpleNamespace(**execution_data))
+
+
+class IngestManager(WorkflowBase):
+    """Manager for ingesting the results of computed executions."""
+
+    def validate(self, workflow_detail: WorkflowDetail, workflow_batches: list[WorkflowBatchDetail], args: Dict[str, Any]) -> bool:
+        if workflow_detail is None:
+            self.logger.error("No workflow found")
+            return False
+        return True
+
+    def execute(self, args: Dict[str, Any]) -> Any:
+        args = args or {}
+        with self.container.get('sqlite_connector') as connector:
+            try:
+                session = connector.get_session()
+                workflow_detail = self.container.get('workflow_crud').get_workflow(
+                    session, self.config['workflow_unique_name'])
+                if not self.validate(workflow_detail, [], args):
+                    return False
+
+                executions = self.container.get('execution_crud').get_computed_executions(
+                    session, workflow_detail.calc_unique_name)
+                if not executions:
+                    show_message("No computed executions to ingest", "success")
+                    return True
+
+                workers = args.get('workers') or self.config['ingestion']['workers']
+                show_message(f"Ingesting {len(executions)} executions with {workers} workers", "info")
+
+                ingested = 0
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = [
+                        (execution, pool.submit(
+                            extract_execution_result,
+                            self.config,
+                            workflow_detail.calc_unique_name,
+                            execution.batch_id,
+                            {
+                                'calculation_name': execution.calculation_name,
+                                'material_name': execution.material_name,
+                                'result_material_dir': execution.result_material_dir
+                            }))
+                        for execution in executions
+                    ]
+                    # Written in execution order, so relax rows exist before DOS and ICOHP update them
+                    for execution, future in futures:
+                        try:
+                            result = future.result()
+                            executor = CALCULATION_EXECUTORS[execution.calculation_name](self.container)
+                            if not executor.write_result(result):
+                                raise ValueError(f"No results row for {result['key']}")
+                            execution.status = 'completed'
+                            execution.error = None
+                            ingested += 1
+                        except Exception as e:
+                            # Left computed, so the next run tries it again
+                            self.logger.error(f"Error ingesting {execution.calculation_name} of "
+                                              f"{execution.material_name}: {str(e)}")
+                            execution.error = str(e)
+                        session.commit()
+
+                failed = len(executions) - ingested
+                show_message(f"Ingested {ingested} executions", "success")
+                if failed:
+                    show_message(f"{failed} executions could not be ingested and stay computed, "
+                                 f"see the log for details", "warning")
+                return True
+
+            except Exception as e:
+                self.logger.error(f"Error ingesting results: {str(e)}")
+                self.logger.error("".join(traceback.format_exc()))
+                connector.get_session().rollback()
+                return False
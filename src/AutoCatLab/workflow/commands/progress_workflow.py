@@ -7,7 +7,7 @@ from rich.progress import Progress, SpinnerColumn, BarColumn, TextColumn, TimeEl
 from rich.panel import Panel
 from rich.live import Live
 from rich.layout import Layout
-from AutoCatLab.db.models import WorkflowBatchDetail, WorkflowDetail
+from AutoCatLab.db.models import WorkflowBatchDetail, WorkflowDetail, FINISHED_STATUSES
 from .workflow_base import WorkflowBase
 
 class ShowProgressManager(WorkflowBase):
@@ -65,7 +65,7 @@ class ShowProgressManager(WorkflowBase):
 
             # Calculate statistics for progress bar
             total_executions = sum(len(batch.executions) for batch in batches)
-            completed_executions = sum(len([e for e in batch.executions if e.status == 'completed']) for batch in batches)
+            completed_executions = sum(len([e for e in batch.executions if e.status in FINISHED_STATUSES]) for batch in batches)
             
             self.logger.info(f"Total executions: {total_executions}, Completed: {completed_executions}")
             
@@ -102,7 +102,7 @@ class ShowProgressManager(WorkflowBase):
             
             self.logger.info("Processing batches for display...")
             for batch in batches:
-                batch_completed = len([e for e in batch.executions if e.status == 'completed'])
+                batch_completed = len([e for e in batch.executions if e.status in FINISHED_STATUSES])
                 batch_total = len(batch.executions)
                 progress = f"{batch_completed}/{batch_total}"
                 
@@ -110,12 +110,13 @@ class ShowProgressManager(WorkflowBase):
                     'completed': 'green',
                     'running': 'yellow',
                     'failed': 'red',
+                    'timeout': 'red',
                     'created': 'white'
                 }.get(batch.status, 'white')
                 
                 error_msg = ""
-                if batch.status == 'failed':
-                    first_failed = next((e for e in batch.executions if e.status == 'failed'), None)
+                if batch.status in ('failed', 'timeout'):
+                    first_failed = next((e for e in batch.executions if e.status in ('failed', 'retry', 'timeout')), None)
                     if first_failed:
                         error_msg = first_failed.error or "Unknown error"
                 
@@ -140,8 +141,8 @@ class ShowProgressManager(WorkflowBase):
             
             self.logger.info("Processing failed executions...")
             for batch in batches:
-                if batch.status == 'failed':
-                    first_failed = next((e for e in batch.executions if e.status == 'failed'), None)
+                if batch.status in ('failed', 'timeout'):
+                    first_failed = next((e for e in batch.executions if e.status in ('failed', 'retry', 'timeout')), None)
                     if first_failed:
                         failed_executions_table.add_row(
                             f"Batch {batch.batch_id}",
@@ -0,0 +1,279 @@
+"""Rebuild results command manager for workflow."""
+import os
+import shutil
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from AutoCatLab.db.connectors import ASEDBConnector
+from AutoCatLab.db.models import WorkflowBatchDetail, WorkflowDetail
+from AutoCatLab.executor.batch_executor_manager import CALCULATION_EXECUTORS
+from AutoCatLab.executor.util.bader import read_bader
+from AutoCatLab.executor.util.completion import is_lobster_complete, is_vasp_complete
+from AutoCatLab.util.util import show_message
+from .ingest_workflow import extract_execution_result
+from .workflow_base import WorkflowBase
+
+# Rows written per transaction of the rebuilt results database
+ROWS_PER_TRANSACTION = 500
+
+# Materials extracted per worker process at a time, so finished rows do not pile up in memory
+MATERIALS_PER_WORKER = 4
+
+
+def find_material_dirs(results_dir: Path) -> List[str]:
+    """List the material directories of all batches in ``results/batch_*``.
+
+    Args:
+        results_dir: Results directory of the workflow
+
+    Returns:
+        List[str]: Material directories, sorted
+    """
+    material_dirs = []
+    with os.scandir(results_dir) as batches:
+        for batch in batches:
+            if not batch.name.startswith('batch_') or not batch.is_dir():
+                continue
+            with os.scandir(batch.path) as materials:
+                material_dirs.extend(material.path for material in materials if material.is_dir())
+    return sorted(material_dirs)
+
+
+def get_file_state(path: Path) -> Optional[Tuple[int, int]]:
+    """Return the modification time and size of a file, None if it does not exist."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def backup_file(path: Path) -> Path:
+    """Keep a file under a timestamped name, never overwriting an earlier backup.
+
+    Args:
+        path: File to back up
+
+    Returns:
+        Path: Path of the backup
+    """
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    backup = path.with_name(f'{path.name}.{stamp}.bak')
+    counter = 1
+    while backup.exists():
+        backup = path.with_name(f'{path.name}.{stamp}-{counter}.bak')
+        counter += 1
+    try:
+        os.link(path, backup)
+    except OSError:
+        shutil.copy2(path, backup)
+    return backup
+
+
+def is_step_complete(step_dir: str, calculation_name: str) -> bool:
+    """Check whether the outputs of a calculation step are complete."""
+    if 'ICOHP' in calculation_name:
+        return is_lobster_complete(step_dir)
+    return is_vasp_complete(step_dir)
+
+
+def extract_material_results(
+        config: Dict[str, Any],
+        workflow_name: str,
+        material_dir: str,
+        batch_ids: Dict[str, int]
+) -> Tuple[str, Optional[Dict[str, Any]], Dict[str, str]]:
+    """Extract the results of all finished calculation steps of a material in a worker process.
+
+    Steps are merged in the order of :data:`CALCULATION_EXECUTORS`, so the row equals the one
+    written by running the executors one after another.
+
+    Args:
+        config: Configuration dictionary
+        workflow_name: Unique name of the workflow
+        material_dir: Material directory
+        batch_ids: Batch ID of every step directory known to the workflow database
+
+    Returns:
+        Tuple[str, Optional[Dict[str, Any]], Dict[str, str]]: Material directory, merged
+            result (None if the material has no row) and errors by calculation step
+    """
+    with os.scandir(material_dir) as entries:
+        steps = {entry.name: entry.path for entry in entries if entry.is_dir()}
+
+    row = None
+    errors = {}
+    for calculation_name in CALCULATION_EXECUTORS:
+        step_dir = steps.get(calculation_name)
+        if step_dir is None or not is_step_complete(step_dir, calculation_name):
+            continue
+        try:
+            result = extract_execution_result(config, workflow_name, batch_ids.get(step_dir), {
+                'calculation_name': calculation_name,
+                'material_name': os.path.basename(material_dir),
+                'result_material_dir': step_dir
+            })
+        except Exception as e:
+            errors[calculation_name] = str(e)
+            continue
+
+        if row is None:
+            if not result['create']:
+                errors[calculation_name] = "No finished relaxation to create the row from"
+                continue
+            row = {'key': result['key'], 'folder': result['folder'], 'data': {}}
+        row['atoms'] = result['atoms']
+        row['data'].update(result['data'])
+
+        # Bader charges stored by the bader command are read back from its output
+        if 'RELAX' in calculation_name and os.path.exists(os.path.join(step_dir, 'ACF.dat')):
+            try:
+                row['data']['bader'] = read_bader(step_dir)
+            except Exception as e:
+                errors['bader'] = str(e)
+
+    return material_dir, row, errors
+
+
+class RebuildResultsManager(WorkflowBase):
+    """Manager for rebuilding the results database from the result directories."""
+
+    def validate(self, workflow_detail: WorkflowDetail, workflow_batches: list[WorkflowBatchDetail], args: Dict[str, Any]) -> bool:
+        if workflow_detail is None:
+            self.logger.error("No workflow found")
+            return False
+        return True
+
+    def get_batch_ids(self, session: Any, workflow_detail: WorkflowDetail) -> Dict[str, int]:
+        """Map the step directory of every execution to its batch ID."""
+        batch_ids = {}
+        for calculation_name in CALCULATION_EXECUTORS:
+            for execution in self.container.get('execution_crud').get_workflow_executions(
+                    session, workflow_detail.calc_unique_name, calculation_name):
+                batch_ids[execution.result_material_dir] = execution.batch_id
+        return batch_ids
+
+    def delete_rows(self, db: Any, key_prefix: str) -> int:
+        """Delete the rows whose key starts with a prefix, keeping the rows of other workflows.
+
+        Args:
+            db: Results database
+            key_prefix: Key prefix of the rows to delete
+
+        Returns:
+            int: Number of deleted rows
+        """
+        stale = [row.id for row in db.select(include_data=False) if str(row.get('key', '')).startswith(key_prefix)]
+        db.delete(stale)
+        return len(stale)
+
+    def write_rows(self, db: Any, rows: List[Dict[str, Any]]) -> None:
+        """Write rows to the results database in a single transaction."""
+        with db as transaction:
+            for row in rows:
+                transaction.write(row['atoms'], key=row['key'], data=row['data'], folder=row['folder'])
+
+    def extract_results(self, pool: ProcessPoolExecutor, workflow_detail: WorkflowDetail, material_dirs: List[str],
+                        batch_ids: Dict[str, int], workers: int
+                        ) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Dict[str, str]]]:
+        """Extract the results of materials in worker processes, yielding them as they finish.
+
+        At most ``MATERIALS_PER_WORKER`` materials per worker are submitted at a time, so only
+        the rows not yet written are held in memory.
+        """
+        pending = iter(material_dirs)
+        running = set()
+        while True:
+            while len(running) < workers * MATERIALS_PER_WORKER:
+                material_dir = next(pending, None)
+                if material_dir is None:
+                    break
+                running.add(pool.submit(extract_material_results, self.config, workflow_detail.calc_unique_name,
+                                        material_dir, batch_ids))
+            if not running:
+                return
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+    def execute(self, args: Dict[str, Any]) -> Any:
+        args = args or {}
+        with self.container.get('sqlite_connector') as connector:
+            try:
+                session = connector.get_session()
+                workflow_detail = self.container.get('workflow_crud').get_workflow(
+                    session, self.config['workflow_unique_name'])
+                if not self.validate(workflow_detail, [], args):
+                    return False
+
+                results_dir = Path(self.config['workflow_output_directory']) / workflow_detail.calc_unique_name / 'results'
+                material_dirs = find_material_dirs(results_dir)
+                if not material_dirs:
+                    show_message(f"No material directories found in {results_dir}", "warning")
+                    return True
+
+                batch_ids = self.get_batch_ids(session, workflow_detail)
+                workers = args.get('workers') or self.config['ingestion']['workers']
+                show_message(f"Reading results of {len(material_dirs)} materials with {workers} workers", "info")
+
+                # The database is shared by all workflows of the output directory, so only the
+                # rows of this workflow are replaced, in a copy swapped in when it is complete
+                db_path = Path(self.container.get('result_ase_db_connector').db_path)
+                tmp_path = db_path.with_name(db_path.stem + '.rebuild' + db_path.suffix)
+                if tmp_path.exists():
+                    tmp_path.unlink()
+                state = get_file_state(db_path)
+                if state is not None:
+                    shutil.copy2(db_path, tmp_path)
+
+                # Rows are written in bulk transactions as the materials are extracted
+                rebuilt = 0
+                failures = {}
+                with ASEDBConnector(str(tmp_path)) as tmp_connector, ProcessPoolExecutor(max_workers=workers) as pool:
+                    removed = self.delete_rows(tmp_connector.db, str(results_dir) + os.sep)
+                    rows = []
+                    for material_dir, row, errors in self.extract_results(pool, workflow_detail, material_dirs,
+                                                                          batch_ids, workers):
+                        if row is not None:
+                            rows.append(row)
+                        if errors:
+                            failures[material_dir] = errors
+                        if len(rows) >= ROWS_PER_TRANSACTION:
+                            self.write_rows(tmp_connector.db, rows)
+                            rebuilt += len(rows)
+                            rows = []
+                    self.write_rows(tmp_connector.db, rows)
+                    rebuilt += len(rows)
+
+                if not rebuilt:
+                    tmp_path.unlink()
+                    show_message("No finished calculations found, the results database is left unchanged", "warning")
+                    return False
+
+                if get_file_state(db_path) != state:
+                    tmp_path.unlink()
+                    show_message(f"{db_path} was changed by another process during the rebuild and is left "
+                                 f"unchanged, run the command again", "error")
+                    return False
+                if state is not None:
+                    backup = backup_file(db_path)
+                    show_message(f"Kept the previous results database as {backup}", "info")
+                os.replace(tmp_path, db_path)
+
+                for material_dir, errors in failures.items():
+                    for calculation_name, error in errors.items():
+                        self.logger.error(f"Error reading {calculation_name} of {material_dir}: {error}")
+                        show_message(f"{Path(material_dir).name} {calculation_name}: {error}", "warning")
+                show_message(f"Rebuilt {rebuilt} materials of {workflow_detail.calc_unique_name} in {db_path}, "
+                             f"replacing {removed} rows", "success")
+                if failures:
+                    show_message(f"{len(failures)} materials had calculations that could not be read", "warning")
+                return True
+
+            except Exception as e:
+                self.logger.error(f"Error rebuilding results: {str(e)}")
+                self.logger.error("".join(traceback.format_exc()))
+                return False
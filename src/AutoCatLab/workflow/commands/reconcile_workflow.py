@@ -0,0 +1,43 @@
+"""Reconcile command manager for workflow."""
+import traceback
+from typing import Any, Dict
+
+from AutoCatLab.db.models import WorkflowBatchDetail, WorkflowDetail
+from AutoCatLab.util.util import show_message
+from .workflow_base import WorkflowBase
+
+
+class ReconcileManager(WorkflowBase):
+    """Manager for reconciling batch states with the scheduler."""
+
+    def validate(self, workflow_detail: WorkflowDetail, workflow_batches: list[WorkflowBatchDetail], args: Dict[str, Any]) -> bool:
+        if workflow_detail is None:
+            self.logger.error("No workflow found")
+            return False
+        return True
+
+    def execute(self, args: Dict[str, Any]) -> Any:
+        with self.container.get('sqlite_connector') as connector:
+            try:
+                workflow_detail = self.container.get('workflow_crud').get_workflow(
+                    connector.get_session(),
+                    self.config['workflow_unique_name'])
+                if not self.validate(workflow_detail, [], args):
+                    return False
+
+                reconciled = self.container.get('job_reconciler').reconcile(workflow_detail)
+                if not reconciled:
+                    show_message("All submitted batches match the scheduler state", "success")
+                    return True
+
+                for batch_id, state in reconciled.items():
+                    show_message(f"Batch {batch_id}: job ended with {state}", "warning")
+                show_message(f"Marked {len(reconciled)} batches as failed or timed out. "
+                             f"Use the resume commands to run them again.", "info")
+                return True
+
+            except Exception as e:
+                self.logger.error(f"Error reconciling batches: {str(e)}")
+                self.logger.error("".join(traceback.format_exc()))
+                connector.get_session().rollback()
+                return False
@@ -3,10 +3,15 @@ from typing import Any, Optional
 
 from .commands.workflow_base import WorkflowBase
 from .commands.cleanup_workflow import CleanupManager
-from .commands.dft_workflow import StartDFTManager, ResumeDFTManager
-from .commands.icohp_workflow import StartICOHPManager, ResumeICOHPManager
+from .commands.dft_workflow import StartDFTManager, ResumeDFTManager, ExtendDFTManager
+from .commands.icohp_workflow import StartICOHPManager, ResumeICOHPManager, ScheduleICOHPManager
 from .commands.progress_workflow import ShowProgressManager
 from .commands.report_workflow import ShowReportManager
+from .commands.daemon_workflow import SubmitDaemonManager
+from .commands.reconcile_workflow import ReconcileManager
+from .commands.ingest_workflow import IngestManager
+from .commands.rebuild_results_workflow import RebuildResultsManager
+from .commands.bader_workflow import BaderManager
 
 
 class WorkflowManager:
@@ -34,10 +39,17 @@ class WorkflowManager:
         command_map = {
             'start-dft': StartDFTManager,
             'resume-dft': ResumeDFTManager,
+            'extend-dft': ExtendDFTManager,
             'start-icohp': StartICOHPManager,
             'resume-icohp': ResumeICOHPManager,
+            'schedule-icohp': ScheduleICOHPManager,
             'show-progress': ShowProgressManager,
             'show-report': ShowReportManager,
+            'submit-daemon': SubmitDaemonManager,
+            'reconcile': ReconcileManager,
+            'ingest': IngestManager,
+            'rebuild-results': RebuildResultsManager,
+            'bader': BaderManager,
             'cleanup': CleanupManager
         }
         
@@ -0,0 +1,97 @@
+"""Shared fixtures of the AutoCatLab tests."""
+import json
+import logging
+import os
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+import AutoCatLab
+from AutoCatLab.container_base import Container
+from AutoCatLab.db.connectors import SQLiteConnector
+from AutoCatLab.db.crud import BatchCRUD, ExecutionCRUD, WorkflowCRUD
+
+WORKFLOW_NAME = 'test_workflow'
+
+
+@pytest.fixture
+def fake_bin(tmp_path, monkeypatch):
+    """Return a function installing a fake command in a directory put first on PATH.
+
+    The command is a Python script run with the interpreter of the tests.
+    """
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    def install(name: str, source: str) -> Path:
+        path = bin_dir / name
+        path.write_text(f"#!{sys.executable}\n" + textwrap.dedent(source))
+        path.chmod(0o755)
+        return path
+
+    return install
+
+
+@pytest.fixture
+def config(tmp_path):
+    """Default configuration with a SLURM scheduled DFT step."""
+    with open(Path(AutoCatLab.__file__).parent / 'util' / 'config.json') as f:
+        config = json.load(f)
+    config['workflow_unique_name'] = WORKFLOW_NAME
+    config['workflow_output_directory'] = str(tmp_path / 'output')
+    config['workflow_steps'] = {
+        'dft': {'calculations': ['BULK_DFT_RELAX', 'BULK_DFT_DOS'], 'scheduler': {'type': 'slurm'}}
+    }
+    return config
+
+
+@pytest.fixture
+def container(tmp_path, config, monkeypatch):
+    """Container with a workflow DB in the temporary directory."""
+    monkeypatch.delenv('local_dev', raising=False)
+    container = Container()
+    container.set('config', config)
+    container.set('logger', logging.getLogger('autocatlab.tests'))
+    container.set('sqlite_connector', SQLiteConnector(tmp_path / 'db' / 'workflow.db'))
+    container.set('workflow_crud', WorkflowCRUD())
+    container.set('batch_crud', BatchCRUD())
+    container.set('execution_crud', ExecutionCRUD())
+    return container
+
+
+@pytest.fixture
+def make_batches(tmp_path, container):
+    """Return a function creating a workflow with DFT batches of one material each."""
+
+    def make(count: int, calculations=('BULK_DFT_RELAX',)):
+        session = container.get('sqlite_connector').get_session()
+        if container.get('workflow_crud').get_workflow(session, WORKFLOW_NAME) is None:
+            container.get('workflow_crud').create_workflow(session, {
+                'calc_unique_name': WORKFLOW_NAME, 'config_path': str(tmp_path / 'config.json')})
+        batches = []
+        for index in range(count):
+            batch_dir = tmp_path / 'output' / WORKFLOW_NAME / 'results' / f'batch_{index}'
+            batch = container.get('batch_crud').create_batch(session, {
+                'workflow_unique_name': WORKFLOW_NAME,
+                'materials': [f'material_{index}'],
+                'result_batch_dir': batch_dir,
+                'script_path': tmp_path / 'scripts' / f'batch_{index}.sh',
+                'calculation_type': 'dft'
+            })
+            for calculation_name in calculations:
+                container.get('execution_crud').create_execution(session, {
+                    'workflow_unique_name': WORKFLOW_NAME,
+                    'batch_id': batch.batch_id,
+                    'material_name': f'material_{index}',
+                    'result_material_dir': batch_dir / f'material_{index}' / calculation_name,
+                    'script_path': batch.script_path,
+                    'calculation_name': calculation_name
+                })
+            batches.append(batch)
+        session.commit()
+        return batches
+
+    return make
@@ -0,0 +1,137 @@
+"""Tests of the scheduler reconciliation against fake sacct and squeue commands."""
+import json
+
+import pytest
+
+from AutoCatLab.db.models import FINISHED_STATUSES
+from AutoCatLab.initializer.job_reconciler import JobReconciler
+from AutoCatLab.util import scheduler
+from AutoCatLab.util.scheduler import get_job_states
+
+# Both commands log their arguments and answer from the states in their environment variable
+FAKE_SACCT = '''
+import json
+import os
+import sys
+
+with open(os.environ['FAKE_SCHEDULER_LOG'], 'a') as f:
+    f.write(json.dumps({'command': 'sacct', 'args': sys.argv[1:]}) + '\\n')
+if os.environ.get('FAKE_SACCT_FAIL'):
+    sys.stderr.write('sacct: error: Slurm accounting storage is disabled\\n')
+    sys.exit(1)
+states = json.loads(os.environ.get('FAKE_SACCT_STATES', '{}'))
+for job_id in sys.argv[sys.argv.index('-j') + 1].split(','):
+    if job_id in states:
+        print(f"{job_id}|{states[job_id]}|0:0")
+'''
+
+FAKE_SQUEUE = '''
+import json
+import os
+import sys
+
+with open(os.environ['FAKE_SCHEDULER_LOG'], 'a') as f:
+    f.write(json.dumps({'command': 'squeue', 'args': sys.argv[1:]}) + '\\n')
+for job_id, state in json.loads(os.environ.get('FAKE_SQUEUE_JOBS', '{}')).items():
+    print(f"{job_id}|{state}")
+'''
+
+
+@pytest.fixture
+def scheduler_log(tmp_path, fake_bin, monkeypatch):
+    """Install fake sacct and squeue commands and return the path of their call log."""
+    log = tmp_path / 'scheduler.log'
+    log.touch()
+    fake_bin('sacct', FAKE_SACCT)
+    fake_bin('squeue', FAKE_SQUEUE)
+    monkeypatch.setenv('FAKE_SCHEDULER_LOG', str(log))
+    return log
+
+
+def read_calls(log, command):
+    with open(log) as f:
+        return [call['args'] for call in map(json.loads, f) if call['command'] == command]
+
+
+def submit(container, batches, job_ids):
+    """Mark batches as running jobs whose first step runs and second step waits."""
+    session = container.get('sqlite_connector').get_session()
+    for batch, job_id in zip(batches, job_ids):
+        batch.job_id = job_id
+        batch.status = 'running'
+        batch.executions[0].status = 'running'
+    session.commit()
+
+
+def test_job_states_are_queried_in_chunks(scheduler_log, monkeypatch):
+    monkeypatch.setattr(scheduler, 'JOB_QUERY_CHUNK_SIZE', 2)
+    monkeypatch.setenv('FAKE_SACCT_STATES', json.dumps({str(job_id): 'COMPLETED' for job_id in range(1, 6)}))
+
+    states = get_job_states(['1', '2', '3', '4', '5', '3'])
+
+    assert states == {str(job_id): 'COMPLETED' for job_id in range(1, 6)}
+    chunks = [args[args.index('-j') + 1].split(',') for args in read_calls(scheduler_log, 'sacct')]
+    assert chunks == [['1', '2'], ['3', '4'], ['5']]
+    # Every job was found by sacct, so the queue is not listed
+    assert read_calls(scheduler_log, 'squeue') == []
+
+
+def test_job_states_fall_back_to_squeue(scheduler_log, monkeypatch):
+    monkeypatch.setenv('FAKE_SACCT_FAIL', '1')
+    monkeypatch.setenv('FAKE_SQUEUE_JOBS', json.dumps({'7_3': 'RUNNING', '8_[1-5]': 'PENDING'}))
+
+    states = get_job_states(['7_3', '8_2', '9'])
+
+    # Pending array tasks are only listed under their array job
+    assert states == {'7_3': 'RUNNING', '8_2': 'PENDING'}
+    assert len(read_calls(scheduler_log, 'squeue')) == 1
+
+
+def test_ended_jobs_are_marked_failed_or_timed_out(container, make_batches, scheduler_log, monkeypatch):
+    monkeypatch.setenv('FAKE_SACCT_STATES', json.dumps({
+        '11': 'TIMEOUT', '12': 'FAILED', '13': 'CANCELLED by 1234', '14': 'RUNNING', '15': 'PENDING'}))
+    batches = make_batches(5, calculations=('BULK_DFT_RELAX', 'BULK_DFT_DOS'))
+    submit(container, batches, ['11', '12', '13', '14', '15'])
+
+    reconciled = JobReconciler(container).reconcile(batches[0].workflow)
+
+    assert reconciled == {batches[0].batch_id: 'TIMEOUT', batches[1].batch_id: 'FAILED',
+                          batches[2].batch_id: 'CANCELLED'}
+    assert [batch.status for batch in batches] == ['timeout', 'failed', 'failed', 'running', 'running']
+    assert [batch.executions[0].status for batch in batches] == ['timeout', 'failed', 'failed', 'running', 'running']
+    # Steps that did not start yet keep their status
+    assert {batch.executions[1].status for batch in batches} == {'created'}
+    assert batches[0].error == 'Job 11 ended with state TIMEOUT'
+
+
+def test_lost_jobs_are_failed_and_resumable(container, make_batches, scheduler_log, monkeypatch):
+    monkeypatch.setenv('FAKE_SACCT_STATES', json.dumps({'22': 'RUNNING'}))
+    monkeypatch.setenv('FAKE_SQUEUE_JOBS', json.dumps({'23': 'PENDING'}))
+    batches = make_batches(3, calculations=('BULK_DFT_RELAX', 'BULK_DFT_DOS'))
+    submit(container, batches, ['21', '22', '23'])
+    batches[0].executions[0].status = 'completed'
+    batches[0].executions[1].status = 'running'
+    container.get('sqlite_connector').get_session().commit()
+
+    reconciler = JobReconciler(container)
+    reconciled = reconciler.reconcile(batches[0].workflow)
+
+    # Neither sacct nor squeue know job 21
+    assert reconciled == {batches[0].batch_id: 'LOST'}
+    assert batches[0].status == 'failed'
+    assert batches[0].success is False
+    assert batches[0].error == 'Job 21 ended with state LOST'
+    assert [execution.status for execution in batches[0].executions] == ['completed', 'failed']
+
+    # Resume picks up the batch and reruns its unfinished step, the finished one is kept
+    session = container.get('sqlite_connector').get_session()
+    assert batches[0] not in reconciler.get_open_batches(batches[0].workflow)
+    resumable = [batch for batch in container.get('batch_crud').get_batches(session, batches[0].workflow_unique_name)
+                 if batch.status != 'completed' and batch.calculation_type == 'dft']
+    assert batches[0] in resumable
+    rerun = container.get('execution_crud').get_executions(session, batches[0].batch_id)
+    assert [execution.calculation_name for execution in rerun] == ['BULK_DFT_DOS']
+    assert all(execution.status not in FINISHED_STATUSES for execution in rerun)
+
+    # A second reconciliation leaves the failed batch alone
+    assert reconciler.reconcile(batches[0].workflow) == {}
@@ -0,0 +1,193 @@
+"""Tests of the concurrent job submitter against a fake sbatch."""
+import json
+import sqlite3
+
+import pytest
+
+from AutoCatLab.initializer.job_submitter import JobSubmitter
+
+# Records every call and answers as planned per job script: ok, transient, permanent, hang,
+# which queues the job but does not answer before it is killed, or timeout, which does neither
+FAKE_SBATCH = '''
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+log = Path(os.environ['FAKE_SBATCH_LOG'])
+name = Path(sys.argv[-1]).stem
+with open(log) as f:
+    attempt = sum(json.loads(line)['script'] == name and json.loads(line)['event'] == 'start' for line in f)
+
+committed = None
+if os.environ.get('FAKE_SBATCH_DB'):
+    with sqlite3.connect(os.environ['FAKE_SBATCH_DB']) as connection:
+        committed = dict(connection.execute(
+            'SELECT script_path, job_id FROM workflow_batch_details WHERE job_id IS NOT NULL').fetchall())
+
+
+def record(event):
+    with open(log, 'a') as f:
+        f.write(json.dumps({'event': event, 'script': name, 'time': time.time(), 'committed': committed}) + '\\n')
+
+
+record('start')
+time.sleep(float(os.environ.get('FAKE_SBATCH_SLEEP', '0')))
+plan = json.loads(os.environ.get('FAKE_SBATCH_PLAN', '{}')).get(name, [])
+outcome = plan[attempt] if attempt < len(plan) else 'ok'
+job_id = 100 + int(name.split('_')[1])
+if outcome in ('ok', 'hang') and os.environ.get('FAKE_QUEUE'):
+    with open(os.environ['FAKE_QUEUE'], 'a') as f:
+        f.write(f"{job_id}|workflow_{os.environ['FAKE_WORKFLOW']}_{name}|PENDING\\n")
+if outcome in ('hang', 'timeout'):
+    time.sleep(60)
+record('end')
+if outcome == 'transient':
+    sys.stderr.write('sbatch: error: Batch job submission failed: Socket timed out on send/recv operation\\n')
+    sys.exit(1)
+if outcome == 'permanent':
+    sys.stderr.write('sbatch: error: Batch job submission failed: Invalid account or account/partition combination\\n')
+    sys.exit(1)
+print(f"Submitted batch job {job_id}")
+'''
+
+# Lists the jobs queued by the fake sbatch
+FAKE_SQUEUE = '''
+import os
+
+with open(os.environ['FAKE_QUEUE']) as f:
+    print(f.read(), end='')
+'''
+
+
+@pytest.fixture
+def sbatch_log(tmp_path, fake_bin, monkeypatch):
+    """Install the fake sbatch and return the path of its call log."""
+    log = tmp_path / 'sbatch.log'
+    log.touch()
+    fake_bin('sbatch', FAKE_SBATCH)
+    monkeypatch.setenv('FAKE_SBATCH_LOG', str(log))
+    return log
+
+
+@pytest.fixture
+def submission(config):
+    """Submission settings without rate limit and with short backoff."""
+    params = config['submission']
+    params.update({'max_concurrent_submissions': 2, 'submissions_per_second': 0, 'max_retries': 3,
+                   'retry_backoff_seconds': 0.2, 'max_backoff_seconds': 0.3, 'submit_timeout': 10})
+    return params
+
+
+@pytest.fixture
+def queue(tmp_path, fake_bin, config, monkeypatch):
+    """Install a fake squeue listing the jobs queued by the fake sbatch and return the queue file."""
+    queue = tmp_path / 'queue'
+    queue.touch()
+    fake_bin('squeue', FAKE_SQUEUE)
+    monkeypatch.setenv('FAKE_QUEUE', str(queue))
+    monkeypatch.setenv('FAKE_WORKFLOW', config['workflow_unique_name'])
+    return queue
+
+
+def read_log(log):
+    with open(log) as f:
+        return [json.loads(line) for line in f]
+
+
+def get_job_ids(container):
+    """Read the committed job ids by script name with a connection of its own."""
+    with sqlite3.connect(container.get('sqlite_connector').db_path) as connection:
+        rows = connection.execute('SELECT script_path, job_id FROM workflow_batch_details').fetchall()
+    return {script_path.rsplit('/', 1)[-1][:-3]: job_id for script_path, job_id in rows}
+
+
+def test_submissions_are_bounded_by_max_concurrent_submissions(container, make_batches, sbatch_log, submission,
+                                                               monkeypatch):
+    monkeypatch.setenv('FAKE_SBATCH_SLEEP', '0.3')
+    batches = make_batches(6)
+
+    failed = JobSubmitter(container).submit_batches(batches)
+
+    assert failed == []
+    running = 0
+    max_running = 0
+    for event in sorted(read_log(sbatch_log), key=lambda event: (event['time'], event['event'] == 'start')):
+        running += 1 if event['event'] == 'start' else -1
+        max_running = max(max_running, running)
+    assert max_running == submission['max_concurrent_submissions']
+    assert get_job_ids(container) == {f'batch_{index}': str(100 + index) for index in range(6)}
+
+
+def test_transient_errors_are_retried_with_exponential_backoff(container, make_batches, sbatch_log, submission,
+                                                               monkeypatch):
+    monkeypatch.setenv('FAKE_SBATCH_PLAN', json.dumps({'batch_0': ['transient', 'transient']}))
+    batches = make_batches(1)
+
+    failed = JobSubmitter(container).submit_batches(batches)
+
+    assert failed == []
+    starts = [event['time'] for event in read_log(sbatch_log) if event['event'] == 'start']
+    assert len(starts) == 3
+    # 0.2 s after the first failure, then doubled but capped at max_backoff_seconds
+    assert starts[1] - starts[0] >= 0.2
+    assert starts[2] - starts[1] >= 0.3
+    assert get_job_ids(container) == {'batch_0': '100'}
+
+
+def test_permanent_errors_are_not_retried(container, make_batches, sbatch_log, submission, monkeypatch):
+    monkeypatch.setenv('FAKE_SBATCH_PLAN', json.dumps({'batch_0': ['permanent']}))
+    batches = make_batches(1)
+
+    failed = JobSubmitter(container).submit_batches(batches)
+
+    assert [batch.batch_id for batch in failed] == [batches[0].batch_id]
+    assert len([event for event in read_log(sbatch_log) if event['event'] == 'start']) == 1
+    assert get_job_ids(container) == {'batch_0': None}
+
+
+def test_job_ids_are_committed_before_later_submissions_fail(container, make_batches, sbatch_log, submission,
+                                                            monkeypatch):
+    submission['max_concurrent_submissions'] = 1
+    monkeypatch.setenv('FAKE_SBATCH_DB', str(container.get('sqlite_connector').db_path))
+    monkeypatch.setenv('FAKE_SBATCH_PLAN', json.dumps({'batch_2': ['permanent'], 'batch_3': ['permanent']}))
+    batches = make_batches(4)
+
+    failed = JobSubmitter(container).submit_batches(batches)
+
+    assert [batch.batch_id for batch in failed] == [batches[2].batch_id, batches[3].batch_id]
+    # The failing submission already saw the job ids of the earlier ones in the DB
+    start = next(event for event in read_log(sbatch_log) if event['script'] == 'batch_2')
+    assert sorted(start['committed'].values()) == ['100', '101']
+    assert get_job_ids(container) == {'batch_0': '100', 'batch_1': '101', 'batch_2': None, 'batch_3': None}
+
+
+def test_timed_out_submission_adopts_the_queued_job(container, make_batches, sbatch_log, submission, queue,
+                                                    monkeypatch):
+    submission['submit_timeout'] = 0.5
+    monkeypatch.setenv('FAKE_SBATCH_PLAN', json.dumps({'batch_0': ['hang']}))
+    batches = make_batches(1)
+
+    failed = JobSubmitter(container).submit_batches(batches)
+
+    assert failed == []
+    # The killed sbatch had queued the job, so it is not submitted again
+    assert len([event for event in read_log(sbatch_log) if event['event'] == 'start']) == 1
+    assert queue.read_text().splitlines() == ['100|workflow_test_workflow_batch_0|PENDING']
+    assert get_job_ids(container) == {'batch_0': '100'}
+
+
+def test_timed_out_submission_is_retried_if_no_job_was_queued(container, make_batches, sbatch_log, submission,
+                                                              queue, monkeypatch):
+    submission['submit_timeout'] = 0.5
+    monkeypatch.setenv('FAKE_SBATCH_PLAN', json.dumps({'batch_0': ['timeout']}))
+    batches = make_batches(1)
+
+    failed = JobSubmitter(container).submit_batches(batches)
+
+    assert failed == []
+    assert len([event for event in read_log(sbatch_log) if event['event'] == 'start']) == 2
+    assert queue.read_text().splitlines() == ['100|workflow_test_workflow_batch_0|PENDING']
+    assert get_job_ids(container) == {'batch_0': '100'}